@@ -5,6 +5,7 @@ import SimpleITK as sitk
 from rt_utils import RTStructBuilder
 import csv
 import json
+import hashlib
 import dateutil
 
 # Define your DICOM root directory here:
@@ -13,38 +14,50 @@ IMAGE_FOLDER_PATH = "///data"
 ATTRIBUTE_FILE_NAME = "attributes.csv"
 HEADERS_FILE_NAME = "headers.json"
 SAVE_JSON = False
+# Skip series and RTSTRUCTs whose files are unchanged since their outputs were recorded in the manifest.
+# The manifest is written either way, so a later incremental run can pick up from a full run
+INCREMENTAL = False
+MANIFEST_FILE_NAME = "manifest.json"
+
 
 def winapi_path(dos_path, encoding=None):
     # Simplified for non-Windows usage:
     return os.path.abspath(dos_path)
 
+
 def bqml_to_suv(dcm_file: pydicom.FileDataset) -> float:
-    '''
+    """
     Calculates the SUV conversion factor from Bq/mL to g/mL using DICOM header info.
     This simplified version returns only the SUV factor.
-    '''
-    nuclide_dose = dcm_file[0x054, 0x0016][0][0x0018, 0x1074].value  # Injected dose (Bq)
+    """
+    nuclide_dose = dcm_file[0x054, 0x0016][0][
+        0x0018, 0x1074
+    ].value  # Injected dose (Bq)
     weight = dcm_file[0x0010, 0x1030].value  # Patient weight (kg)
     half_life = float(dcm_file[0x054, 0x0016][0][0x0018, 0x1075].value)  # Half life (s)
 
     series_time = str(dcm_file[0x0008, 0x0031].value)  # Series time (HHMMSS)
     series_date = str(dcm_file[0x0008, 0x0021].value)  # Series date (YYYYMMDD)
-    series_dt = dateutil.parser.parse(series_date + ' ' + series_time)
+    series_dt = dateutil.parser.parse(series_date + " " + series_time)
 
-    nuclide_time = str(dcm_file[0x054, 0x0016][0][0x0018, 0x1072].value)  # Injection time
-    nuclide_dt = dateutil.parser.parse(series_date + ' ' + nuclide_time)
+    nuclide_time = str(
+        dcm_file[0x054, 0x0016][0][0x0018, 0x1072].value
+    )  # Injection time
+    nuclide_dt = dateutil.parser.parse(series_date + " " + nuclide_time)
 
     delta_time = (series_dt - nuclide_dt).total_seconds()
-    decay_correction = 2 ** (-1 * delta_time/half_life)
+    decay_correction = 2 ** (-1 * delta_time / half_life)
     suv_factor = (weight * 1000) / (decay_correction * nuclide_dose)
     return suv_factor
 
+
 def getDicomHeaders(file):
     dicomHeaders = file.to_json_dict()
     # remove pixel data from headers
-    dicomHeaders.pop('7FE00010', None)
+    dicomHeaders.pop("7FE00010", None)
     return dicomHeaders
 
+
 def get_patient_nifti_dir(dicom_dir):
     # This function finds the patient's directory and creates a NIFTI folder inside it.
     # Assuming structure: .../data/patientX/DICOM/...
@@ -54,46 +67,53 @@ def get_patient_nifti_dir(dicom_dir):
     # Typically, dicom_dir might look like: /.../data/patientX/DICOM/studyY
     # One dirname: /.../data/patientX/DICOM
     # Another dirname: /.../data/patientX
-    patient_dir = os.path.dirname(os.path.dirname(dicom_dir))  # This should now point to patientX directory
+    patient_dir = os.path.dirname(
+        os.path.dirname(dicom_dir)
+    )  # This should now point to patientX directory
     nifti_dir = os.path.join(patient_dir, "NIFTI")
     if not os.path.exists(nifti_dir):
         os.makedirs(nifti_dir)
     return nifti_dir
 
+
 def dicomToNifti(file, seriesDir):
-    patientID, modality, studyDate = getattr(file, 'PatientID', None), getattr(file, 'Modality', None), getattr(file, 'StudyDate', None)
+    patientID, modality, studyDate = (
+        getattr(file, "PatientID", None),
+        getattr(file, "Modality", None),
+        getattr(file, "StudyDate", None),
+    )
     reader = sitk.ImageSeriesReader()
     seriesNames = reader.GetGDCMSeriesFileNames(seriesDir)
     reader.SetFileNames(seriesNames)
     image = reader.Execute()
 
-    # Convert PET to SUV if needed
-    if modality == 'PT':
-        pet = pydicom.dcmread(seriesNames[0])  # read one image
-        suv_factor = bqml_to_suv(pet)
+    # Convert PET to SUV if needed, the dose and timing attributes are the same for every image of the series
+    if modality == "PT":
+        suv_factor = bqml_to_suv(file)
         image = sitk.Multiply(image, suv_factor)
 
     nifti_dir = get_patient_nifti_dir(seriesDir)
-    output_filename = os.path.join(nifti_dir, f'{patientID}_{modality}_{studyDate}.nii.gz')
-    sitk.WriteImage(image, output_filename, imageIO='NiftiImageIO')
+    output_filename = os.path.join(
+        nifti_dir, f"{patientID}_{modality}_{studyDate}.nii.gz"
+    )
+    sitk.WriteImage(image, output_filename, imageIO="NiftiImageIO")
+    return [output_filename]
 
-def sortParallelLists(list1, list2):
-    if len(list1) > 0 and len(list2) > 0:
-        tuples = zip(*sorted(zip(list1, list2)))
-        list1, list2 = [list(tuple) for tuple in tuples]
-    return list1, list2
 
 def buildMaskArray(file, seriesPath, labelPath) -> np.ndarray:
-    rtstruct = RTStructBuilder.create_from(dicom_series_path=seriesPath, rt_struct_path=labelPath)
-    rois = rtstruct.get_roi_names()
-    masks = [rtstruct.get_roi_mask_by_name(roi).astype(int) for roi in rois]
+    rtstruct = RTStructBuilder.create_from(
+        dicom_series_path=seriesPath, rt_struct_path=labelPath
+    )
+    # Extract all ROIs at once, sharing the series geometry and rasterizing in parallel
+    masks = rtstruct.get_all_roi_masks(workers=os.cpu_count())
 
-    final_mask = sum(masks)
-    final_mask = np.where(final_mask>=1, 1, 0)
+    final_mask = np.logical_or.reduce(list(masks.values()))
+    final_mask = np.where(final_mask, 1, 0)
     # Reorient mask
     final_mask = np.moveaxis(final_mask, [0, 1, 2], [1, 2, 0])
     return final_mask
 
+
 def buildMasks(file, seriesPath, labelPath):
     final_mask = buildMaskArray(file, seriesPath, labelPath)
     reader = sitk.ImageSeriesReader()
@@ -105,147 +125,254 @@ def buildMasks(file, seriesPath, labelPath):
     mask_img.CopyInformation(ref_img)
 
     nifti_dir = get_patient_nifti_dir(seriesPath)
-    patientID, modality, studyDate = getattr(file, 'PatientID', None), getattr(file, 'Modality', None), getattr(file, 'StudyDate', None)
-    output_filename = os.path.join(nifti_dir, f'{patientID}_{modality}_{studyDate}_mask.nii.gz')
+    patientID, modality, studyDate = (
+        getattr(file, "PatientID", None),
+        getattr(file, "Modality", None),
+        getattr(file, "StudyDate", None),
+    )
+    output_filename = os.path.join(
+        nifti_dir, f"{patientID}_{modality}_{studyDate}_mask.nii.gz"
+    )
     sitk.WriteImage(mask_img, output_filename, imageIO="NiftiImageIO")
+    return [output_filename]
 
-def convertFiles():
-    dicomFilePaths = []
-    dicomFileDirs = []
-    dicomFileTraits = []
-    dicomFileHeaders = []
-    dicomFileHeaderKeys = []
-    labelInstanceUIDs = []
-    seriesInstanceUIDs = []
-    labelPaths = []
-    seriesPaths = []
-
-    # Rename directories with overly long names
-    for _ in range(3):
-        for root, dirs, files in os.walk(IMAGE_FOLDER_PATH):
-            for dir in dirs:
-                if len(dir) > 20:
-                    i = 5
-                    while os.path.exists(os.path.join(root, dir[:i])):
-                        i += 1
-                    newDir = dir[:i]
-                    os.rename(os.path.join(root, dir), os.path.join(root, newDir))
-
-    # Collect DICOM file paths
-    for root, dirs, files in os.walk(IMAGE_FOLDER_PATH):
+
+def getDimensions(file):
+    # Shape of the pixel array of the file, taken from its header
+    rows, columns = getattr(file, "Rows", None), getattr(file, "Columns", None)
+    if rows is None or columns is None:
+        return (0,)
+    frames = int(getattr(file, "NumberOfFrames", 1) or 1)
+    return (frames, rows, columns) if frames > 1 else (rows, columns)
+
+
+def getReferencedSeriesUID(file):
+    try:
+        return str(
+            file.ReferencedFrameOfReferenceSequence[0]
+            .RTReferencedStudySequence[0]
+            .RTReferencedSeriesSequence[0]
+            .SeriesInstanceUID
+        )
+    except (AttributeError, IndexError):
+        return None
+
+
+def buildDicomIndex(rootPath):
+    """
+    Groups the DICOM files below rootPath by directory and reads the header of the first file of each directory once,
+    without its pixel data. Returns the directories in walk order, the directory of each image series by
+    SeriesInstanceUID, and the RTSTRUCT files with the SeriesInstanceUID they reference.
+    """
+    directories = []
+    for root, dirs, files in os.walk(rootPath):
         for file in files:
-            if file.endswith('.dcm'):
+            if file.endswith(".dcm"):
                 filePath = winapi_path(os.path.join(root, file))
                 fileDirname = os.path.dirname(filePath)
-                if len(dicomFilePaths) > 0 and fileDirname == dicomFileDirs[-1]:
-                    dicomFilePaths[-1].append(filePath)
+                if len(directories) > 0 and fileDirname == directories[-1]["dir"]:
+                    directories[-1]["files"].append(filePath)
                 else:
-                    dicomFilePaths.append([filePath])
-                    dicomFileDirs.append(fileDirname)
-
-    # Analyze DICOM files
-    for i in range(len(dicomFilePaths)):
-        if i % 10 == 0 or i == len(dicomFilePaths)-1:
-            print(f'Processing {round((i + 1) / len(dicomFilePaths) * 100, 2)}% of files')
-        file = pydicom.dcmread(dicomFilePaths[i][0], force=True)
-        headers = getDicomHeaders(file)
-        traits = {
-            "Patient ID": getattr(file, 'PatientID', None),
-            "Patient's Sex": getattr(file, 'PatientSex', None),
-            "Patient's Age": getattr(file, 'PatientAge', None),
-            "Patient's Birth Date": getattr(file, 'PatientBirthDate', None),
-            "Patient's Weight": getattr(file, 'PatientWeight', None),
-            "Institution Name": getattr(file, 'InstitutionName', None),
-            "Referring Physician's Name": getattr(file, 'ReferringPhysicianName', None),
-            "Operator's Name": getattr(file, 'OperatorsName', None),
-            "Study Date": getattr(file, 'StudyDate', None),
-            "Study Time": getattr(file, 'StudyTime', None),
-            "Modality": getattr(file, 'Modality', None),
-            "Series Description": getattr(file, 'SeriesDescription', None),
-            "Dimensions": np.array(getattr(file, 'pixel_array', np.array([]))).shape,
-        }
-        for key in headers.keys():
-            if key not in dicomFileHeaderKeys:
-                dicomFileHeaderKeys.append(key)
-        dicomFileTraits.append(traits)
-        dicomFileHeaders.append(headers)
-
-        fileModality = getattr(file, 'Modality', None)
-
-        # If it's an RTSTRUCT, track the referenced SeriesInstanceUID
-        if fileModality == 'RTSTRUCT':
-            seriesInstanceUID = headers['30060010']['Value'][0]['30060012']['Value'][0]['30060014']['Value'][0]['0020000E']['Value'][0]
-            labelInstanceUIDs.append(seriesInstanceUID)
-            labelPaths.append(dicomFilePaths[i][0])
-
-    # Identify which series correspond to RTSTRUCT
-    for i in range(len(dicomFileDirs)):
-        if i % 10 == 0 or i == len(dicomFileDirs)-1:
-            print(f'Scanning series directories {round((i+1)/len(dicomFileDirs)*100, 2)}%')
-        file = pydicom.dcmread(dicomFilePaths[i][0], force=True)
-        fileModality = getattr(file, 'Modality', None)
-        seriesInstanceUID = getDicomHeaders(file)['0020000E']['Value'][0]
-        if fileModality != 'RTSTRUCT':
-            if seriesInstanceUID in labelInstanceUIDs:
-                seriesPaths.append(dicomFileDirs[i])
-                seriesInstanceUIDs.append(seriesInstanceUID)
-
-    labelInstanceUIDs, labelPaths = sortParallelLists(labelInstanceUIDs, labelPaths)
-    seriesInstanceUIDs, seriesPaths = sortParallelLists(seriesInstanceUIDs, seriesPaths)
+                    directories.append({"dir": fileDirname, "files": [filePath]})
+
+    series = {}
+    labels = []
+    for i, directory in enumerate(directories):
+        if i % 10 == 0 or i == len(directories) - 1:
+            print(f"Reading headers {round((i + 1) / len(directories) * 100, 2)}%")
+        header = pydicom.dcmread(
+            directory["files"][0], stop_before_pixels=True, force=True
+        )
+        directory["header"] = header
+        directory["modality"] = getattr(header, "Modality", None)
+        if directory["modality"] == "RTSTRUCT":
+            labels.append(
+                {
+                    "path": directory["files"][0],
+                    "header": header,
+                    "seriesInstanceUID": getReferencedSeriesUID(header),
+                }
+            )
+        elif "SeriesInstanceUID" in header:
+            series.setdefault(str(header.SeriesInstanceUID), directory)
+
+    return {"directories": directories, "series": series, "labels": labels}
+
+
+def getTraits(file):
+    return {
+        "Patient ID": getattr(file, "PatientID", None),
+        "Patient's Sex": getattr(file, "PatientSex", None),
+        "Patient's Age": getattr(file, "PatientAge", None),
+        "Patient's Birth Date": getattr(file, "PatientBirthDate", None),
+        "Patient's Weight": getattr(file, "PatientWeight", None),
+        "Institution Name": getattr(file, "InstitutionName", None),
+        "Referring Physician's Name": getattr(file, "ReferringPhysicianName", None),
+        "Operator's Name": getattr(file, "OperatorsName", None),
+        "Study Date": getattr(file, "StudyDate", None),
+        "Study Time": getattr(file, "StudyTime", None),
+        "Modality": getattr(file, "Modality", None),
+        "Series Description": getattr(file, "SeriesDescription", None),
+        "Dimensions": getDimensions(file),
+    }
+
+
+def renameLongDirs(rootPath):
+    # Shortens directory names longer than 20 characters in a single pass, already shortened names are left alone
+    for root, dirs, files in os.walk(rootPath):
+        for j, dir in enumerate(dirs):
+            if len(dir) > 20:
+                i = 5
+                while os.path.exists(os.path.join(root, dir[:i])):
+                    i += 1
+                newDir = dir[:i]
+                os.rename(os.path.join(root, dir), os.path.join(root, newDir))
+                # Let os.walk descend into the renamed directory
+                dirs[j] = newDir
+
+
+def getFingerprint(filePaths):
+    # Changes whenever a file is added, removed, replaced or modified. File contents are not read, so copying
+    # the archive without preserving modification times (e.g. plain cp or some sync tools) reconverts everything
+    fingerprint = hashlib.sha1()
+    for filePath in sorted(filePaths):
+        stat = os.stat(filePath)
+        fingerprint.update(
+            f"{os.path.relpath(filePath, IMAGE_FOLDER_PATH)}|{stat.st_size}|{stat.st_mtime_ns}\n".encode()
+        )
+    return fingerprint.hexdigest()
+
+
+def loadManifest(manifestPath):
+    if INCREMENTAL and os.path.exists(manifestPath):
+        try:
+            with open(manifestPath) as f:
+                return json.load(f)
+        except Exception as e:
+            print("Ignoring unreadable manifest: ", manifestPath, e)
+    return {}
+
+
+def saveManifest(manifest, manifestPath):
+    # Write to a temporary file first, so an interrupted run never leaves a truncated manifest behind
+    tempPath = manifestPath + ".tmp"
+    with open(tempPath, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tempPath, manifestPath)
+
+
+def isConverted(manifest, key, fingerprint):
+    entry = manifest.get(key)
+    return (
+        INCREMENTAL
+        and entry is not None
+        and entry["fingerprint"] == fingerprint
+        and all(
+            os.path.exists(os.path.join(IMAGE_FOLDER_PATH, output))
+            for output in entry["outputs"]
+        )
+    )
+
+
+def convertFiles():
+    renameLongDirs(IMAGE_FOLDER_PATH)
+
+    # Read the header of each directory once, all later stages use the index
+    index = buildDicomIndex(IMAGE_FOLDER_PATH)
+    directories = index["directories"]
 
     # Save attributes
-    if len(dicomFilePaths) > 0:
+    if len(directories) > 0:
         data_dir = os.path.join(IMAGE_FOLDER_PATH, "data")
         if not os.path.exists(data_dir):
             os.makedirs(data_dir)
-        with open(os.path.join(IMAGE_FOLDER_PATH, ATTRIBUTE_FILE_NAME), 'w', encoding='UTF8', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=dicomFileTraits[0].keys())
+        with open(
+            os.path.join(IMAGE_FOLDER_PATH, ATTRIBUTE_FILE_NAME),
+            "w",
+            encoding="UTF8",
+            newline="",
+        ) as f:
+            writer = csv.DictWriter(
+                f, fieldnames=getTraits(directories[0]["header"]).keys()
+            )
             writer.writeheader()
-            writer.writerows(dicomFileTraits)
-        
+            writer.writerows(
+                getTraits(directory["header"]) for directory in directories
+            )
+
         if SAVE_JSON:
-            with open(os.path.join(IMAGE_FOLDER_PATH, HEADERS_FILE_NAME), 'w') as f:
-                json.dump(dicomFileHeaders, f)
+            with open(os.path.join(IMAGE_FOLDER_PATH, HEADERS_FILE_NAME), "w") as f:
+                json.dump(
+                    [getDicomHeaders(directory["header"]) for directory in directories],
+                    f,
+                )
+
+    # Each converted series and RTSTRUCT is recorded with the fingerprint of its input files and its outputs,
+    # the manifest is saved after every item so an interrupted run resumes where it stopped
+    manifestPath = os.path.join(IMAGE_FOLDER_PATH, MANIFEST_FILE_NAME)
+    manifest = loadManifest(manifestPath)
+    converted = {}
+
+    def convert(key, filePaths, func, *args):
+        fingerprint = getFingerprint(filePaths)
+        if isConverted(manifest, key, fingerprint):
+            converted[key] = manifest[key]
+            return
+        # Inputs and outputs are recorded relative to IMAGE_FOLDER_PATH, so the archive may be moved or remounted
+        outputs = [os.path.relpath(output, IMAGE_FOLDER_PATH) for output in func(*args)]
+        manifest[key] = converted[key] = {
+            "fingerprint": fingerprint,
+            "outputs": outputs,
+        }
+        saveManifest(manifest, manifestPath)
 
     # Convert PET series to NIFTI
-    for i in range(len(dicomFileDirs)):
-        if i % 10 == 0 or i == len(dicomFileDirs)-1:
-            print(f'Converting PET series to NIFTI {round((i+1)/len(dicomFileDirs)*100, 2)}%')
-        if len(dicomFilePaths[i]) > 1:
-            file = pydicom.dcmread(dicomFilePaths[i][0], force=True)
-            fileModality = getattr(file, 'Modality', None)
-            if fileModality == 'PT':
-                dicomToNifti(file, dicomFileDirs[i])
-
-    # Convert RTSTRUCT to NIFTI masks
-    for i in range(min([len(labelPaths), len(seriesPaths)])):
-        if i % 10 == 0 or i == len(dicomFileDirs)-1:
-            print(f'Converting RTSTRUCT to NIFTI masks {round((i+1)/min([len(labelPaths), len(seriesPaths)])*100, 2)}%')
-        file_label = pydicom.dcmread(labelPaths[i], force=True)
-        if len(labelInstanceUIDs) != len(seriesInstanceUIDs):
-            # Need to match label's UID to a series UID
-            j = 0
-            if len(labelInstanceUIDs) < len(seriesInstanceUIDs):
-                while (i + j) < len(seriesInstanceUIDs) and labelInstanceUIDs[i] != seriesInstanceUIDs[i+j]:
-                    j += 1
-                try:
-                    buildMasks(file_label, seriesPaths[i+j], labelPaths[i])
-                except:
-                    print('Failed to build mask for label: ', labelPaths[i])
-            else:
-                while (i + j) < len(labelInstanceUIDs) and seriesInstanceUIDs[i] != labelInstanceUIDs[i+j]:
-                    j += 1
-                try:
-                    buildMasks(pydicom.dcmread(labelPaths[i+j], force=True), seriesPaths[i], labelPaths[i+j])
-                except:
-                    print('Failed to build mask for label: ', labelPaths[i+j])
-        else:
-            try:
-                buildMasks(file_label, seriesPaths[i], labelPaths[i])
-            except:
-                print('Failed to build mask for label: ', labelPaths[i])
-
-    print('Done! Created NIFTI files in the NIFTI folder inside each patient directory.')
-
-if __name__ == '__main__':
+    petDirectories = [
+        directory
+        for directory in directories
+        if len(directory["files"]) > 1 and directory["modality"] == "PT"
+    ]
+    for i, directory in enumerate(petDirectories):
+        if i % 10 == 0 or i == len(petDirectories) - 1:
+            print(
+                f"Converting PET series to NIFTI {round((i+1)/len(petDirectories)*100, 2)}%"
+            )
+        key = "series:" + os.path.relpath(directory["dir"], IMAGE_FOLDER_PATH)
+        convert(
+            key, directory["files"], dicomToNifti, directory["header"], directory["dir"]
+        )
+
+    # Convert RTSTRUCT to NIFTI masks, joining each label to the series it references
+    labels = index["labels"]
+    for i, label in enumerate(labels):
+        if i % 10 == 0 or i == len(labels) - 1:
+            print(
+                f"Converting RTSTRUCT to NIFTI masks {round((i+1)/len(labels)*100, 2)}%"
+            )
+        series = index["series"].get(label["seriesInstanceUID"])
+        if series is None:
+            print("No referenced series found for label: ", label["path"])
+            continue
+        key = "rtstruct:" + os.path.relpath(label["path"], IMAGE_FOLDER_PATH)
+        try:
+            convert(
+                key,
+                [label["path"]] + series["files"],
+                buildMasks,
+                label["header"],
+                series["dir"],
+                label["path"],
+            )
+        except Exception as e:
+            print("Failed to build mask for label: ", label["path"], e)
+
+    # Drop the entries of inputs that no longer exist
+    saveManifest(converted, manifestPath)
+
+    print(
+        "Done! Created NIFTI files in the NIFTI folder inside each patient directory."
+    )
+
+
+if __name__ == "__main__":
     convertFiles()
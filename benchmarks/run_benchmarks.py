@@ -0,0 +1,222 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pydicom
+
+import rt_utils
+from rt_utils import RTStructBuilder, RTStructMerger
+from benchmarks.synthetic_data import (
+    SyntheticDataConfig,
+    generate_ct_series,
+    generate_roi_masks,
+    generate_rtstruct,
+)
+
+"""
+File contains the benchmark runner, which times and memory-profiles the main operations of rt-utils
+on synthetic data and writes the results as JSON.
+
+Run from the repository root, e.g.
+    python -m benchmarks.run_benchmarks --slices 128 --rows 512 --columns 512 --output results.json
+"""
+
+
+def measure(
+    setup: Callable[[], object], func: Callable[[object], object], repeat: int
+) -> dict:
+    """
+    Times `repeat` calls of `func` on fresh results of `setup`, then measures the peak memory
+    allocated by one more call with tracemalloc, which is not timed since tracing slows it down
+    """
+    times = []
+    for _ in range(repeat):
+        argument = setup()
+        gc.collect()
+        start = time.perf_counter()
+        func(argument)
+        times.append(time.perf_counter() - start)
+
+    argument = setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(argument)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "times_s": times,
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def run_benchmarks(
+    config: SyntheticDataConfig,
+    repeat: int,
+    work_dir: str,
+    only: Optional[List[str]] = None,
+) -> Dict[str, dict]:
+    series_path = os.path.join(work_dir, "series")
+    generate_ct_series(series_path, config)
+    rt_struct_path = generate_rtstruct(
+        series_path, os.path.join(work_dir, "rt"), config
+    )
+    other_rt_struct_path = generate_rtstruct(
+        series_path, os.path.join(work_dir, "other_rt"), config, seed=config.seed + 1
+    )
+
+    loaded_rtstruct = RTStructBuilder.create_from(series_path, rt_struct_path)
+    roi_names = loaded_rtstruct.get_roi_names()
+    mask = generate_roi_masks(loaded_rtstruct.series_data, config)[0]
+    save_path = os.path.join(work_dir, "saved.dcm")
+
+    def new_rtstruct():
+        return RTStructBuilder.create_new(series_path)
+
+    def add_roi(**kwargs):
+        return lambda rtstruct: rtstruct.add_roi(mask, name="benchmark", **kwargs)
+
+    def save(rtstruct):
+        rtstruct.save(save_path)
+
+    benchmarks = {
+        "create_new": (lambda: None, lambda _: new_rtstruct()),
+        "create_from": (
+            lambda: None,
+            lambda _: RTStructBuilder.create_from(series_path, rt_struct_path),
+        ),
+        "add_roi_voxel_center": (new_rtstruct, add_roi(contour_mode="voxel_center")),
+        "add_roi_voxel_edge": (new_rtstruct, add_roi(contour_mode="voxel_edge")),
+        "add_roi_pin_hole": (new_rtstruct, add_roi(use_pin_hole=True)),
+        "get_roi_mask_by_name": (
+            lambda: loaded_rtstruct,
+            lambda rtstruct: rtstruct.get_roi_mask_by_name(roi_names[0]),
+        ),
+        "get_all_roi_masks": (
+            lambda: loaded_rtstruct,
+            lambda rtstruct: rtstruct.get_all_roi_masks(),
+        ),
+        "merge_rtstructs": (
+            lambda: None,
+            lambda _: RTStructMerger.merge_rtstructs(
+                series_path, rt_struct_path, other_rt_struct_path
+            ),
+        ),
+        "save": (
+            lambda: RTStructBuilder.create_from(series_path, rt_struct_path),
+            save,
+        ),
+    }
+
+    results = {}
+    for name, (setup, func) in benchmarks.items():
+        if only and name not in only:
+            continue
+        results[name] = measure(setup, func, repeat)
+        print(
+            f"{name:<24} median {results[name]['median_s']:9.4f} s"
+            f"   peak {results[name]['peak_memory_bytes'] / 1024**2:9.1f} MiB"
+        )
+    return results
+
+
+def get_environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "rt_utils": rt_utils.__version__,
+        "numpy": np.__version__,
+        "pydicom": pydicom.__version__,
+    }
+
+
+def compare_results(results: Dict[str, dict], baseline: Dict[str, dict]):
+    """
+    Prints the ratio of the median time and peak memory of each benchmark to those of a baseline run
+    """
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        time_ratio = result["median_s"] / baseline[name]["median_s"]
+        memory_ratio = result["peak_memory_bytes"] / max(
+            baseline[name]["peak_memory_bytes"], 1
+        )
+        print(f"{name:<24} time x{time_ratio:6.2f}   memory x{memory_ratio:6.2f}")
+
+
+def parse_args(args=None) -> argparse.Namespace:
+    defaults = SyntheticDataConfig()
+    parser = argparse.ArgumentParser(
+        description="Benchmark rt-utils on a synthetic CT series"
+    )
+    parser.add_argument("--slices", type=int, default=defaults.slice_count)
+    parser.add_argument("--rows", type=int, default=defaults.rows)
+    parser.add_argument("--columns", type=int, default=defaults.columns)
+    parser.add_argument("--rois", type=int, default=defaults.roi_count)
+    parser.add_argument("--complexity", type=int, default=defaults.contour_complexity)
+    parser.add_argument("--holes", type=int, default=defaults.hole_count)
+    parser.add_argument("--oblique-angle", type=float, default=defaults.oblique_angle)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="Names of the benchmarks to run")
+    parser.add_argument("--output", help="Path of the JSON results file")
+    parser.add_argument(
+        "--compare", help="Path of a JSON results file to compare against"
+    )
+    parser.add_argument(
+        "--work-dir",
+        help="Directory for the generated data, a temporary one by default",
+    )
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(args)
+    config = SyntheticDataConfig(
+        slice_count=args.slices,
+        rows=args.rows,
+        columns=args.columns,
+        oblique_angle=args.oblique_angle,
+        roi_count=args.rois,
+        contour_complexity=args.complexity,
+        hole_count=args.holes,
+        seed=args.seed,
+    )
+
+    if args.work_dir is None:
+        with tempfile.TemporaryDirectory() as work_dir:
+            results = run_benchmarks(config, args.repeat, work_dir, args.only)
+    else:
+        results = run_benchmarks(config, args.repeat, args.work_dir, args.only)
+
+    report = {
+        "config": config.to_dict(),
+        "repeat": args.repeat,
+        "environment": get_environment(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare_results(results, json.load(file)["results"])
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
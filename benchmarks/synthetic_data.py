@@ -0,0 +1,172 @@
+import os
+from dataclasses import asdict, dataclass
+from typing import List, Optional
+
+import numpy as np
+from pydicom.dataset import FileDataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, PYDICOM_IMPLEMENTATION_UID, generate_uid
+
+from rt_utils import RTStructBuilder
+from rt_utils.image_helper import get_series_mask_shape
+
+"""
+File contains generators of synthetic CT series, ROI masks and RTStructs for the benchmarks
+"""
+
+CT_IMAGE_STORAGE = "1.2.840.10008.5.1.4.1.1.2"
+
+
+@dataclass
+class SyntheticDataConfig:
+    """Size and shape of a generated series and the ROIs of its RTStruct."""
+
+    slice_count: int = 64
+    rows: int = 256
+    columns: int = 256
+    pixel_spacing: float = 1.0
+    slice_thickness: float = 2.0
+    # Tilt of the image planes around the patient x axis in degrees, 0 for axial slices
+    oblique_angle: float = 0.0
+    roi_count: int = 4
+    # Number of lobes along the outline of each ROI, higher values give more contour points
+    contour_complexity: int = 6
+    # Number of holes cut through each ROI
+    hole_count: int = 2
+    seed: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def generate_ct_series(output_dir: str, config: SyntheticDataConfig) -> List[str]:
+    """
+    Writes one CT image file per slice to the output directory and returns their paths
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(config.seed)
+
+    angle = np.radians(config.oblique_angle)
+    row_direction = np.array([1.0, 0.0, 0.0])
+    column_direction = np.array([0.0, np.cos(angle), -np.sin(angle)])
+    slice_direction = np.cross(row_direction, column_direction)
+    origin = np.array(
+        [
+            -config.columns * config.pixel_spacing / 2,
+            -config.rows * config.pixel_spacing / 2,
+            -config.slice_count * config.slice_thickness / 2,
+        ]
+    )
+
+    study_instance_uid = generate_uid()
+    series_instance_uid = generate_uid()
+    frame_of_reference_uid = generate_uid()
+    # Slices share the same noise image, the pixel values do not affect any benchmarked operation
+    pixel_data = rng.integers(
+        -1000, 1000, (config.rows, config.columns), dtype=np.int16
+    ).tobytes()
+
+    file_paths = []
+    for i in range(config.slice_count):
+        file_meta = FileMetaDataset()
+        file_meta.MediaStorageSOPClassUID = CT_IMAGE_STORAGE
+        file_meta.MediaStorageSOPInstanceUID = generate_uid()
+        file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+        file_meta.ImplementationClassUID = PYDICOM_IMPLEMENTATION_UID
+
+        file_path = os.path.join(output_dir, f"ct_{i + 1}.dcm")
+        ds = FileDataset(file_path, {}, file_meta=file_meta, preamble=b"\0" * 128)
+        ds.SOPClassUID = file_meta.MediaStorageSOPClassUID
+        ds.SOPInstanceUID = file_meta.MediaStorageSOPInstanceUID
+        ds.Modality = "CT"
+        ds.PatientName = "Synthetic^Benchmark"
+        ds.PatientID = "SYNTHETIC"
+        ds.StudyDate = "20240101"
+        ds.StudyTime = "120000"
+        ds.StudyID = "1"
+        ds.StudyInstanceUID = study_instance_uid
+        ds.SeriesInstanceUID = series_instance_uid
+        ds.SeriesNumber = 1
+        ds.FrameOfReferenceUID = frame_of_reference_uid
+        ds.InstanceNumber = i + 1
+        ds.ImagePositionPatient = list(
+            origin + i * config.slice_thickness * slice_direction
+        )
+        ds.ImageOrientationPatient = list(row_direction) + list(column_direction)
+        ds.PixelSpacing = [config.pixel_spacing, config.pixel_spacing]
+        ds.SliceThickness = config.slice_thickness
+        ds.Rows = config.rows
+        ds.Columns = config.columns
+        ds.SamplesPerPixel = 1
+        ds.PhotometricInterpretation = "MONOCHROME2"
+        ds.BitsAllocated = 16
+        ds.BitsStored = 16
+        ds.HighBit = 15
+        ds.PixelRepresentation = 1
+        ds.RescaleIntercept = 0
+        ds.RescaleSlope = 1
+        ds.PixelData = pixel_data
+        try:
+            ds.save_as(file_path, enforce_file_format=True)
+        except TypeError:
+            # pydicom 2 takes the encoding from the dataset
+            ds.is_implicit_VR = False
+            ds.is_little_endian = True
+            ds.save_as(file_path, write_like_original=False)
+        file_paths.append(file_path)
+
+    return file_paths
+
+
+def generate_roi_masks(
+    series_data, config: SyntheticDataConfig, seed: Optional[int] = None
+) -> List[np.ndarray]:
+    """
+    Returns `roi_count` boolean masks of lobed ellipsoids of the series shape, each with `hole_count` holes
+    """
+    rng = np.random.default_rng(config.seed if seed is None else seed)
+    mask_shape = get_series_mask_shape(series_data)
+    y, x = np.ogrid[: mask_shape[0], : mask_shape[1]]
+
+    masks = []
+    for _ in range(config.roi_count):
+        center = rng.uniform(0.3, 0.7, 3) * mask_shape
+        radii = rng.uniform(0.1, 0.25, 3) * mask_shape
+        phase = rng.uniform(0, 2 * np.pi)
+        angles = np.arctan2(y - center[0], x - center[1])
+        lobes = 1 + 0.25 * np.sin(config.contour_complexity * angles + phase)
+        distances = ((y - center[0]) / radii[0]) ** 2 + (
+            (x - center[1]) / radii[1]
+        ) ** 2
+
+        mask = np.zeros(mask_shape, dtype=bool)
+        for i in range(mask_shape[2]):
+            height = 1 - ((i - center[2]) / radii[2]) ** 2
+            if height > 0:
+                mask[:, :, i] = distances < (height * lobes**2)
+
+        hole_radius = max(1.0, 0.15 * min(radii[:2]))
+        for _ in range(config.hole_count):
+            hole_center = center[:2] + rng.uniform(-0.4, 0.4, 2) * radii[:2]
+            hole = (y - hole_center[0]) ** 2 + (
+                x - hole_center[1]
+            ) ** 2 < hole_radius**2
+            mask &= ~hole[:, :, np.newaxis]
+        masks.append(mask)
+
+    return masks
+
+
+def generate_rtstruct(
+    series_path: str,
+    output_path: str,
+    config: SyntheticDataConfig,
+    seed: Optional[int] = None,
+) -> str:
+    """
+    Writes an RTStruct with the generated ROIs of the series and returns its path
+    """
+    rtstruct = RTStructBuilder.create_new(series_path)
+    for i, mask in enumerate(generate_roi_masks(rtstruct.series_data, config, seed)):
+        rtstruct.add_roi(mask, name=f"ROI {i + 1}")
+    rtstruct.save(output_path)
+    return output_path if output_path.endswith(".dcm") else output_path + ".dcm"
@@ -1,6 +1,22 @@
 from ._version import __version__
+from .packed_mask import PackedMask
+from .progress import CancellationToken, OperationCancelled
 from .rtstruct import RTStruct
 from .rtstruct_builder import RTStructBuilder
 from .rtstruct_merger import RTStructMerger
+from .rtstruct_writer import RTStructWriter
+from .series_cache import SeriesCache
+from .series_index import SeriesIndex
 
-__all__ = ["RTStruct", "RTStructBuilder", "RTStructMerger", "__version__"]
+__all__ = [
+    "CancellationToken",
+    "OperationCancelled",
+    "PackedMask",
+    "RTStruct",
+    "RTStructBuilder",
+    "RTStructMerger",
+    "RTStructWriter",
+    "SeriesCache",
+    "SeriesIndex",
+    "__version__",
+]
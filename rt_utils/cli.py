@@ -0,0 +1,399 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+import traceback
+from dataclasses import asdict, dataclass, field
+from multiprocessing.connection import wait
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rt_utils import image_helper
+from rt_utils.rtstruct_builder import RTStructBuilder
+from rt_utils.series_index import SeriesIndex
+
+"""
+File contains the command line interface, which converts RTStructs to NIfTI masks and back for a whole cohort
+directory, running one process per patient
+"""
+
+NIFTI_EXTENSIONS = (".nii", ".nii.gz")
+# Converts DICOM patient coordinates (LPS) to NIfTI world coordinates (RAS)
+LPS_TO_RAS = np.diag([-1.0, -1.0, 1.0, 1.0])
+
+
+@dataclass
+class JobResult:
+    """Outcome of the conversion of one patient."""
+
+    job: str
+    status: str
+    duration: float
+    outputs: List[str] = field(default_factory=list)
+    error_type: Optional[str] = None
+    error: Optional[str] = None
+    traceback: Optional[str] = None
+
+
+def import_nibabel():
+    try:
+        import nibabel
+    except ImportError:
+        raise ImportError(
+            "NIfTI conversion requires nibabel, install it with `pip install rt-utils[nifti]`"
+        )
+    return nibabel
+
+
+def get_nifti_affine(series_data) -> np.ndarray:
+    """
+    Returns the voxel to RAS matrix of a NIfTI image holding a mask of the series in (x, y, slice) axis order
+    """
+    pixel_to_patient = image_helper.get_pixel_to_patient_transformation_matrix(
+        series_data
+    )
+    return LPS_TO_RAS @ pixel_to_patient.astype(np.float64)
+
+
+def mask_to_nifti_array(mask: np.ndarray) -> np.ndarray:
+    # Masks are indexed [y, x, slice] while NIfTI images are indexed [x, y, slice]
+    return np.transpose(mask, (1, 0, 2)).astype(np.uint8)
+
+
+def nifti_array_to_mask(data: np.ndarray) -> np.ndarray:
+    return np.transpose(np.asarray(data) != 0, (1, 0, 2))
+
+
+def get_safe_file_name(name: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", name).strip("_") or "unnamed"
+
+
+def convert_rtstructs_to_nifti(
+    patient_path: str, output_path: str, combined: bool = False
+) -> List[str]:
+    """
+    Writes the masks of every RTStruct of a patient directory as NIfTI images to
+    `output_path/<RTStruct SeriesInstanceUID>/`, one image per ROI or a single union mask if `combined`
+    """
+    nibabel = import_nibabel()
+    series_index = SeriesIndex.from_path(patient_path)
+    rtstruct_entries = series_index.get_rtstruct_series()
+    if len(rtstruct_entries) == 0:
+        raise Exception(f"No RTStruct found in {patient_path}")
+
+    outputs = []
+    for entry in rtstruct_entries:
+        for rt_struct_path in entry.file_paths:
+            rtstruct = RTStructBuilder.create_from(series_index, rt_struct_path)
+            affine = get_nifti_affine(rtstruct.series_data)
+            rtstruct_output_path = os.path.join(
+                output_path, get_safe_file_name(str(rtstruct.ds.SeriesInstanceUID))
+            )
+            os.makedirs(rtstruct_output_path, exist_ok=True)
+
+            if combined:
+                mask = image_helper.create_empty_series_mask(rtstruct.series_data)
+                for name in rtstruct.get_roi_names():
+                    mask |= rtstruct.get_roi_mask_by_name(name)
+                masks = {"mask": mask}
+            else:
+                masks = rtstruct.get_all_roi_masks()
+
+            for name, mask in masks.items():
+                file_path = os.path.join(
+                    rtstruct_output_path, get_safe_file_name(name) + ".nii.gz"
+                )
+                nibabel.save(
+                    nibabel.Nifti1Image(mask_to_nifti_array(mask), affine), file_path
+                )
+                outputs.append(file_path)
+
+    return outputs
+
+
+def convert_nifti_to_rtstruct(
+    patient_path: str, masks_path: str, output_path: str, atol: float = 1e-3
+) -> List[str]:
+    """
+    Writes an RTStruct with one ROI per NIfTI mask found below `masks_path`, named after the mask file,
+    for the single image series of a patient directory. Masks must be on the voxel grid of the series
+    """
+    nibabel = import_nibabel()
+    mask_paths = sorted(
+        file_path
+        for extension in NIFTI_EXTENSIONS
+        for file_path in glob.glob(
+            os.path.join(masks_path, "**", "*" + extension), recursive=True
+        )
+    )
+    if len(mask_paths) == 0:
+        raise Exception(f"No NIfTI masks found in {masks_path}")
+
+    rtstruct = RTStructBuilder.create_new(SeriesIndex.from_path(patient_path))
+    affine = get_nifti_affine(rtstruct.series_data)
+    for mask_path in mask_paths:
+        image = nibabel.load(mask_path)
+        if not np.allclose(image.affine, affine, atol=atol):
+            raise Exception(
+                f"Mask {mask_path} is not on the voxel grid of the image series"
+            )
+
+        name = os.path.basename(mask_path)
+        for extension in NIFTI_EXTENSIONS:
+            if name.endswith(extension):
+                name = name[: -len(extension)]
+        rtstruct.add_roi(nifti_array_to_mask(image.dataobj), name=name)
+
+    os.makedirs(output_path, exist_ok=True)
+    file_path = os.path.join(output_path, "rtstruct.dcm")
+    rtstruct.save(file_path)
+    return [file_path]
+
+
+def run_job(func: Callable, args: tuple, connection):
+    """
+    Runs a job within its own process and sends its outputs or error back to the parent
+    """
+    try:
+        outputs = func(*args)
+        connection.send(("ok", outputs, None, None, None))
+    except Exception as e:
+        connection.send(
+            ("failed", [], type(e).__name__, str(e), traceback.format_exc())
+        )
+    finally:
+        connection.close()
+
+
+def run_jobs(
+    jobs: Sequence[Tuple[str, tuple]],
+    func: Callable,
+    max_jobs: int = 1,
+    timeout: Optional[float] = None,
+    on_result: Optional[Callable[[JobResult], None]] = None,
+) -> List[JobResult]:
+    """
+    Runs `func(*args)` for each (name, args) job in a separate process, with up to `max_jobs` processes at a time.
+    Processes running longer than `timeout` seconds are killed, so a stuck patient cannot block the cohort.
+    `func` and its arguments must be picklable. Results are returned in the order of `jobs`
+    """
+    if max_jobs < 1:
+        raise ValueError(f"Number of jobs must be at least 1, got {max_jobs}")
+
+    context = multiprocessing.get_context()
+    pending = list(enumerate(jobs))[::-1]
+    running = {}
+    results: Dict[int, JobResult] = {}
+
+    def finish(index: int, result: JobResult):
+        results[index] = result
+        if on_result is not None:
+            on_result(result)
+
+    while pending or running:
+        while pending and len(running) < max_jobs:
+            index, (name, args) = pending.pop()
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=run_job, args=(func, args, sender), daemon=True
+            )
+            process.start()
+            sender.close()
+            running[index] = (name, process, receiver, time.monotonic())
+
+        wait_timeout = None
+        if timeout is not None:
+            now = time.monotonic()
+            wait_timeout = max(
+                0.0, min(start + timeout - now for *_, start in running.values())
+            )
+        # Results are received as soon as they are readable, since a process sending a result larger than
+        # the pipe buffer only exits once it was read
+        waitables = [
+            waitable
+            for _, process, receiver, _ in running.values()
+            for waitable in (receiver, process.sentinel)
+        ]
+        ready = wait(waitables, wait_timeout)
+
+        for index in list(running):
+            name, process, receiver, start = running[index]
+            duration = time.monotonic() - start
+            if receiver in ready or process.sentinel in ready:
+                try:
+                    status, outputs, error_type, error, error_traceback = (
+                        receiver.recv()
+                    )
+                    process.join()
+                    finish(
+                        index,
+                        JobResult(
+                            name,
+                            status,
+                            duration,
+                            outputs,
+                            error_type,
+                            error,
+                            error_traceback,
+                        ),
+                    )
+                except EOFError:
+                    # The process exited without sending a result, e.g. it was killed or crashed
+                    process.join()
+                    finish(
+                        index,
+                        JobResult(
+                            name,
+                            "crashed",
+                            duration,
+                            error=f"Process exited with code {process.exitcode}",
+                        ),
+                    )
+            elif timeout is not None and duration >= timeout:
+                process.kill()
+                process.join()
+                finish(
+                    index,
+                    JobResult(
+                        name,
+                        "timeout",
+                        duration,
+                        error=f"Job exceeded the timeout of {timeout} s",
+                    ),
+                )
+            else:
+                continue
+            receiver.close()
+            del running[index]
+
+    return [results[index] for index in range(len(jobs))]
+
+
+def get_patient_paths(cohort_path: str) -> List[str]:
+    """
+    Returns the directories directly below the cohort directory, each holding the files of one patient
+    """
+    return sorted(entry.path for entry in os.scandir(cohort_path) if entry.is_dir())
+
+
+def write_report(report_path: str, results: List[JobResult], duration: float):
+    counts = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+
+    report = {
+        "total": len(results),
+        "counts": counts,
+        "duration_s": duration,
+        "jobs": [asdict(result) for result in results],
+    }
+    with open(report_path, "w") as file:
+        json.dump(report, file, indent=2)
+
+
+def print_result(result: JobResult):
+    message = f"[{result.status}] {result.job} ({result.duration:.1f} s)"
+    if result.error is not None:
+        message += f": {result.error_type or ''} {result.error}".rstrip()
+    print(message, file=sys.stderr if result.status != "ok" else sys.stdout)
+
+
+def parse_args(args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="rt-utils",
+        description="Convert RTStructs to NIfTI masks and back for every patient directory of a cohort",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_common_arguments(subparser):
+        subparser.add_argument(
+            "--jobs",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of patients converted at a time",
+        )
+        subparser.add_argument(
+            "--timeout",
+            type=float,
+            help="Seconds after which the conversion of a patient is killed",
+        )
+        subparser.add_argument(
+            "--report", help="Path of the JSON report of every patient"
+        )
+
+    to_nifti = subparsers.add_parser(
+        "rtstruct-to-nifti", help="Write the ROIs of every RTStruct as NIfTI masks"
+    )
+    to_nifti.add_argument(
+        "cohort", help="Directory with one subdirectory of DICOM files per patient"
+    )
+    to_nifti.add_argument(
+        "output",
+        help="Directory the masks are written to, one subdirectory per patient",
+    )
+    to_nifti.add_argument(
+        "--combined",
+        action="store_true",
+        help="Write the union of all ROIs as a single mask",
+    )
+    add_common_arguments(to_nifti)
+
+    to_rtstruct = subparsers.add_parser(
+        "nifti-to-rtstruct",
+        help="Write the NIfTI masks of every patient as an RTStruct",
+    )
+    to_rtstruct.add_argument(
+        "cohort", help="Directory with one subdirectory of DICOM files per patient"
+    )
+    to_rtstruct.add_argument(
+        "masks",
+        help="Directory with one subdirectory of NIfTI masks per patient, named as in the cohort. "
+        "Masks are searched recursively, so the output of rtstruct-to-nifti can be used",
+    )
+    to_rtstruct.add_argument(
+        "output",
+        help="Directory the RTStructs are written to, one subdirectory per patient",
+    )
+    add_common_arguments(to_rtstruct)
+
+    return parser.parse_args(args)
+
+
+def main(args=None) -> int:
+    args = parse_args(args)
+
+    jobs = []
+    for patient_path in get_patient_paths(args.cohort):
+        patient = os.path.basename(patient_path)
+        output_path = os.path.join(args.output, patient)
+        if args.command == "rtstruct-to-nifti":
+            jobs.append((patient, (patient_path, output_path, args.combined)))
+        else:
+            jobs.append(
+                (
+                    patient,
+                    (patient_path, os.path.join(args.masks, patient), output_path),
+                )
+            )
+    func = (
+        convert_rtstructs_to_nifti
+        if args.command == "rtstruct-to-nifti"
+        else convert_nifti_to_rtstruct
+    )
+
+    start = time.monotonic()
+    results = run_jobs(jobs, func, args.jobs, args.timeout, print_result)
+    duration = time.monotonic() - start
+    if args.report is not None:
+        write_report(args.report, results, duration)
+
+    failures = sum(result.status != "ok" for result in results)
+    print(
+        f"Converted {len(results) - failures} of {len(results)} patients in {duration:.1f} s"
+    )
+    return 1 if failures else 0
@@ -1,7 +1,16 @@
 import datetime
+import re
+from typing import Optional
 from rt_utils.image_helper import get_contours_coords
+from rt_utils.instrumentation import stage
+from rt_utils.parallel import Workers
+from rt_utils.progress import CancellationToken, ProgressCounter
+from rt_utils.roi_index import ROIIndex
 from rt_utils.utils import ROIData, SOPClassUID
 import numpy as np
+from pydicom.charset import default_encoding
+from pydicom.dataelem import RawDataElement
+from pydicom.tag import Tag
 from pydicom.uid import generate_uid
 from pydicom.dataset import Dataset, FileDataset, FileMetaDataset
 from pydicom.sequence import Sequence
@@ -11,6 +20,11 @@ from pydicom.uid import ImplicitVRLittleEndian
 File contains helper methods that handles DICOM header creation/formatting
 """
 
+# Maximum number of bytes of a single DS (decimal string) value, as per NEMA DICOM standard guidelines
+DS_MAX_LENGTH = 16
+# Maximum number of decimal places written to ContourData
+CONTOUR_DATA_DECIMALS = 10
+
 
 def create_rtstruct_dataset(series_data) -> FileDataset:
     ds = generate_base_dataset()
@@ -98,8 +112,12 @@ def add_patient_information(ds: FileDataset, series_data):
 
 def add_refd_frame_of_ref_sequence(ds: FileDataset, series_data):
     refd_frame_of_ref = Dataset()
-    refd_frame_of_ref.FrameOfReferenceUID =  getattr(series_data[0], 'FrameOfReferenceUID', generate_uid())
-    refd_frame_of_ref.RTReferencedStudySequence = create_frame_of_ref_study_sequence(series_data)
+    refd_frame_of_ref.FrameOfReferenceUID = getattr(
+        series_data[0], "FrameOfReferenceUID", generate_uid()
+    )
+    refd_frame_of_ref.RTReferencedStudySequence = create_frame_of_ref_study_sequence(
+        series_data
+    )
 
     # Add to sequence
     ds.ReferencedFrameOfReferenceSequence = Sequence()
@@ -149,28 +167,71 @@ def create_structure_set_roi(roi_data: ROIData) -> Dataset:
     return structure_set_roi
 
 
-def create_roi_contour(roi_data: ROIData, series_data) -> Dataset:
+def create_roi_contour(
+    roi_data: ROIData,
+    series_data,
+    workers: Workers = None,
+    use_processes: bool = False,
+    contours_coords: Optional[list] = None,
+    progress_counter: Optional[ProgressCounter] = None,
+    cancellation: Optional[CancellationToken] = None,
+) -> Dataset:
     roi_contour = Dataset()
     roi_contour.ROIDisplayColor = roi_data.color
-    roi_contour.ContourSequence = create_contour_sequence(roi_data, series_data)
+    roi_contour.ContourSequence = create_contour_sequence(
+        roi_data,
+        series_data,
+        workers,
+        use_processes,
+        contours_coords,
+        progress_counter,
+        cancellation,
+    )
     roi_contour.ReferencedROINumber = str(roi_data.number)
     return roi_contour
 
 
-def create_contour_sequence(roi_data: ROIData, series_data) -> Sequence:
+def create_contour_sequence(
+    roi_data: ROIData,
+    series_data,
+    workers: Workers = None,
+    use_processes: bool = False,
+    contours_coords: Optional[list] = None,
+    progress_counter: Optional[ProgressCounter] = None,
+    cancellation: Optional[CancellationToken] = None,
+) -> Sequence:
     """
     Iterate through each slice of the mask
     For each connected segment within a slice, create a contour
+    Slices may be processed by a pool of `workers`, see `image_helper.get_contours_coords`
+    Contours that were already generated per slice can be passed in as `contours_coords` instead of a mask
     """
 
     contour_sequence = Sequence()
 
-    contours_coords = get_contours_coords(roi_data, series_data)
-
-    for series_slice, slice_contours in zip(series_data, contours_coords):
-        for contour_data in slice_contours:
-            contour = create_contour(series_slice, contour_data)
-            contour_sequence.append(contour)
+    if contours_coords is None:
+        contours_coords = get_contours_coords(
+            roi_data,
+            series_data,
+            workers,
+            use_processes,
+            progress_counter,
+            cancellation,
+        )
+
+    with stage("create_contour_datasets") as dataset_stage:
+        for series_slice, slice_contours in zip(series_data, contours_coords):
+            for contour_data in slice_contours:
+                contour = create_contour(series_slice, contour_data)
+                contour_sequence.append(contour)
+        dataset_stage.add(contours=len(contour_sequence))
+        if dataset_stage.enabled:
+            dataset_stage.add(
+                bytes=sum(
+                    contour.get_item("ContourData").length
+                    for contour in contour_sequence
+                )
+            )
 
     return contour_sequence
 
@@ -193,12 +254,54 @@ def create_contour(series_slice: Dataset, contour_data: np.ndarray) -> Dataset:
         len(contour_data) / 3
     )  # Each point has an x, y, and z value
 
-    # Rounds ContourData to 10 decimal places to ensure it is <16 bytes length, as per NEMA DICOM standard guidelines.
-    contour.ContourData = [round(val, 10) for val in contour_data]
+    # ContourData is encoded once as a whole and written to file as is, see encode_ds_values
+    encoded_contour_data = encode_ds_values(contour_data)
+    contour.add(
+        RawDataElement(
+            Tag("ContourData"),
+            "DS",
+            len(encoded_contour_data),
+            encoded_contour_data,
+            0,
+            True,
+            True,
+        )
+    )
+    contour.set_original_encoding(True, True, default_encoding)
 
     return contour
 
 
+def encode_ds_values(values: np.ndarray) -> bytes:
+    """
+    Encodes all values as a single multi-valued DS byte string, padded to an even length.
+    Values are formatted with the same number of decimal places, at most CONTOUR_DATA_DECIMALS,
+    such that each value fits in DS_MAX_LENGTH bytes. Trailing zeros are removed.
+    """
+    values = np.asarray(values, dtype=float).ravel()
+    if len(values) == 0:
+        return b""
+
+    # Leave room for the integer part of the largest value rounding up and for a minus sign
+    integer_digits = len(str(int(np.max(np.abs(values))) + 1))
+    sign_length = 1 if np.any(values < 0) else 0
+    decimals = max(
+        0, min(CONTOUR_DATA_DECIMALS, DS_MAX_LENGTH - sign_length - integer_digits - 1)
+    )
+
+    # Adding zero turns values that round to -0 into 0
+    values = np.round(values, decimals) + 0.0
+    encoded_values = "\\".join([f"%.{decimals}f"] * len(values)) % tuple(
+        values.tolist()
+    )
+    if decimals > 0:
+        encoded_values = re.sub(r"\.?0+(?=\\|$)", "", encoded_values)
+
+    if len(encoded_values) % 2:
+        encoded_values += " "
+    return encoded_values.encode("ascii")
+
+
 def create_rtroi_observation(roi_data: ROIData) -> Dataset:
     rtroi_observation = Dataset()
     rtroi_observation.ObservationNumber = roi_data.number
@@ -211,14 +314,21 @@ def create_rtroi_observation(roi_data: ROIData) -> Dataset:
     return rtroi_observation
 
 
-def get_contour_sequence_by_roi_number(ds, roi_number):
-    for roi_contour in ds.ROIContourSequence:
-
-        # Ensure same type
-        if str(roi_contour.ReferencedROINumber) == str(roi_number):
-            if hasattr(roi_contour, "ContourSequence"):
-                return roi_contour.ContourSequence
-            else:
-                return Sequence()
+def get_contour_sequence_by_roi_number(
+    ds, roi_number, roi_index: Optional[ROIIndex] = None
+):
+    """
+    Returns the contour sequence of a single ROI, looked up in `roi_index` if given.
+    Pass the index of the RTStruct, see `RTStruct.get_roi_index`, when looking up several ROIs
+    """
+    if roi_index is not None:
+        roi_contour = roi_index.get_roi_contour(roi_number)
+        if roi_contour is not None:
+            return getattr(roi_contour, "ContourSequence", Sequence())
+    else:
+        for roi_contour in ds.ROIContourSequence:
+            # Ensure same type
+            if str(roi_contour.ReferencedROINumber) == str(roi_number):
+                return getattr(roi_contour, "ContourSequence", Sequence())
 
     raise Exception(f"Referenced ROI number '{roi_number}' not found")
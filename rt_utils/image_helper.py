@@ -1,5 +1,6 @@
 import os
-from typing import List
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 from enum import IntEnum
 
 import cv2 as cv
@@ -8,66 +9,231 @@ from pydicom import dcmread
 from pydicom.dataset import Dataset
 from pydicom.sequence import Sequence
 
+from rt_utils.instrumentation import stage
+from rt_utils.packed_mask import PackedMask, unpack_slice
+from rt_utils.parallel import Workers, map_ordered
+from rt_utils.progress import (
+    CancellationToken,
+    ProgressCounter,
+    advance,
+    create_result_callback,
+)
+from rt_utils.series_cache import SeriesCache, get_fingerprint
 from rt_utils.utils import ROIData, SOPClassUID
 
+# Values above this size are not read until accessed when pixel data is deferred
+DEFERRED_VALUE_SIZE = "1 KB"
 
-def load_sorted_image_series(dicom_series_path: str):
+
+def load_sorted_image_series(
+    dicom_series_path: str,
+    defer_pixel_data: bool = False,
+    workers: Workers = None,
+    use_processes: bool = False,
+    cache: Optional[SeriesCache] = None,
+):
     """
     File contains helper methods for loading / formatting DICOM images and contours
+
+    If `defer_pixel_data` is True, only the headers of each image are parsed and the
+    pixel data is read from disk the first time it is accessed.
+    Files are read in parallel if `workers` is given, see `parallel.map_ordered`.
+    If a `cache` is given, an unchanged series is loaded from it instead of parsing its files.
+    Pixel data is always deferred for series loaded through the cache.
     """
 
-    series_data = load_dcm_images_from_path(dicom_series_path)
+    if cache is not None:
+        series_data = cache.load(dicom_series_path)
+        if series_data is not None:
+            return series_data
+        # Cached datasets read their pixel data from the original files, which must not depend on the working directory
+        dicom_series_path = os.path.abspath(dicom_series_path)
+        defer_pixel_data = True
+        # Taken before reading, so that files modified while reading make the stored entry outdated
+        fingerprint = get_fingerprint(dicom_series_path)
+
+    series_data = load_dcm_images_from_path(
+        dicom_series_path, defer_pixel_data, workers, use_processes
+    )
 
     if len(series_data) == 0:
         raise Exception("No DICOM Images found in input path")
 
     # Sort slices in ascending order
-    series_data.sort(key=get_slice_position, reverse=False)
+    with stage("sort_slices") as sort_stage:
+        series_data.sort(key=get_slice_position, reverse=False)
+        sort_stage.add(slices=len(series_data))
+
+    if cache is not None:
+        cache.store(dicom_series_path, series_data, fingerprint)
 
     return series_data
 
 
-def load_dcm_images_from_path(dicom_series_path: str) -> List[Dataset]:
-    series_data = []
-    for root, _, files in os.walk(dicom_series_path):
-        for file in files:
-            try:
-                ds = dcmread(os.path.join(root, file))
-                if hasattr(ds, "pixel_array"):
-                    series_data.append(ds)
+def load_dcm_images_from_path(
+    dicom_series_path: str,
+    defer_pixel_data: bool = False,
+    workers: Workers = None,
+    use_processes: bool = False,
+) -> List[Dataset]:
+    with stage("discover_files") as discover_stage:
+        file_paths = [
+            os.path.join(root, file)
+            for root, _, files in os.walk(dicom_series_path)
+            for file in files
+        ]
+        discover_stage.add(files=len(file_paths))
+
+    # Results are kept in directory walk order so that sorting is deterministic
+    with stage("read_files") as read_stage:
+        series_data = map_ordered(
+            partial(read_dcm_image, defer_pixel_data=defer_pixel_data),
+            file_paths,
+            workers,
+            use_processes,
+        )
+        series_data = [ds for ds in series_data if ds is not None]
+        read_stage.add(files=len(file_paths), images=len(series_data))
+        if read_stage.enabled:
+            read_stage.add(
+                bytes=sum(os.path.getsize(file_path) for file_path in file_paths)
+            )
+    return series_data
 
-            except Exception:
-                # Not a valid DICOM file
-                continue
 
-    return series_data
+def load_pixel_data(series_data: List[Dataset]):
+    """
+    Reads the deferred pixel data of each image from its file
+    """
+    for series_slice in series_data:
+        series_slice["PixelData"]
+
 
+def read_dcm_image(file_path: str, defer_pixel_data: bool = False) -> Optional[Dataset]:
+    """
+    Returns the dataset of the DICOM image at the given path, or None if the file is
+    not a DICOM image.
 
-def get_contours_coords(roi_data: ROIData, series_data):
+    With `defer_pixel_data`, values larger than DEFERRED_VALUE_SIZE (i.e. the pixel data)
+    are skipped while parsing and only read from the file when they are accessed.
+    """
+    try:
+        if defer_pixel_data:
+            ds = dcmread(file_path, defer_size=DEFERRED_VALUE_SIZE)
+            is_image = "PixelData" in ds
+        else:
+            ds = dcmread(file_path)
+            is_image = hasattr(ds, "pixel_array")
+    except Exception:
+        # Not a valid DICOM file
+        return None
+
+    return ds if is_image else None
+
+
+def get_contours_coords(
+    roi_data: ROIData,
+    series_data,
+    workers: Workers = None,
+    use_processes: bool = False,
+    progress_counter: Optional[ProgressCounter] = None,
+    cancellation: Optional[CancellationToken] = None,
+):
+    """
+    Returns the contours of each slice of the ROI mask in patient coordinates.
+    Slices are processed in parallel if `workers` is given, see `parallel.map_ordered`.
+    The result is the same as processing them serially.
+    A `PackedMask` is unpacked one slice at a time by the worker processing the slice.
+    Each completed slice advances the `progress_counter`, and `cancellation` is checked between slices
+    """
     transformation_matrix = get_pixel_to_patient_transformation_matrix(series_data)
 
-    series_contours = []
-    for i, series_slice in enumerate(series_data):
-        mask_slice = roi_data.mask[:, :, i]
+    get_slice_contours = partial(
+        get_slice_contours_coords,
+        transformation_matrix=transformation_matrix,
+        use_pin_hole=roi_data.use_pin_hole,
+        approximate_contours=roi_data.approximate_contours,
+        contour_mode=roi_data.contour_mode,
+        simplify_tolerance=roi_data.simplify_tolerance,
+    )
+    if isinstance(roi_data.mask, PackedMask):
+        get_slice_contours = partial(
+            get_packed_slice_contours_coords,
+            columns=roi_data.mask.shape[1],
+            get_slice_contours=get_slice_contours,
+        )
+        slices = [(i, roi_data.mask.data[i]) for i in range(len(series_data))]
+    else:
+        slices = [(i, roi_data.mask[:, :, i]) for i in range(len(series_data))]
+
+    with stage("get_contours_coords") as contours_stage:
+        contours_coords = map_ordered(
+            get_slice_contours,
+            slices,
+            workers,
+            use_processes,
+            create_result_callback(progress_counter, cancellation),
+        )
+        if contours_stage.enabled:
+            add_contours_counts(contours_stage, contours_coords)
+    return contours_coords
+
+
+def add_contours_counts(contours_stage, contours_coords: List[list]):
+    contours_stage.add(
+        slices=len(contours_coords),
+        contours=sum(len(slice_contours) for slice_contours in contours_coords),
+        points=sum(
+            len(contour) // 3
+            for slice_contours in contours_coords
+            for contour in slice_contours
+        ),
+    )
 
-        # Do not add ROI's for blank slices
-        if np.sum(mask_slice) == 0:
-            series_contours.append([])
-            continue
 
-        # Create pin hole mask if specified
-        if roi_data.use_pin_hole:
-            mask_slice = create_pin_hole_mask(mask_slice, roi_data.approximate_contours)
+def get_packed_slice_contours_coords(
+    indexed_packed_slice: Tuple[int, np.ndarray], columns: int, get_slice_contours
+) -> list:
+    i, packed_slice = indexed_packed_slice
+    if not packed_slice.any():
+        return []
+    return get_slice_contours((i, unpack_slice(packed_slice, columns)))
+
+
+def get_slice_contours_coords(
+    indexed_mask_slice: Tuple[int, np.ndarray],
+    transformation_matrix: np.ndarray,
+    use_pin_hole: bool = False,
+    approximate_contours: bool = True,
+    contour_mode: str = "voxel_center",
+    simplify_tolerance: Optional[float] = None,
+) -> list:
+    """
+    Returns the contours of a single (slice index, mask slice) pair in patient coordinates.
+    If `simplify_tolerance` is given, contours are simplified in patient space, see `simplify_polygon`
+    """
+    i, mask_slice = indexed_mask_slice
+
+    # Do not add ROI's for blank slices
+    if not mask_slice.any():
+        return []
+
+    # Create pin hole mask if specified
+    if use_pin_hole:
+        mask_slice = create_pin_hole_mask(mask_slice, approximate_contours)
 
-        # Get contours from mask
+    # Get contours from mask
+    with stage("find_contours") as find_stage:
         contours, _ = find_mask_contours(
             mask_slice,
-            roi_data.approximate_contours,
-            contour_mode=roi_data.contour_mode,
+            approximate_contours,
+            contour_mode=contour_mode,
         )
         validate_contours(contours)
+        find_stage.add(contours=len(contours))
 
-        # Format for DICOM
+    # Format for DICOM
+    with stage("transform_contours") as transform_stage:
         formatted_contours = []
         for contour in contours:
             # Add z index
@@ -78,12 +244,108 @@ def get_contours_coords(roi_data: ROIData, series_data):
             transformed_contour = apply_transformation_to_3d_points(
                 contour, transformation_matrix
             )
-            dicom_formatted_contour = np.ravel(transformed_contour).tolist()
-            formatted_contours.append(dicom_formatted_contour)
+            if simplify_tolerance is not None:
+                transformed_contour = simplify_polygon(
+                    transformed_contour, simplify_tolerance
+                )
+            formatted_contours.append(np.ravel(transformed_contour))
+            transform_stage.add(points=len(transformed_contour))
+
+    return formatted_contours
+
+
+def get_labelmap_slice_labels(labelmap: np.ndarray) -> List[np.ndarray]:
+    """
+    Returns the non-zero labels present in each slice of a non-negative integer label map,
+    found from a histogram of each slice
+    """
+    slice_labels = []
+    for i in range(labelmap.shape[2]):
+        label_counts = np.bincount(labelmap[:, :, i].ravel())
+        slice_labels.append(np.flatnonzero(label_counts[1:]) + 1)
 
-        series_contours.append(formatted_contours)
+    return slice_labels
 
-    return series_contours
+
+def get_labelmap_contours_coords(
+    labelmap: np.ndarray,
+    series_data,
+    use_pin_hole: bool = False,
+    approximate_contours: bool = True,
+    contour_mode: str = "voxel_center",
+    workers: Workers = None,
+    use_processes: bool = False,
+    slice_labels: Optional[List[np.ndarray]] = None,
+    simplify_tolerance: Optional[float] = None,
+    progress_counter: Optional[ProgressCounter] = None,
+    cancellation: Optional[CancellationToken] = None,
+) -> Dict[int, list]:
+    """
+    Returns the contours of every non-zero label of an integer label map in patient coordinates,
+    keyed by label, in the same per-slice format as `get_contours_coords`.
+
+    Only the labels present in each slice (see `get_labelmap_slice_labels`) are processed, and only
+    one slice per label is converted to a binary mask at a time.
+    Slices are processed in parallel if `workers` is given, see `parallel.map_ordered`.
+    Each completed slice advances the `progress_counter`, and `cancellation` is checked between slices
+    """
+    transformation_matrix = get_pixel_to_patient_transformation_matrix(series_data)
+
+    if slice_labels is None:
+        slice_labels = get_labelmap_slice_labels(labelmap)
+    slices = [(i, labelmap[:, :, i], labels) for i, labels in enumerate(slice_labels)]
+
+    get_slice_contours = partial(
+        get_labelmap_slice_contours_coords,
+        transformation_matrix=transformation_matrix,
+        use_pin_hole=use_pin_hole,
+        approximate_contours=approximate_contours,
+        contour_mode=contour_mode,
+        simplify_tolerance=simplify_tolerance,
+    )
+    with stage("get_labelmap_contours_coords") as contours_stage:
+        slice_contours = map_ordered(
+            get_slice_contours,
+            slices,
+            workers,
+            use_processes,
+            create_result_callback(progress_counter, cancellation),
+        )
+
+        labels = sorted({int(label) for labels in slice_labels for label in labels})
+        contours_coords = {label: [[] for _ in series_data] for label in labels}
+        for i, label_contours in enumerate(slice_contours):
+            for label, contours in label_contours.items():
+                contours_coords[label][i] = contours
+        contours_stage.add(labels=len(labels))
+
+    return contours_coords
+
+
+def get_labelmap_slice_contours_coords(
+    indexed_labelmap_slice: Tuple[int, np.ndarray, np.ndarray],
+    transformation_matrix: np.ndarray,
+    use_pin_hole: bool = False,
+    approximate_contours: bool = True,
+    contour_mode: str = "voxel_center",
+    simplify_tolerance: Optional[float] = None,
+) -> Dict[int, list]:
+    """
+    Returns the contours of each of the given labels within a single (slice index, label map slice, labels) tuple
+    """
+    i, labelmap_slice, slice_labels = indexed_labelmap_slice
+
+    return {
+        int(label): get_slice_contours_coords(
+            (i, labelmap_slice == label),
+            transformation_matrix,
+            use_pin_hole,
+            approximate_contours,
+            contour_mode,
+            simplify_tolerance,
+        )
+        for label in slice_labels
+    }
 
 
 def find_mask_contours(
@@ -104,9 +366,12 @@ def find_mask_contours(
     approximation_method = (
         cv.CHAIN_APPROX_SIMPLE if approximate_contours else cv.CHAIN_APPROX_NONE
     )
-    contours, hierarchy = cv.findContours(
-        mask.astype(np.uint8), cv.RETR_TREE, approximation_method
-    )
+    # Boolean masks are passed to OpenCV as a uint8 view to avoid converting the whole slice
+    if mask.dtype == bool and mask.flags.c_contiguous:
+        image = mask.view(np.uint8)
+    else:
+        image = mask.astype(np.uint8)
+    contours, hierarchy = cv.findContours(image, cv.RETR_TREE, approximation_method)
     # Format extra array out of data
     contours = list(
         contours
@@ -124,6 +389,11 @@ def mask_to_edge_polygons(mask: np.ndarray) -> List[np.ndarray]:
     Returned vertices use OpenCV's ``(x, y)`` ordering and half-integer
     coordinates. Each foreground pixel is treated as a unit square centred on
     its integer index, so the result describes the complete voxel footprint.
+
+    Boundary edges are merged into maximal straight segments with array
+    operations, so tracing only steps once per polygon corner. Loops start at
+    the vertex of the first top edge in row-major order with edges left and
+    vertices between diagonally touching voxels turn up, right, down, then left.
     """
     foreground = np.ascontiguousarray(mask, dtype=bool)
     if foreground.ndim != 2:
@@ -134,52 +404,112 @@ def mask_to_edge_polygons(mask: np.ndarray) -> List[np.ndarray]:
     padded[1:-1, 1:-1] = foreground
     cells = padded[1:-1, 1:-1]
 
-    neighbours = (
-        padded[:-2, 1:-1],
-        padded[1:-1, 2:],
-        padded[2:, 1:-1],
-        padded[1:-1, :-2],
+    top_edges = cells & ~padded[:-2, 1:-1]
+    right_edges = cells & ~padded[1:-1, 2:]
+    bottom_edges = cells & ~padded[2:, 1:-1]
+    left_edges = cells & ~padded[1:-1, :-2]
+
+    # Vertex (row, column) is the top left corner of pixel (row, column)
+    vertex_columns = columns + 1
+    top_starts, top_ends = get_edge_runs(top_edges)
+    right_starts, right_ends = get_edge_runs(right_edges.T)
+    bottom_starts, bottom_ends = get_edge_runs(bottom_edges)
+    left_starts, left_ends = get_edge_runs(left_edges.T)
+
+    # Runs of the transposed right and left edges are indexed (column, row)
+    segment_starts = np.concatenate(
+        [
+            top_starts[0] * vertex_columns + top_starts[1],
+            right_starts[1] * vertex_columns + right_starts[0] + 1,
+            (bottom_ends[0] + 1) * vertex_columns + bottom_ends[1] + 1,
+            (left_ends[1] + 1) * vertex_columns + left_ends[0],
+        ]
     )
-    offsets = (
-        (-0.5, -0.5, 0.5, -0.5),
-        (0.5, -0.5, 0.5, 0.5),
-        (0.5, 0.5, -0.5, 0.5),
-        (-0.5, 0.5, -0.5, -0.5),
+    segment_ends = np.concatenate(
+        [
+            top_ends[0] * vertex_columns + top_ends[1] + 1,
+            (right_ends[1] + 1) * vertex_columns + right_ends[0] + 1,
+            (bottom_starts[0] + 1) * vertex_columns + bottom_starts[1],
+            left_starts[1] * vertex_columns + left_starts[0],
+        ]
+    )
+    # Priority of the segment directions at junctions: up, right, down, left
+    segment_priorities = np.concatenate(
+        [
+            np.full(len(top_starts[0]), 1),
+            np.full(len(right_starts[0]), 2),
+            np.full(len(bottom_starts[0]), 3),
+            np.full(len(left_starts[0]), 0),
+        ]
     )
 
-    edges = {}
-    for neighbour, (start_x, start_y, end_x, end_y) in zip(neighbours, offsets):
-        for row, column in zip(*np.nonzero(cells & ~neighbour)):
-            start = (column + start_x, row + start_y)
-            end = (column + end_x, row + end_y)
-            edges.setdefault(start, []).append(end)
+    # Vertices have at most two outgoing segments, which only occurs between diagonally touching voxels
+    order = np.lexsort((segment_priorities, segment_starts))
+    sorted_starts = segment_starts[order]
+    is_first = np.ones(len(order), dtype=bool)
+    is_first[1:] = sorted_starts[1:] != sorted_starts[:-1]
+    first_segments = dict(
+        zip(sorted_starts[is_first].tolist(), order[is_first].tolist())
+    )
+    second_segments = dict(
+        zip(sorted_starts[~is_first].tolist(), order[~is_first].tolist())
+    )
+    segment_starts = segment_starts.tolist()
+    segment_ends = segment_ends.tolist()
+
+    # Every loop contains a top edge, so the next loop starts at the first vertex in order of
+    # the top edges leaving it that has segments left, even if its top edge was already traced
+    vertices = []
+    polygon_ends = []
+    for start in segment_starts[: len(top_starts[0])]:
+        while start in first_segments:
+            trace_edge_polygon(
+                start, first_segments, second_segments, segment_ends, vertices
+            )
+            polygon_ends.append(len(vertices))
+
+    if not polygon_ends:
+        return []
+
+    vertex_rows, vertex_cols = np.divmod(
+        np.asarray(vertices, dtype=int), vertex_columns
+    )
+    corners = np.stack([vertex_cols - 0.5, vertex_rows - 0.5], axis=1)
+    return np.split(corners, polygon_ends[:-1])
 
-    polygons = []
-    while edges:
-        start = next(iter(edges))
-        current = start
-        points = [start]
-        while True:
-            ends = edges.get(current)
-            if not ends:
-                break
-            if len(ends) > 1:
-                ends.sort(
-                    key=lambda end: np.arctan2(
-                        end[1] - current[1], end[0] - current[0]
-                    )
-                )
-            current = ends.pop(0)
-            if not ends:
-                del edges[points[-1]]
-            if current == start:
-                break
-            points.append(current)
-
-        polygon = remove_collinear_points(np.asarray(points, dtype=float))
-        if len(polygon) >= 3:
-            polygons.append(polygon)
-    return polygons
+
+def trace_edge_polygon(
+    start: int,
+    first_segments: Dict[int, int],
+    second_segments: Dict[int, int],
+    segment_ends: List[int],
+    vertices: List[int],
+):
+    """
+    Follows and removes the segments of the closed loop leaving `start`, appending its corners to `vertices`
+    """
+    vertices.append(start)
+    current = start
+    while True:
+        segment = first_segments.pop(current)
+        if current in second_segments:
+            first_segments[current] = second_segments.pop(current)
+        current = segment_ends[segment]
+        if current == start:
+            break
+        vertices.append(current)
+
+
+def get_edge_runs(edges: np.ndarray) -> Tuple[tuple, tuple]:
+    """
+    Returns the (row, column) indices of the first and of the last edge of each maximal run of edges
+    along the rows, in row-major order of the runs
+    """
+    padded = np.zeros((edges.shape[0], edges.shape[1] + 2), dtype=bool)
+    padded[:, 1:-1] = edges
+    run_starts = np.nonzero(edges & ~padded[:, :-2])
+    run_ends = np.nonzero(edges & ~padded[:, 2:])
+    return run_starts, run_ends
 
 
 def remove_collinear_points(polygon: np.ndarray) -> np.ndarray:
@@ -187,16 +517,62 @@ def remove_collinear_points(polygon: np.ndarray) -> np.ndarray:
     if len(polygon) < 3:
         return polygon
 
-    keep = []
-    for index, point in enumerate(polygon):
-        previous = polygon[(index - 1) % len(polygon)]
-        following = polygon[(index + 1) % len(polygon)]
-        first = point - previous
-        second = following - point
-        cross_product = first[0] * second[1] - first[1] * second[0]
-        if abs(cross_product) > 1e-9 or float(first @ second) < 0:
-            keep.append(point)
-    return np.asarray(keep, dtype=float)
+    first = polygon - np.roll(polygon, 1, axis=0)
+    second = np.roll(polygon, -1, axis=0) - polygon
+    cross_products = first[:, 0] * second[:, 1] - first[:, 1] * second[:, 0]
+    dot_products = np.einsum("ij,ij->i", first, second)
+    keep = (np.abs(cross_products) > 1e-9) | (dot_products < 0)
+    return np.asarray(polygon[keep], dtype=float)
+
+
+def simplify_polygon(polygon: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Simplify a closed polygon with the Douglas-Peucker algorithm, so that no removed vertex deviates
+    more than `tolerance` from the simplified outline. Works on 2D or 3D vertices.
+    Polygons that would collapse to fewer than 3 vertices are returned unchanged.
+    """
+    if len(polygon) < 4:
+        return polygon
+
+    # Split the ring at its first vertex and the vertex farthest from it
+    farthest = int(np.argmax(np.linalg.norm(polygon - polygon[0], axis=1)))
+    closed_polygon = np.concatenate([polygon, polygon[:1]])
+    keep = np.zeros(len(closed_polygon), dtype=bool)
+    keep[[0, farthest, -1]] = True
+
+    ranges = [(0, farthest), (farthest, len(polygon))]
+    while ranges:
+        first, last = ranges.pop()
+        if last - first < 2:
+            continue
+
+        distances = get_point_to_segment_distances(
+            closed_polygon[first + 1 : last],
+            closed_polygon[first],
+            closed_polygon[last],
+        )
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            split = first + 1 + index
+            keep[split] = True
+            ranges.extend([(first, split), (split, last)])
+
+    keep = keep[:-1]
+    if np.count_nonzero(keep) < 3:
+        return polygon
+    return polygon[keep]
+
+
+def get_point_to_segment_distances(
+    points: np.ndarray, start: np.ndarray, end: np.ndarray
+) -> np.ndarray:
+    segment = end - start
+    squared_length = float(segment @ segment)
+    if squared_length == 0:
+        return np.linalg.norm(points - start, axis=1)
+
+    t = np.clip((points - start) @ segment / squared_length, 0, 1)
+    return np.linalg.norm(points - (start + t[:, np.newaxis] * segment), axis=1)
 
 
 def create_pin_hole_mask(mask: np.ndarray, approximate_contours: bool):
@@ -205,39 +581,33 @@ def create_pin_hole_mask(mask: np.ndarray, approximate_contours: bool):
     This is done so that a given region can be represented by a single contour.
     """
 
-    contours, hierarchy = find_mask_contours(mask, approximate_contours)
-    pin_hole_mask = mask.copy()
+    pin_hole_mask = np.array(mask, dtype=bool, order="C")
+    contours, hierarchy = find_mask_contours(pin_hole_mask, approximate_contours)
 
-    # Iterate through the hierarchy, for child nodes, draw a line upwards from the first point
+    # Iterate through the hierarchy, for child nodes, cut a line upwards from the first point
     for i, array in enumerate(hierarchy):
         parent_contour_index = array[Hierarchy.parent_node]
         if parent_contour_index == -1:
             continue  # Contour is not a child
 
-        child_contour = contours[i]
-
-        line_start = tuple(child_contour[0])
-
-        pin_hole_mask = draw_line_upwards_from_point(
-            pin_hole_mask, line_start, fill_value=0
-        )
+        cut_line_upwards_from_point(pin_hole_mask, contours[i][0])
     return pin_hole_mask
 
 
-def draw_line_upwards_from_point(
-    mask: np.ndarray, start, fill_value: int
-) -> np.ndarray:
-    line_width = 2
-    end = (start[0], start[1] - 1)
-    mask = mask.astype(np.uint8)  # Type that OpenCV expects
-    # Draw one point at a time until we hit a point that already has the desired value
-    while mask[end] != fill_value:
-        cv.line(mask, start, end, fill_value, line_width)
+def cut_line_upwards_from_point(mask: np.ndarray, start):
+    """
+    Clears a 3 pixel wide line in place from the (x, y) start point up to the first background pixel
+    above it, with single pixel caps as drawn by a cv.line of width 2
+    """
+    x, y = int(start[0]), int(start[1])
+    if y == 0 or not mask[y - 1, x]:
+        return
 
-        # Update start and end to the next positions
-        start = end
-        end = (start[0], start[1] - line_width)
-    return mask.astype(bool)
+    background_rows = np.flatnonzero(~mask[:y, x])
+    top = background_rows[-1] + 1 if len(background_rows) else 0
+    mask[top : y + 1, max(x - 1, 0) : x + 2] = False
+    if y + 1 < mask.shape[0]:
+        mask[y + 1, x] = False
 
 
 def validate_contours(contours: list):
@@ -260,9 +630,9 @@ def get_pixel_to_patient_transformation_matrix(series_data):
     row_direction, column_direction, slice_direction = get_slice_directions(first_slice)
 
     mat = np.identity(4, dtype=np.float32)
-    #The following might appear counter-intuitive, i.e. multiplying the row direction with the column spacing and vice-versa
-    #But is the correct way to create the transformation matrix, see https://nipy.org/nibabel/dicom/dicom_orientation.html
-    mat[:3, 0] = row_direction * column_spacing 
+    # The following might appear counter-intuitive, i.e. multiplying the row direction with the column spacing and vice-versa
+    # But is the correct way to create the transformation matrix, see https://nipy.org/nibabel/dicom/dicom_orientation.html
+    mat[:3, 0] = row_direction * column_spacing
     mat[:3, 1] = column_direction * row_spacing
     mat[:3, 2] = slice_direction * slice_spacing
     mat[:3, 3] = offset
@@ -284,8 +654,8 @@ def get_patient_to_pixel_transformation_matrix(series_data):
     # inv(M) = [ inv(rotation&scaling)   -inv(rotation&scaling) * translation ]
     #          [          0                                1                  ]
 
-    #The following might appear counter-intuitive, i.e. dividing the row direction with the column spacing and vice-versa
-    #But is the correct way to create the inverse transformation matrix, see https://nipy.org/nibabel/dicom/dicom_orientation.html
+    # The following might appear counter-intuitive, i.e. dividing the row direction with the column spacing and vice-versa
+    # But is the correct way to create the inverse transformation matrix, see https://nipy.org/nibabel/dicom/dicom_orientation.html
     linear = np.identity(3, dtype=np.float32)
     linear[0, :3] = row_direction / column_spacing
     linear[1, :3] = column_direction / row_spacing
@@ -339,20 +709,116 @@ def get_spacing_between_slices(series_data):
     return 1.0
 
 
-def create_series_mask_from_contour_sequence(series_data, contour_sequence: Sequence):
-    mask = create_empty_series_mask(series_data)
-    transformation_matrix = get_patient_to_pixel_transformation_matrix(series_data)
+def create_series_mask_from_contour_sequence(
+    series_data,
+    contour_sequence: Sequence,
+    transformation_matrix: Optional[np.ndarray] = None,
+    out: Optional[np.ndarray] = None,
+    progress_counter: Optional[ProgressCounter] = None,
+    cancellation: Optional[CancellationToken] = None,
+):
+    """
+    The patient to pixel `transformation_matrix` of the series may be passed in when it is shared by several ROIs.
+    If `out` is given, e.g. a `np.memmap`, the mask is written into it one slice at a time instead of
+    allocating a new mask, and `out` is returned. It is left partially written if the operation is cancelled.
+    Each completed slice advances the `progress_counter`, and `cancellation` is checked between slices
+    """
+    if out is None:
+        mask = create_empty_series_mask(series_data)
+    else:
+        validate_series_mask_out(series_data, out)
+        mask = out
+    if transformation_matrix is None:
+        transformation_matrix = get_patient_to_pixel_transformation_matrix(series_data)
+
+    with stage("create_mask") as mask_stage:
+        contour_data_by_sop_instance_uid = get_contour_data_by_sop_instance_uid(
+            contour_sequence
+        )
 
-    # Iterate through each slice of the series, If it is a part of the contour, add the contour mask
-    for i, series_slice in enumerate(series_data):
-        slice_contour_data = get_slice_contour_data(series_slice, contour_sequence)
-        if len(slice_contour_data):
-            mask[:, :, i] = get_slice_mask_from_slice_contour_data(
-                series_slice, slice_contour_data, transformation_matrix
+        # Iterate through each slice of the series, If it is a part of the contour, add the contour mask
+        for i, series_slice in enumerate(series_data):
+            slice_contour_data = contour_data_by_sop_instance_uid.get(
+                series_slice.SOPInstanceUID, []
             )
+            if len(slice_contour_data):
+                mask[:, :, i] = get_slice_mask_from_slice_contour_data(
+                    series_slice, slice_contour_data, transformation_matrix
+                )
+            elif out is not None:
+                mask[:, :, i] = False
+            advance(progress_counter, cancellation)
+        mask_stage.add(
+            slices=len(series_data), contours=len(contour_sequence), bytes=mask.nbytes
+        )
     return mask
 
 
+def create_packed_series_mask_from_contour_sequence(
+    series_data,
+    contour_sequence: Sequence,
+    transformation_matrix: Optional[np.ndarray] = None,
+    progress_counter: Optional[ProgressCounter] = None,
+    cancellation: Optional[CancellationToken] = None,
+) -> PackedMask:
+    """
+    Same as `create_series_mask_from_contour_sequence`, but packs each slice as it is rasterized
+    so that the full boolean mask is never allocated
+    """
+    packed_mask = PackedMask.empty(get_series_mask_shape(series_data))
+    if transformation_matrix is None:
+        transformation_matrix = get_patient_to_pixel_transformation_matrix(series_data)
+
+    with stage("create_packed_mask") as mask_stage:
+        contour_data_by_sop_instance_uid = get_contour_data_by_sop_instance_uid(
+            contour_sequence
+        )
+        for i, series_slice in enumerate(series_data):
+            slice_contour_data = contour_data_by_sop_instance_uid.get(
+                series_slice.SOPInstanceUID, []
+            )
+            if len(slice_contour_data):
+                packed_mask.set_slice(
+                    i,
+                    get_slice_mask_from_slice_contour_data(
+                        series_slice, slice_contour_data, transformation_matrix
+                    ),
+                )
+            advance(progress_counter, cancellation)
+        mask_stage.add(
+            slices=len(series_data),
+            contours=len(contour_sequence),
+            bytes=packed_mask.nbytes,
+        )
+    return packed_mask
+
+
+def validate_series_mask_out(series_data, out: np.ndarray):
+    mask_shape = get_series_mask_shape(series_data)
+    if out.shape != mask_shape or out.dtype != bool:
+        raise ValueError(
+            f"Mask output must be a boolean array of shape {mask_shape}, "
+            f"got {out.dtype} array of shape {out.shape}"
+        )
+
+
+def get_contour_data_by_sop_instance_uid(
+    contour_sequence: Sequence,
+) -> Dict[str, list]:
+    """
+    Groups the contour data of the sequence by the SOPInstanceUID of the images they reference
+    in a single pass, keeping the order of the contours within the sequence
+    """
+    contour_data_by_sop_instance_uid = {}
+    for contour in contour_sequence:
+        for contour_image in contour.ContourImageSequence:
+            contour_data_by_sop_instance_uid.setdefault(
+                contour_image.ReferencedSOPInstanceUID, []
+            ).append(contour.ContourData)
+
+    return contour_data_by_sop_instance_uid
+
+
 def get_slice_contour_data(series_slice: Dataset, contour_sequence: Sequence):
     slice_contour_data = []
 
@@ -368,28 +834,122 @@ def get_slice_contour_data(series_slice: Dataset, contour_sequence: Sequence):
 def get_slice_mask_from_slice_contour_data(
     series_slice: Dataset, slice_contour_data, transformation_matrix: np.ndarray
 ):
-    # Go through all contours in a slice, create polygons in correct space and with a correct format 
-    # and append to polygons array (appropriate for fillPoly) 
+    polygons = get_slice_polygons_from_slice_contour_data(
+        slice_contour_data, transformation_matrix
+    )
+    slice_mask = create_empty_slice_mask(series_slice).astype(np.uint8)
+    cv.fillPoly(img=slice_mask, pts=polygons, color=1)
+    return slice_mask
+
+
+def get_slice_polygons_from_slice_contour_data(
+    slice_contour_data, transformation_matrix: np.ndarray
+) -> List[np.ndarray]:
+    # Go through all contours in a slice, create polygons in correct space and with a correct format
+    # and append to polygons array (appropriate for fillPoly)
     polygons = []
     for contour_coords in slice_contour_data:
-        reshaped_contour_data = np.reshape(contour_coords, [len(contour_coords) // 3, 3])
-        translated_contour_data = apply_transformation_to_3d_points(reshaped_contour_data, transformation_matrix)
+        reshaped_contour_data = np.reshape(
+            contour_coords, [len(contour_coords) // 3, 3]
+        )
+        translated_contour_data = apply_transformation_to_3d_points(
+            reshaped_contour_data, transformation_matrix
+        )
         polygon = [np.around([translated_contour_data[:, :2]]).astype(np.int32)]
         polygon = np.array(polygon).squeeze()
         polygons.append(polygon)
-    slice_mask = create_empty_slice_mask(series_slice).astype(np.uint8)
-    cv.fillPoly(img=slice_mask, pts = polygons, color = 1)
-    return slice_mask
+    return polygons
+
+
+def create_cropped_series_mask_from_contour_sequence(
+    series_data,
+    contour_sequence: Sequence,
+    transformation_matrix: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, Tuple[int, int, int]]:
+    """
+    Creates the mask of the contour sequence cropped to the voxel bounding box of its contour points.
+    Only the bounding box is allocated and rasterized.
+
+    Returns the cropped mask and the index of its first voxel within the full series mask,
+    in the axis order of the mask. An ROI without contours within the image returns an empty mask
+    """
+    if transformation_matrix is None:
+        transformation_matrix = get_patient_to_pixel_transformation_matrix(series_data)
+
+    contour_data_by_sop_instance_uid = get_contour_data_by_sop_instance_uid(
+        contour_sequence
+    )
+    slice_polygons = {}
+    for i, series_slice in enumerate(series_data):
+        slice_contour_data = contour_data_by_sop_instance_uid.get(
+            series_slice.SOPInstanceUID, []
+        )
+        if len(slice_contour_data):
+            slice_polygons[i] = get_slice_polygons_from_slice_contour_data(
+                slice_contour_data, transformation_matrix
+            )
+
+    if len(slice_polygons) == 0:
+        return np.zeros((0, 0, 0), dtype=bool), (0, 0, 0)
+
+    points = np.concatenate(
+        [
+            np.reshape(polygon, (-1, 2))
+            for polygons in slice_polygons.values()
+            for polygon in polygons
+        ]
+    )
+    # Polygons are (x, y) while the mask is indexed [y, x, slice]
+    mask_shape = get_series_mask_shape(series_data)
+    first_x, first_y = np.maximum(points.min(axis=0), 0)
+    last_x = min(points[:, 0].max(), mask_shape[1] - 1)
+    last_y = min(points[:, 1].max(), mask_shape[0] - 1)
+    first_slice, last_slice = min(slice_polygons), max(slice_polygons)
+    if first_x > last_x or first_y > last_y:
+        return np.zeros((0, 0, 0), dtype=bool), (0, 0, 0)
+
+    mask = np.zeros(
+        (last_y - first_y + 1, last_x - first_x + 1, last_slice - first_slice + 1),
+        dtype=bool,
+    )
+    slice_mask = np.zeros(mask.shape[:2], dtype=np.uint8)
+    for i, polygons in slice_polygons.items():
+        slice_mask[:] = 0
+        cv.fillPoly(
+            img=slice_mask, pts=polygons, color=1, offset=(-int(first_x), -int(first_y))
+        )
+        mask[:, :, i - first_slice] = slice_mask
+
+    return mask, (int(first_y), int(first_x), first_slice)
+
 
 def create_empty_series_mask(series_data):
+    mask_dims = get_series_mask_shape(series_data)
+    mask = np.zeros(mask_dims, dtype=bool)
+    return mask
+
+
+def create_series_mask_memmap(
+    series_data, file_path: str, roi_count: Optional[int] = None
+) -> np.memmap:
+    """
+    Creates a boolean mask of the series backed by a file, to be passed as `out` to the mask methods.
+    If `roi_count` is given, the masks of that many ROIs are stacked along the last axis.
+    The file may be opened by other processes with `np.memmap(file_path, dtype=bool, shape=...)`
+    """
+    mask_shape = get_series_mask_shape(series_data)
+    if roi_count is not None:
+        mask_shape += (roi_count,)
+    return np.memmap(file_path, dtype=bool, mode="w+", shape=mask_shape)
+
+
+def get_series_mask_shape(series_data):
     ref_dicom_image = series_data[0]
-    mask_dims = (
+    return (
         int(ref_dicom_image.Columns),
         int(ref_dicom_image.Rows),
         len(series_data),
     )
-    mask = np.zeros(mask_dims).astype(bool)
-    return mask
 
 
 def create_empty_slice_mask(series_slice):
@@ -0,0 +1,163 @@
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+"""
+File contains hooks that report the duration and item counts of the stages of the RTStruct pipeline
+"""
+
+
+@dataclass
+class StageEvent:
+    """Duration in seconds and item counts (e.g. slices, contours, points, bytes) of a completed stage."""
+
+    name: str
+    duration: float
+    counts: Dict[str, int] = field(default_factory=dict)
+    failed: bool = False
+
+
+Listener = Callable[[StageEvent], None]
+
+listeners: List[Listener] = []
+
+
+def add_listener(listener: Listener):
+    """
+    Registers a callable that receives a `StageEvent` after every stage. Listeners are called from the
+    thread that ran the stage and must be thread safe if workers are used.
+    Stages run by a process pool are not reported
+    """
+    listeners.append(listener)
+
+
+def remove_listener(listener: Listener):
+    if listener in listeners:
+        listeners.remove(listener)
+
+
+@contextmanager
+def listening(listener: Listener):
+    """
+    Registers the listener for the duration of the with block
+    """
+    add_listener(listener)
+    try:
+        yield listener
+    finally:
+        remove_listener(listener)
+
+
+class Stage:
+    """
+    Context manager timing a stage of the pipeline, to which item counts are added with `add`
+    """
+
+    enabled = True
+
+    def __init__(self, name: str):
+        self.name = name
+        self.counts: Dict[str, int] = {}
+        self.start = 0.0
+
+    def add(self, **counts: int):
+        for key, count in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + int(count)
+
+    def __enter__(self) -> "Stage":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        event = StageEvent(
+            self.name,
+            time.perf_counter() - self.start,
+            self.counts,
+            exc_type is not None,
+        )
+        for listener in list(listeners):
+            listener(event)
+
+
+class DisabledStage:
+    """
+    Stage returned while no listener is registered, which does nothing
+    """
+
+    enabled = False
+
+    def add(self, **counts: int):
+        pass
+
+    def __enter__(self) -> "DisabledStage":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+DISABLED_STAGE = DisabledStage()
+
+
+def stage(name: str):
+    """
+    Returns a `Stage` to time a block of code with, or a shared no-op stage if no listener is registered.
+    Counts that are expensive to compute should only be computed if `enabled` is True
+    """
+    if not listeners:
+        return DISABLED_STAGE
+    return Stage(name)
+
+
+class StageReporter:
+    """
+    Listener aggregating the number of calls, total duration and counts of each stage
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages: Dict[str, dict] = {}
+
+    def __call__(self, event: StageEvent):
+        with self.lock:
+            summary = self.stages.setdefault(
+                event.name,
+                {"calls": 0, "failures": 0, "total_s": 0.0, "max_s": 0.0, "counts": {}},
+            )
+            summary["calls"] += 1
+            summary["failures"] += int(event.failed)
+            summary["total_s"] += event.duration
+            summary["max_s"] = max(summary["max_s"], event.duration)
+            for key, count in event.counts.items():
+                summary["counts"][key] = summary["counts"].get(key, 0) + count
+
+    def summary(self) -> Dict[str, dict]:
+        with self.lock:
+            return {
+                name: dict(summary, counts=dict(summary["counts"]))
+                for name, summary in self.stages.items()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+
+    def format(self, sort_by: Optional[str] = "total_s") -> str:
+        """
+        Returns the summary as a table, sorted by the given key of the summary in descending order
+        """
+        stages = list(self.summary().items())
+        if sort_by is not None:
+            stages.sort(key=lambda item: item[1][sort_by], reverse=True)
+
+        lines = [f"{'stage':<28}{'calls':>8}{'total s':>12}{'max s':>12}  counts"]
+        for name, summary in stages:
+            counts = ", ".join(
+                f"{key}={count}" for key, count in summary["counts"].items()
+            )
+            lines.append(
+                f"{name:<28}{summary['calls']:>8}{summary['total_s']:>12.4f}{summary['max_s']:>12.4f}  {counts}"
+            )
+        return "\n".join(lines)
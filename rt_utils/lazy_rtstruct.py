@@ -0,0 +1,306 @@
+import os
+import struct
+import warnings
+from io import BytesIO
+from typing import BinaryIO, List, Optional, Tuple, Union
+
+from pydicom.dataelem import RawDataElement
+from pydicom.dataset import Dataset, FileDataset
+from pydicom.filereader import dcmread, read_dataset, read_partial
+from pydicom.sequence import Sequence
+from pydicom.tag import Tag
+
+"""
+File contains a reader that parses the contours of an RTStruct file one ROI at a time, on demand
+"""
+
+ROI_CONTOUR_SEQUENCE_TAG = Tag("ROIContourSequence")
+CONTOUR_SEQUENCE_TAG = Tag("ContourSequence")
+ITEM_TAG = 0xFFFEE000
+ITEM_DELIMITER_TAG = 0xFFFEE00D
+SEQUENCE_DELIMITER_TAG = 0xFFFEE0DD
+UNDEFINED_LENGTH = 0xFFFFFFFF
+# Explicit VRs with a 2 byte reserved field and a 4 byte length, see PS3.5 7.1.2
+EXTENDED_LENGTH_VRS = {
+    b"OB",
+    b"OD",
+    b"OF",
+    b"OL",
+    b"OV",
+    b"OW",
+    b"SQ",
+    b"SV",
+    b"UC",
+    b"UN",
+    b"UR",
+    b"UT",
+    b"UV",
+}
+
+
+class LazyROIContour(Dataset):
+    """
+    ROIContourSequence item whose ContourSequence is parsed from file the first time it is accessed.
+    All other elements of the item are parsed when the file is read
+    """
+
+    def __init__(
+        self,
+        dataset: Dataset,
+        file_path: str,
+        timestamp: float,
+        contour_sequence_range: Tuple[int, int],
+        is_implicit_VR: bool,
+        is_little_endian: bool,
+    ):
+        super().__init__(dataset)
+        self.file_path = file_path
+        self.timestamp = timestamp
+        self.contour_sequence_range = contour_sequence_range
+        self.contour_sequence_is_implicit_VR = is_implicit_VR
+        self.contour_sequence_is_little_endian = is_little_endian
+        self.contour_sequence_loaded = False
+
+        # Placeholder so that the ContourSequence is listed as an element of the item
+        start, end = contour_sequence_range
+        self._dict[CONTOUR_SEQUENCE_TAG] = RawDataElement(
+            CONTOUR_SEQUENCE_TAG,
+            "SQ",
+            end - start,
+            None,
+            start,
+            is_implicit_VR,
+            is_little_endian,
+        )
+
+    def __getitem__(self, key):
+        if not self.contour_sequence_loaded and is_contour_sequence_key(key):
+            self.load_contour_sequence()
+        return super().__getitem__(key)
+
+    def get_item(self, key, **kwargs):
+        # `keep_deferred` is only accepted by pydicom 3, so it is passed on only if given
+        if (
+            not kwargs.get("keep_deferred", False)
+            and not self.contour_sequence_loaded
+            and is_contour_sequence_key(key)
+        ):
+            self.load_contour_sequence()
+        return super().get_item(key, **kwargs)
+
+    def load_contour_sequence(self):
+        if self.contour_sequence_loaded:
+            return
+
+        if os.stat(self.file_path).st_mtime != self.timestamp:
+            warnings.warn(
+                f"RTStruct file {self.file_path} was modified after it was read, contours may be invalid"
+            )
+
+        start, end = self.contour_sequence_range
+        with open(self.file_path, "rb") as file:
+            file.seek(start)
+            contour_sequence_bytes = file.read(end - start)
+
+        contour_dataset = read_dataset(
+            BytesIO(contour_sequence_bytes),
+            self.contour_sequence_is_implicit_VR,
+            self.contour_sequence_is_little_endian,
+        )
+        self.contour_sequence_loaded = True
+        self[CONTOUR_SEQUENCE_TAG] = contour_dataset[CONTOUR_SEQUENCE_TAG]
+
+
+def is_contour_sequence_key(key) -> bool:
+    if isinstance(key, slice):
+        return False
+    try:
+        return Tag(key) == CONTOUR_SEQUENCE_TAG
+    except Exception:
+        return False
+
+
+def read_lazy_rtstruct(file_path: Union[str, os.PathLike]) -> FileDataset:
+    """
+    Reads an RTStruct file without parsing the ContourSequence of any ROI, see `LazyROIContour`.
+    Only the element headers of the ROIContourSequence are read to find where each ContourSequence is stored.
+    The file is opened again when contours are accessed, so it must be given as a path
+    """
+    if not isinstance(file_path, (str, os.PathLike)):
+        raise ValueError(
+            f"Lazy loading requires the path of the RTStruct file, got {type(file_path).__name__}"
+        )
+
+    with open(file_path, "rb") as file:
+        ds = read_partial(
+            file, stop_when=lambda tag, vr, length: tag == ROI_CONTOUR_SEQUENCE_TAG
+        )
+        is_implicit_VR, is_little_endian = get_original_encoding(ds)
+        element_reader = ElementHeaderReader(file, is_implicit_VR, is_little_endian)
+
+        header = element_reader.read_header()
+        if header is None:
+            return dcmread(file_path)
+
+        _, _, length = header
+        sequence_end = None if length == UNDEFINED_LENGTH else file.tell() + length
+        timestamp = os.stat(file_path).st_mtime
+
+        roi_contours = Sequence()
+        while sequence_end is None or file.tell() < sequence_end:
+            tag, _, length = element_reader.read_header()
+            if tag == SEQUENCE_DELIMITER_TAG:
+                break
+            if tag != ITEM_TAG:
+                raise Exception(
+                    f"Unexpected tag {tag:08X} in ROIContourSequence at byte {file.tell()} of {file_path}"
+                )
+
+            item_start = file.tell()
+            item_end = None if length == UNDEFINED_LENGTH else item_start + length
+            element_ranges, contour_sequence_range = element_reader.scan_item(item_end)
+            roi_contours.append(
+                create_lazy_roi_contour(
+                    file,
+                    element_ranges,
+                    contour_sequence_range,
+                    file_path,
+                    timestamp,
+                    is_implicit_VR,
+                    is_little_endian,
+                )
+            )
+
+        trailing_elements = read_dataset(
+            BytesIO(file.read()), is_implicit_VR, is_little_endian
+        )
+
+    ds.ROIContourSequence = roi_contours
+    for elem in trailing_elements.elements():
+        ds.add(elem)
+    return ds
+
+
+def get_original_encoding(ds: Dataset) -> Tuple[bool, bool]:
+    """
+    Returns whether the dataset was read with implicit VR and with little endian byte order
+    """
+    # pydicom 3 records the encoding in `original_encoding`, pydicom 2 in the dataset attributes
+    if hasattr(ds, "original_encoding"):
+        return tuple(ds.original_encoding[:2])
+    return ds.is_implicit_VR, ds.is_little_endian
+
+
+def create_lazy_roi_contour(
+    file: BinaryIO,
+    element_ranges: List[Tuple[int, int]],
+    contour_sequence_range: Optional[Tuple[int, int]],
+    file_path: str,
+    timestamp: float,
+    is_implicit_VR: bool,
+    is_little_endian: bool,
+) -> Dataset:
+    position = file.tell()
+    item_bytes = BytesIO()
+    for start, end in element_ranges:
+        file.seek(start)
+        item_bytes.write(file.read(end - start))
+    file.seek(position)
+
+    item = read_dataset(
+        BytesIO(item_bytes.getvalue()), is_implicit_VR, is_little_endian
+    )
+    if contour_sequence_range is None:
+        return item
+    return LazyROIContour(
+        item,
+        file_path,
+        timestamp,
+        contour_sequence_range,
+        is_implicit_VR,
+        is_little_endian,
+    )
+
+
+def load_contour_sequences(ds: Dataset):
+    """
+    Parses the ContourSequence of every ROI that was not accessed yet, e.g. before the RTStruct is written
+    """
+    for roi_contour in getattr(ds, "ROIContourSequence", []):
+        if isinstance(roi_contour, LazyROIContour):
+            roi_contour.load_contour_sequence()
+
+
+class ElementHeaderReader:
+    """
+    Reads data element headers and skips their values without parsing them
+    """
+
+    def __init__(self, file: BinaryIO, is_implicit_VR: bool, is_little_endian: bool):
+        self.file = file
+        self.is_implicit_VR = is_implicit_VR
+        self.endian = "<" if is_little_endian else ">"
+
+    def read_header(self) -> Optional[Tuple[int, Optional[bytes], int]]:
+        """
+        Returns the tag, VR and value length of the next element, or None at the end of the file
+        """
+        header = self.file.read(8)
+        if len(header) < 8:
+            return None
+
+        group, element = struct.unpack(self.endian + "HH", header[:4])
+        tag = group << 16 | element
+        # Items and delimiters have no VR in either encoding
+        if self.is_implicit_VR or group == 0xFFFE:
+            return tag, None, struct.unpack(self.endian + "L", header[4:])[0]
+
+        vr = header[4:6]
+        if vr in EXTENDED_LENGTH_VRS:
+            return tag, vr, struct.unpack(self.endian + "L", self.file.read(4))[0]
+        return tag, vr, struct.unpack(self.endian + "H", header[6:])[0]
+
+    def skip_value(self, length: int):
+        if length != UNDEFINED_LENGTH:
+            self.file.seek(length, os.SEEK_CUR)
+            return
+
+        # Undefined length values consist of items up to a sequence delimiter
+        while True:
+            tag, _, item_length = self.read_header()
+            if tag == SEQUENCE_DELIMITER_TAG:
+                return
+            if item_length == UNDEFINED_LENGTH:
+                self.skip_item()
+            else:
+                self.file.seek(item_length, os.SEEK_CUR)
+
+    def skip_item(self):
+        while True:
+            tag, _, length = self.read_header()
+            if tag == ITEM_DELIMITER_TAG:
+                return
+            self.skip_value(length)
+
+    def scan_item(
+        self, item_end: Optional[int]
+    ) -> Tuple[List[Tuple[int, int]], Optional[Tuple[int, int]]]:
+        """
+        Returns the byte ranges of the elements of a sequence item, other than its ContourSequence,
+        and the byte range of its ContourSequence if it has any contours
+        """
+        element_ranges = []
+        contour_sequence_range = None
+        while item_end is None or self.file.tell() < item_end:
+            start = self.file.tell()
+            tag, _, length = self.read_header()
+            if tag == ITEM_DELIMITER_TAG:
+                break
+
+            self.skip_value(length)
+            if tag == CONTOUR_SEQUENCE_TAG and length != 0:
+                contour_sequence_range = (start, self.file.tell())
+            else:
+                element_ranges.append((start, self.file.tell()))
+
+        return element_ranges, contour_sequence_range
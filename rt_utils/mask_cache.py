@@ -0,0 +1,56 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional, Union
+
+import numpy as np
+
+from rt_utils.packed_mask import PackedMask
+
+"""
+File contains an in-memory cache for ROI masks
+"""
+
+
+class MaskCache:
+    """
+    Least recently used cache of masks or packed masks, bounded by the total number of bytes of the cached masks
+    instead of their count. Masks larger than the whole budget are not cached.
+    """
+
+    def __init__(self, max_bytes: int):
+        if max_bytes <= 0:
+            raise ValueError(f"Mask cache size must be positive, got {max_bytes}")
+
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.masks = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Union[np.ndarray, PackedMask]]:
+        with self.lock:
+            mask = self.masks.get(key)
+            if mask is not None:
+                self.masks.move_to_end(key)
+            return mask
+
+    def put(self, key: Hashable, mask: Union[np.ndarray, PackedMask]):
+        if mask.nbytes > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.masks:
+                self.size_bytes -= self.masks.pop(key).nbytes
+
+            self.masks[key] = mask
+            self.size_bytes += mask.nbytes
+            while self.size_bytes > self.max_bytes:
+                _, evicted_mask = self.masks.popitem(last=False)
+                self.size_bytes -= evicted_mask.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.masks.clear()
+            self.size_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self.masks)
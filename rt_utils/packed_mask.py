@@ -0,0 +1,126 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+"""
+File contains a bit-packed representation of 3D binary masks
+"""
+
+# Number of set bits of each byte value
+POPCOUNT_TABLE = (
+    np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1)
+    .sum(axis=1)
+    .astype(np.int64)
+)
+
+
+class PackedMask:
+    """
+    3D binary mask storing 8 voxels per byte, in the same [y, x, slice] axis order as the masks of `RTStruct`.
+
+    Each slice is packed along its rows, so `data` has the shape (slices, mask rows, ceil(mask columns / 8)).
+    Padding bits at the end of each row are always zero, so unions, intersections and voxel counts
+    are computed on the packed bytes directly.
+    """
+
+    def __init__(self, data: np.ndarray, shape: Tuple[int, int, int]):
+        expected_data_shape = get_packed_data_shape(shape)
+        if data.dtype != np.uint8 or data.shape != expected_data_shape:
+            raise ValueError(
+                f"Packed mask data must be a uint8 array of shape {expected_data_shape}, "
+                f"got {data.dtype} array of shape {data.shape}"
+            )
+        self.data = data
+        self.shape = tuple(shape)
+
+    @staticmethod
+    def empty(shape: Tuple[int, int, int]) -> "PackedMask":
+        return PackedMask(np.zeros(get_packed_data_shape(shape), dtype=np.uint8), shape)
+
+    @staticmethod
+    def from_mask(mask: np.ndarray) -> "PackedMask":
+        """
+        Packs a 3D boolean mask one slice at a time
+        """
+        if mask.dtype != bool or mask.ndim != 3:
+            raise ValueError(
+                f"Mask must be a 3D boolean array, got {mask.dtype} array of shape {mask.shape}"
+            )
+
+        packed_mask = PackedMask.empty(mask.shape)
+        for i in range(mask.shape[2]):
+            packed_mask.set_slice(i, mask[:, :, i])
+        return packed_mask
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    def __len__(self) -> int:
+        return self.shape[2]
+
+    def copy(self) -> "PackedMask":
+        return PackedMask(self.data.copy(), self.shape)
+
+    def get_slice(self, index: int) -> np.ndarray:
+        return unpack_slice(self.data[index], self.shape[1])
+
+    def set_slice(self, index: int, mask_slice: np.ndarray):
+        self.data[index] = np.packbits(mask_slice, axis=1)
+
+    def to_mask(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Unpacks the full mask, into `out` if it is given
+        """
+        mask = np.zeros(self.shape, dtype=bool) if out is None else out
+        for i in range(self.shape[2]):
+            mask[:, :, i] = self.get_slice(i)
+        return mask
+
+    def count(self) -> int:
+        """
+        Returns the number of voxels within the mask without unpacking it
+        """
+        return int(np.bincount(self.data.ravel(), minlength=256) @ POPCOUNT_TABLE)
+
+    def count_slices(self) -> np.ndarray:
+        """
+        Returns the number of voxels within each slice of the mask
+        """
+        return np.array(
+            [
+                np.bincount(packed_slice.ravel(), minlength=256) @ POPCOUNT_TABLE
+                for packed_slice in self.data
+            ],
+            dtype=np.int64,
+        )
+
+    def __or__(self, other: "PackedMask") -> "PackedMask":
+        self.validate_same_shape(other)
+        return PackedMask(self.data | other.data, self.shape)
+
+    def __and__(self, other: "PackedMask") -> "PackedMask":
+        self.validate_same_shape(other)
+        return PackedMask(self.data & other.data, self.shape)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, PackedMask):
+            return NotImplemented
+        return self.shape == other.shape and np.array_equal(self.data, other.data)
+
+    def validate_same_shape(self, other: "PackedMask"):
+        if not isinstance(other, PackedMask):
+            raise TypeError(f"Expected a PackedMask, got {type(other).__name__}")
+        if self.shape != other.shape:
+            raise ValueError(
+                f"Packed mask shapes {self.shape} and {other.shape} do not match"
+            )
+
+
+def get_packed_data_shape(shape: Tuple[int, int, int]) -> Tuple[int, int, int]:
+    rows, columns, slices = shape
+    return (slices, rows, (columns + 7) // 8)
+
+
+def unpack_slice(packed_slice: np.ndarray, columns: int) -> np.ndarray:
+    return np.unpackbits(packed_slice, axis=1, count=columns).view(bool)
@@ -0,0 +1,66 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional, Sequence, TypeVar, Union
+
+"""
+File contains helper methods to spread independent pieces of work over a pool of workers
+"""
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+Workers = Optional[Union[int, Executor]]
+
+
+def map_ordered(
+    func: Callable[[T], R],
+    items: Sequence[T],
+    workers: Workers = None,
+    use_processes: bool = False,
+    on_result: Optional[Callable[[int], None]] = None,
+) -> List[R]:
+    """
+    Applies `func` to each item and returns the results in the same order as `items`.
+
+    `workers` can be None or 1 to run serially, the number of workers of a pool created for this call
+    (threads by default, processes if `use_processes` is True), or an existing Executor to submit to.
+    `func` and `items` must be picklable when a process pool is used.
+    `on_result` is called in the calling thread with the index of each result as results arrive in order,
+    unlike any callbacks made by `func` itself, which run on the worker threads.
+    If it raises, items that were not started yet are cancelled and the exception is propagated
+    """
+    if isinstance(workers, Executor):
+        return collect_results(workers.map(func, items), on_result)
+
+    if workers is not None and workers < 1:
+        raise ValueError(f"Number of workers must be at least 1, got {workers}")
+
+    if workers is None or workers == 1 or len(items) <= 1:
+        return collect_results((func(item) for item in items), on_result)
+
+    if use_processes:
+        # Send items in chunks to limit the inter-process communication overhead
+        chunksize = max(1, len(items) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return collect_results(
+                executor.map(func, items, chunksize=chunksize), on_result
+            )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return collect_results(executor.map(func, items), on_result)
+
+
+def collect_results(
+    results: Iterator[R], on_result: Optional[Callable[[int], None]] = None
+) -> List[R]:
+    if on_result is None:
+        return list(results)
+
+    collected = []
+    try:
+        for result in results:
+            collected.append(result)
+            on_result(len(collected) - 1)
+    finally:
+        # Closing the iterator of Executor.map cancels the futures that are still pending
+        results.close()
+    return collected
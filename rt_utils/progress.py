@@ -0,0 +1,90 @@
+import threading
+from typing import Callable, Optional
+
+"""
+File contains progress reporting and cooperative cancellation of long running ROI operations
+"""
+
+# Called with the unit of work ("slices" or "rois"), the number of completed units and the total number of units.
+# Calls may come from worker threads, but never concurrently, see `ProgressCounter`
+ProgressCallback = Callable[[str, int, int], None]
+
+
+class OperationCancelled(Exception):
+    """
+    Raised by an operation whose CancellationToken was cancelled
+    """
+
+    pass
+
+
+class CancellationToken:
+    """
+    Passed to long running operations, which check it between slices and stop with `OperationCancelled`
+    once `cancel` was called, e.g. from another thread
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.event.is_set():
+            raise OperationCancelled("Operation was cancelled")
+
+
+class ProgressCounter:
+    """
+    Counts completed units of work and reports them to a progress callback.
+    Units may be completed by several threads, in which case the callback is called from each of them
+    while holding a lock
+    """
+
+    def __init__(self, progress: ProgressCallback, unit: str, total: int):
+        self.progress = progress
+        self.unit = unit
+        self.total = total
+        self.completed = 0
+        self.lock = threading.Lock()
+
+    def advance(self, count: int = 1):
+        with self.lock:
+            self.completed += count
+            self.progress(self.unit, self.completed, self.total)
+
+
+def create_progress_counter(
+    progress: Optional[ProgressCallback], unit: str, total: int
+) -> Optional[ProgressCounter]:
+    return None if progress is None else ProgressCounter(progress, unit, total)
+
+
+def advance(
+    progress_counter: Optional[ProgressCounter],
+    cancellation: Optional[CancellationToken],
+):
+    """
+    Marks a unit of work as completed, then stops the operation if it was cancelled
+    """
+    if progress_counter is not None:
+        progress_counter.advance()
+    if cancellation is not None:
+        cancellation.raise_if_cancelled()
+
+
+def create_result_callback(
+    progress_counter: Optional[ProgressCounter],
+    cancellation: Optional[CancellationToken],
+) -> Optional[Callable[[int], None]]:
+    """
+    Returns an `on_result` callback for `parallel.map_ordered` that advances the progress per result
+    """
+    if progress_counter is None and cancellation is None:
+        return None
+    return lambda _: advance(progress_counter, cancellation)
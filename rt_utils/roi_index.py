@@ -0,0 +1,103 @@
+from typing import Dict, List, Optional, Tuple
+
+from pydicom.dataset import Dataset
+from pydicom.sequence import Sequence
+
+"""
+File contains an index of the ROIs of an RTStruct dataset
+"""
+
+
+ROI_SEQUENCE_KEYWORDS = ("StructureSetROISequence", "ROIContourSequence")
+
+
+class ROIIndex:
+    """
+    Maps ROI names and ROI numbers to the items of the StructureSetROISequence and ROIContourSequence.
+    The first item wins if names or numbers are duplicated, the same as a linear scan would.
+
+    The index records the sequences it was built from with their lengths and last items, see `is_stale`,
+    and is extended with `add` as ROIs are appended.
+    """
+
+    def __init__(self, ds: Dataset):
+        self.roi_numbers_by_name: Dict[str, str] = {}
+        self.structure_rois_by_number: Dict[str, Dataset] = {}
+        self.roi_contours_by_number: Dict[str, Dataset] = {}
+
+        for structure_roi in getattr(ds, "StructureSetROISequence", []):
+            self.add_structure_roi(structure_roi)
+        for roi_contour in getattr(ds, "ROIContourSequence", []):
+            self.add_roi_contour(roi_contour)
+        self.sequence_states = get_sequence_states(ds)
+
+    def is_stale(self, ds: Dataset) -> bool:
+        """
+        Returns True if the sequences of the dataset were replaced, or ROIs were added to or removed from them,
+        without updating the index. Only the lengths and last items of the sequences are checked,
+        so ROIs renamed, renumbered or replaced in place are not detected
+        """
+        return not all(
+            map(is_same_state, self.sequence_states, get_sequence_states(ds))
+        )
+
+    def add(self, ds: Dataset, structure_roi: Dataset, roi_contour: Dataset):
+        """
+        Adds an ROI that was just appended to the sequences of the dataset.
+        An index that was already stale before the ROI was appended stays stale
+        """
+        sequence_states = get_sequence_states(ds)
+        was_current = all(
+            sequence is indexed_sequence
+            and length == indexed_length + 1
+            and (sequence[-2] if length > 1 else None) is indexed_last_item
+            for (sequence, length, _), (
+                indexed_sequence,
+                indexed_length,
+                indexed_last_item,
+            ) in zip(sequence_states, self.sequence_states)
+        )
+        self.add_structure_roi(structure_roi)
+        self.add_roi_contour(roi_contour)
+        if was_current:
+            self.sequence_states = sequence_states
+
+    def add_structure_roi(self, structure_roi: Dataset):
+        roi_number = str(structure_roi.ROINumber)
+        self.roi_numbers_by_name.setdefault(structure_roi.ROIName, roi_number)
+        self.structure_rois_by_number.setdefault(roi_number, structure_roi)
+
+    def add_roi_contour(self, roi_contour: Dataset):
+        self.roi_contours_by_number.setdefault(
+            str(roi_contour.ReferencedROINumber), roi_contour
+        )
+
+    def get_roi_number(self, name: str) -> Optional[str]:
+        return self.roi_numbers_by_name.get(name)
+
+    def get_roi_contour(self, roi_number) -> Optional[Dataset]:
+        return self.roi_contours_by_number.get(str(roi_number))
+
+
+SequenceState = Tuple[Optional[Sequence], int, Optional[Dataset]]
+
+
+def get_sequence_states(ds: Dataset) -> List[SequenceState]:
+    """
+    Returns the StructureSetROISequence and ROIContourSequence of the dataset with their lengths and last items
+    """
+    sequence_states = []
+    for keyword in ROI_SEQUENCE_KEYWORDS:
+        sequence = getattr(ds, keyword, None)
+        length = 0 if sequence is None else len(sequence)
+        sequence_states.append((sequence, length, sequence[-1] if length else None))
+    return sequence_states
+
+
+def is_same_state(state: SequenceState, other_state: SequenceState) -> bool:
+    # Sequences and items are compared by identity, comparing datasets by value would walk all their contours
+    return (
+        state[0] is other_state[0]
+        and state[1] == other_state[1]
+        and state[2] is other_state[2]
+    )
@@ -1,8 +1,21 @@
-from typing import List, Union
+import os
+from typing import Dict, List, Optional, Union
 import numpy as np
-from pydicom.dataset import FileDataset
-from rt_utils.utils import ROIData
-from . import ds_helper, image_helper
+from pydicom.dataset import Dataset, FileDataset
+from pydicom.sequence import Sequence
+from rt_utils.instrumentation import stage
+from rt_utils.mask_cache import MaskCache
+from rt_utils.packed_mask import PackedMask
+from rt_utils.roi_index import ROIIndex
+from rt_utils.parallel import Workers, map_ordered
+from rt_utils.progress import (
+    CancellationToken,
+    ProgressCallback,
+    create_progress_counter,
+    create_result_callback,
+)
+from rt_utils.utils import CroppedMask, ROIData
+from . import ds_helper, image_helper, lazy_rtstruct
 
 
 class RTStruct:
@@ -16,6 +29,45 @@ class RTStruct:
         self.frame_of_reference_uid = ds.ReferencedFrameOfReferenceSequence[
             -1
         ].FrameOfReferenceUID  # Use last structured set ROI
+        self.mask_cache: Optional[MaskCache] = None
+        # Part of the mask cache keys, incremented whenever the ROIs are modified through this class
+        self.modification_count = 0
+        self.roi_index: Optional[ROIIndex] = None
+
+    def get_roi_index(self) -> ROIIndex:
+        """
+        Returns the index of ROI names and numbers, which is built on first use and rebuilt if ROIs were
+        added to or removed from the sequences of `ds` directly, see `ROIIndex.is_stale`.
+        Call `invalidate_roi_index` after renaming, renumbering or replacing ROIs in place.
+        Rebuilding the index also clears the mask cache
+        """
+        if self.roi_index is None or self.roi_index.is_stale(self.ds):
+            if self.roi_index is not None:
+                self.invalidate_mask_cache()
+            self.roi_index = ROIIndex(self.ds)
+        return self.roi_index
+
+    def invalidate_roi_index(self):
+        self.roi_index = None
+        self.invalidate_mask_cache()
+
+    def enable_mask_cache(self, max_bytes: int):
+        """
+        Keep the masks returned by `get_roi_mask_by_name` and `get_roi_masks` in memory, up to a total of
+        `max_bytes`, evicting the least recently used masks first.
+        The cache is cleared by the methods adding ROIs. Edits of `ds` made directly, e.g. changing the
+        ContourData of a contour in place, are not detected, so call `invalidate_mask_cache` after them
+        """
+        self.mask_cache = MaskCache(max_bytes)
+
+    def disable_mask_cache(self):
+        self.mask_cache = None
+
+    def invalidate_mask_cache(self):
+        # Masks still being created under the previous count are cached under keys that are never looked up
+        self.modification_count += 1
+        if self.mask_cache is not None:
+            self.mask_cache.clear()
 
     def set_series_description(self, description: str):
         """
@@ -25,7 +77,7 @@ class RTStruct:
 
     def add_roi(
         self,
-        mask: np.ndarray,
+        mask: Union[np.ndarray, PackedMask],
         color: Union[str, List[int]] = None,
         name: str = None,
         description: str = "",
@@ -33,13 +85,18 @@ class RTStruct:
         approximate_contours: bool = True,
         roi_generation_algorithm: Union[str, int] = 0,
         contour_mode: str = "voxel_center",
+        workers: Workers = None,
+        use_processes: bool = False,
+        simplify_tolerance: Optional[float] = None,
+        progress: Optional[ProgressCallback] = None,
+        cancellation: Optional[CancellationToken] = None,
     ):
         """
         Add a Region of Interest (ROI) to the RTStruct given a 3D binary mask for each slice.
 
-        Optionally input a color or name for the ROI. 
+        Optionally input a color or name for the ROI.
         If `use_pin_hole` is set to True, attempts to handle ROIs with holes by creating a single continuous contour.
-        If `approximate_contours` is set to False, no approximation is done during contour generation, 
+        If `approximate_contours` is set to False, no approximation is done during contour generation,
         potentially resulting in a large amount of contour data.
 
         This method updates the internal DICOM structure (RTStruct) by adding:
@@ -49,9 +106,10 @@ class RTStruct:
 
         Parameters
         ----------
-        mask : np.ndarray
+        mask : np.ndarray or PackedMask
             3D boolean array indicating the ROI. Its shape must match
             the underlying DICOM series in the third dimension.
+            A `PackedMask` is unpacked one slice at a time.
         color : str or list of int, optional
             Color representation for the ROI (e.g., "red" or [255, 0, 0]). Defaults to None.
         name : str, optional
@@ -68,6 +126,23 @@ class RTStruct:
             Placement of generated contours. ``"voxel_center"`` preserves the
             original OpenCV behavior. ``"voxel_edge"`` traces the outer edges
             of foreground voxels. Defaults to ``"voxel_center"``.
+        workers : int or concurrent.futures.Executor, optional
+            Number of threads (or an existing executor) used to generate the contours
+            of the slices in parallel. The result is identical to the serial one. Defaults to None (serial).
+        use_processes : bool, optional
+            If True and `workers` is an int, slices are processed by a process pool instead of threads.
+            Defaults to False.
+        simplify_tolerance : float, optional
+            Maximum distance in mm by which the simplified contours may deviate from the generated ones.
+            Contours are simplified with the Douglas-Peucker algorithm in patient coordinates, which reduces
+            the number of contour points. Defaults to None (no simplification).
+        progress : callable, optional
+            Called as ``progress(unit, completed, total)`` after each slice with unit ``"slices"``
+            and once the ROI is added with unit ``"rois"``. It is always called from the calling thread,
+            also when `workers` is given. Defaults to None.
+        cancellation : CancellationToken, optional
+            Checked between slices. Once it is cancelled, `OperationCancelled` is raised and no part
+            of the ROI is added to the RTStruct. Defaults to None.
 
         Raises
         ------
@@ -95,19 +170,64 @@ class RTStruct:
             approximate_contours,
             roi_generation_algorithm,
             contour_mode,
+            simplify_tolerance,
         )
 
-        self.ds.ROIContourSequence.append(
-            ds_helper.create_roi_contour(roi_data, self.series_data)
-        )
-        self.ds.StructureSetROISequence.append(
-            ds_helper.create_structure_set_roi(roi_data)
-        )
-        self.ds.RTROIObservationsSequence.append(
-            ds_helper.create_rtroi_observation(roi_data)
+        if cancellation is not None:
+            cancellation.raise_if_cancelled()
+
+        with stage("add_roi") as roi_stage:
+            # The ROI is only appended once all of its contours were created, so cancelling leaves no partial ROI
+            roi_contour = ds_helper.create_roi_contour(
+                roi_data,
+                self.series_data,
+                workers,
+                use_processes,
+                progress_counter=create_progress_counter(
+                    progress, "slices", len(self.series_data)
+                ),
+                cancellation=cancellation,
+            )
+            self.append_roi(roi_data, roi_contour)
+            roi_stage.add(rois=1)
+        if progress is not None:
+            progress("rois", 1, 1)
+
+    def append_roi(self, roi_data: ROIData, roi_contour: Dataset):
+        """
+        Appends the items of an ROI to the sequences of the RTStruct, see `append_roi_items`
+        """
+        self.append_roi_items(
+            ds_helper.create_structure_set_roi(roi_data),
+            roi_contour,
+            ds_helper.create_rtroi_observation(roi_data),
         )
 
-    def validate_mask(self, mask: np.ndarray) -> bool:
+    def append_roi_items(
+        self, structure_roi: Dataset, roi_contour: Dataset, rtroi_observation: Dataset
+    ):
+        """
+        Appends the items of an ROI to the sequences of the RTStruct, adds it to the ROI index
+        and clears the mask cache
+        """
+        self.ds.ROIContourSequence.append(roi_contour)
+        self.ds.StructureSetROISequence.append(structure_roi)
+        self.ds.RTROIObservationsSequence.append(rtroi_observation)
+        if self.roi_index is not None:
+            self.roi_index.add(self.ds, structure_roi, roi_contour)
+        self.invalidate_mask_cache()
+
+    def validate_mask(self, mask: Union[np.ndarray, PackedMask]) -> bool:
+        if isinstance(mask, PackedMask):
+            if len(self.series_data) != len(mask):
+                raise RTStruct.ROIException(
+                    "Mask must have the same number of layers (in the 3rd dimension) as the input series. "
+                    + f"Expected {len(self.series_data)}, got {len(mask)}"
+                )
+            if mask.count() == 0:
+                print("[INFO]: ROI mask is empty")
+            return True
+
         if mask.dtype != bool:
             raise RTStruct.ROIException(
                 f"Mask data type must be boolean, but got {mask.dtype}. Please ensure the mask is a 3D boolean array."
@@ -127,6 +247,133 @@ class RTStruct:
 
         return True
 
+    def add_rois_from_labelmap(
+        self,
+        labelmap: np.ndarray,
+        names: Optional[Union[List[str], Dict[int, str]]] = None,
+        colors: Optional[Union[List, Dict[int, Union[str, List[int]]]]] = None,
+        use_pin_hole: bool = False,
+        approximate_contours: bool = True,
+        roi_generation_algorithm: Union[str, int] = 0,
+        contour_mode: str = "voxel_center",
+        workers: Workers = None,
+        use_processes: bool = False,
+        simplify_tolerance: Optional[float] = None,
+        progress: Optional[ProgressCallback] = None,
+        cancellation: Optional[CancellationToken] = None,
+    ):
+        """
+        Add one ROI for each non-zero label of a 3D integer label map, in ascending label order.
+
+        Labels are split per slice in a single pass over the label map, so no full size binary mask is
+        created for any label. Labels that do not occur within the label map are not added.
+
+        Parameters
+        ----------
+        labelmap : np.ndarray
+            3D array of non-negative integer labels, where 0 is background. Its shape must match
+            the underlying DICOM series in the third dimension.
+        names : list of str or dict, optional
+            Names of the ROIs, either a list where `names[label - 1]` is the name of a label
+            or a dict keyed by label. Labels without a name are named ROI-{ROI Number}.
+        colors : list or dict, optional
+            Colors of the ROIs, indexed the same way as `names`.
+        use_pin_hole, approximate_contours, roi_generation_algorithm, contour_mode, workers, use_processes,
+        simplify_tolerance
+            Applied to every ROI, see `add_roi`.
+        progress, cancellation
+            See `add_roi`. Slices are reported once for all labels, and no ROI is added if cancelled.
+
+        Raises
+        ------
+        ROIException
+            - If the label map is not a 3D array of non-negative integers.
+            - If the label map's shape does not match the loaded DICOM series dimensions.
+        """
+        self.validate_labelmap(labelmap)
+
+        def get_label_value(values, label: int):
+            if values is None:
+                return None
+            if isinstance(values, dict):
+                return values.get(label)
+            return values[label - 1] if 0 < label <= len(values) else None
+
+        # Validate all ROIs before generating any contours so that no ROI is added if one is invalid
+        slice_labels = image_helper.get_labelmap_slice_labels(labelmap)
+        labels = sorted({int(label) for labels in slice_labels for label in labels})
+        first_roi_number = len(self.ds.StructureSetROISequence) + 1
+        rois_data = [
+            ROIData(
+                None,
+                get_label_value(colors, label),
+                first_roi_number + i,
+                get_label_value(names, label),
+                self.frame_of_reference_uid,
+                "",
+                use_pin_hole,
+                approximate_contours,
+                roi_generation_algorithm,
+                contour_mode,
+                simplify_tolerance,
+            )
+            for i, label in enumerate(labels)
+        ]
+
+        if cancellation is not None:
+            cancellation.raise_if_cancelled()
+
+        with stage("add_rois_from_labelmap") as roi_stage:
+            contours_coords = image_helper.get_labelmap_contours_coords(
+                labelmap,
+                self.series_data,
+                use_pin_hole,
+                approximate_contours,
+                contour_mode,
+                workers,
+                use_processes,
+                slice_labels,
+                simplify_tolerance,
+                create_progress_counter(progress, "slices", len(self.series_data)),
+                cancellation,
+            )
+
+            # All ROIs are created before any is appended, so that a failure leaves the RTStruct unchanged
+            roi_contours = [
+                ds_helper.create_roi_contour(
+                    roi_data, self.series_data, contours_coords=contours_coords[label]
+                )
+                for label, roi_data in zip(labels, rois_data)
+            ]
+            rois_counter = create_progress_counter(progress, "rois", len(rois_data))
+            for roi_data, roi_contour in zip(rois_data, roi_contours):
+                self.append_roi(roi_data, roi_contour)
+                if rois_counter is not None:
+                    rois_counter.advance()
+            roi_stage.add(rois=len(rois_data))
+
+    def validate_labelmap(self, labelmap: np.ndarray) -> bool:
+        if not np.issubdtype(labelmap.dtype, np.integer):
+            raise RTStruct.ROIException(
+                f"Label map data type must be an integer type, but got {labelmap.dtype}."
+            )
+
+        if labelmap.ndim != 3:
+            raise RTStruct.ROIException(
+                f"Label map must be 3 dimensional. Got {labelmap.ndim}"
+            )
+
+        if len(self.series_data) != np.shape(labelmap)[2]:
+            raise RTStruct.ROIException(
+                "Label map must have the same number of layers (in the 3rd dimension) as the input series. "
+                + f"Expected {len(self.series_data)}, got {np.shape(labelmap)[2]}"
+            )
+
+        if labelmap.size and labelmap.min() < 0:
+            raise RTStruct.ROIException("Label map must not contain negative labels")
+
+        return True
+
     def get_roi_names(self) -> List[str]:
         """
         Returns a list of the names of all ROI within the RTStruct
@@ -139,21 +386,211 @@ class RTStruct:
             structure_roi.ROIName for structure_roi in self.ds.StructureSetROISequence
         ]
 
-    def get_roi_mask_by_name(self, name) -> np.ndarray:
+    def get_roi_mask_by_name(
+        self,
+        name,
+        out: Optional[np.ndarray] = None,
+        packed: bool = False,
+        progress: Optional[ProgressCallback] = None,
+        cancellation: Optional[CancellationToken] = None,
+    ) -> Union[np.ndarray, PackedMask]:
+        """
+        Returns the 3D binary mask of the ROI with the given input name.
+        If `out` is given, e.g. from `image_helper.create_series_mask_memmap`, the mask is written into it
+        one slice at a time and `out` is returned.
+        If `packed` is True, a `PackedMask` using one bit per voxel is returned, packed slice by slice.
+        See `get_roi_masks` for `progress` and `cancellation`
+        """
+        return self.get_roi_masks(
+            [name],
+            out=None if out is None else {name: out},
+            progress=progress,
+            cancellation=cancellation,
+            packed=packed,
+        )[name]
+
+    def get_roi_mask_crop_by_name(self, name) -> CroppedMask:
         """
-        Returns the 3D binary mask of the ROI with the given input name
+        Returns the 3D binary mask of the ROI with the given input name, cropped to the voxel bounding box
+        of its contour points, together with its offset within the full mask and its pixel to patient matrix.
+        Memory and time scale with the size of the ROI instead of the size of the image
         """
 
-        for structure_roi in self.ds.StructureSetROISequence:
-            if structure_roi.ROIName == name:
-                contour_sequence = ds_helper.get_contour_sequence_by_roi_number(
-                    self.ds, structure_roi.ROINumber
+        mask, offset = image_helper.create_cropped_series_mask_from_contour_sequence(
+            self.series_data, self.get_roi_contour_sequence(name)
+        )
+
+        # Shift the origin to the first voxel of the crop, given as (x, y, slice) to the matrix
+        affine = image_helper.get_pixel_to_patient_transformation_matrix(
+            self.series_data
+        ).astype(np.float64)
+        first_y, first_x, first_slice = offset
+        affine[:, 3] = affine @ np.array([first_x, first_y, first_slice, 1.0])
+        return CroppedMask(mask, offset, affine)
+
+    def get_roi_contour_sequence(
+        self, name: str, roi_index: Optional[ROIIndex] = None
+    ) -> Sequence:
+        """
+        Returns the ContourSequence of the ROI with the given name, looked up in the ROI index.
+        An index that was just retrieved may be passed in to skip checking it once more
+        """
+        if roi_index is None:
+            roi_index = self.get_roi_index()
+        roi_number = roi_index.get_roi_number(name)
+        if roi_number is None:
+            raise RTStruct.ROIException(
+                f"ROI of name `{name}` does not exist in RTStruct"
+            )
+
+        roi_contour = roi_index.get_roi_contour(roi_number)
+        if roi_contour is None:
+            raise Exception(f"Referenced ROI number '{roi_number}' not found")
+        return getattr(roi_contour, "ContourSequence", Sequence())
+
+    def get_roi_masks(
+        self,
+        names: List[str],
+        workers: Workers = None,
+        stack: bool = False,
+        out: Optional[Union[Dict[str, np.ndarray], np.ndarray]] = None,
+        progress: Optional[ProgressCallback] = None,
+        cancellation: Optional[CancellationToken] = None,
+        packed: bool = False,
+    ) -> Union[Dict[str, np.ndarray], Dict[str, PackedMask], np.ndarray]:
+        """
+        Returns the 3D binary masks of the ROIs with the given names.
+
+        The ROI lookups and the series geometry are shared by all ROIs. If `workers` is given, the ROIs are
+        rasterized by a thread pool, see `parallel.map_ordered`.
+        Returns a dict of masks keyed by name, or a 4D array with the masks stacked along the last axis
+        in the order of `names` if `stack` is True.
+
+        Masks are written one slice at a time into `out` if it is given, which is a dict of 3D arrays keyed
+        by name, or a 4D array if `stack` is True. These may be `np.memmap` arrays, see
+        `image_helper.create_series_mask_memmap`, so that no mask is held in memory. Masks written into `out`
+        are not added to the mask cache, but cached masks are copied into `out`.
+
+        If `packed` is True, a dict of `PackedMask` is returned instead, each packed slice by slice,
+        so no full size boolean mask is allocated. Packed masks cannot be stacked or written into `out`.
+
+        `progress` is called as ``progress(unit, completed, total)`` after each slice of any ROI with unit
+        ``"slices"`` and after each ROI with unit ``"rois"``. If `workers` is given, the ``"slices"`` calls
+        are made from the worker threads rasterizing the ROIs, one call at a time, while the ``"rois"`` calls
+        are made from the calling thread. `cancellation` is checked between slices, and `OperationCancelled`
+        is raised once it is cancelled.
+        """
+
+        if packed and (stack or out is not None):
+            raise ValueError(
+                "Packed masks cannot be stacked or written into an output array"
+            )
+
+        roi_index = self.get_roi_index()
+        for name in names:
+            if roi_index.get_roi_number(name) is None:
+                raise RTStruct.ROIException(
+                    f"ROI of name `{name}` does not exist in RTStruct"
                 )
-                return image_helper.create_series_mask_from_contour_sequence(
-                    self.series_data, contour_sequence
+
+        mask_shape = image_helper.get_series_mask_shape(self.series_data)
+        mask_outs = {}
+        if stack and out is not None:
+            if out.shape != mask_shape + (len(names),):
+                raise ValueError(
+                    f"Stacked mask output must have shape {mask_shape + (len(names),)}, got {out.shape}"
                 )
+            mask_outs = {name: out[..., i] for i, name in enumerate(names)}
+        elif out is not None:
+            mask_outs = out
+
+        transformation_matrix = image_helper.get_patient_to_pixel_transformation_matrix(
+            self.series_data
+        )
+        slices_counter = create_progress_counter(
+            progress, "slices", len(names) * len(self.series_data)
+        )
+
+        def create_mask(
+            contour_sequence: Sequence, mask_out: Optional[np.ndarray]
+        ) -> Union[np.ndarray, PackedMask]:
+            if packed:
+                return image_helper.create_packed_series_mask_from_contour_sequence(
+                    self.series_data,
+                    contour_sequence,
+                    transformation_matrix,
+                    slices_counter,
+                    cancellation,
+                )
+            return image_helper.create_series_mask_from_contour_sequence(
+                self.series_data,
+                contour_sequence,
+                transformation_matrix,
+                mask_out,
+                slices_counter,
+                cancellation,
+            )
 
-        raise RTStruct.ROIException(f"ROI of name `{name}` does not exist in RTStruct")
+        def get_mask(name: str) -> Union[np.ndarray, PackedMask]:
+            roi_number = roi_index.get_roi_number(name)
+            contour_sequence = self.get_roi_contour_sequence(name, roi_index)
+            mask_out = mask_outs.get(name)
+
+            if self.mask_cache is None:
+                return create_mask(contour_sequence, mask_out)
+
+            key = (name, roi_number, self.modification_count, packed)
+            mask = self.mask_cache.get(key)
+            if mask is None:
+                mask = create_mask(contour_sequence, mask_out)
+                # Masks written into `out` are not cached, since a cached copy would be held in memory
+                if mask_out is None:
+                    self.mask_cache.put(key, mask.copy())
+                return mask
+            if slices_counter is not None:
+                slices_counter.advance(len(self.series_data))
+            if mask_out is not None:
+                image_helper.validate_series_mask_out(self.series_data, mask_out)
+                mask_out[...] = mask
+                return mask_out
+            # Return a copy so callers cannot modify the cached mask
+            return mask.copy()
+
+        with stage("get_roi_masks") as masks_stage:
+            masks = map_ordered(
+                get_mask,
+                names,
+                workers,
+                on_result=create_result_callback(
+                    create_progress_counter(progress, "rois", len(names)), cancellation
+                ),
+            )
+            masks_stage.add(rois=len(names))
+
+        if stack and out is not None:
+            return out
+        if stack:
+            if len(masks) == 0:
+                return np.zeros(mask_shape + (0,), dtype=bool)
+            return np.stack(masks, axis=-1)
+
+        return dict(zip(names, masks))
+
+    def get_all_roi_masks(
+        self,
+        workers: Workers = None,
+        stack: bool = False,
+        out: Optional[Union[Dict[str, np.ndarray], np.ndarray]] = None,
+        progress: Optional[ProgressCallback] = None,
+        cancellation: Optional[CancellationToken] = None,
+        packed: bool = False,
+    ) -> Union[Dict[str, np.ndarray], Dict[str, PackedMask], np.ndarray]:
+        """
+        Returns the 3D binary masks of all ROIs within the RTStruct, see `get_roi_masks`
+        """
+        return self.get_roi_masks(
+            self.get_roi_names(), workers, stack, out, progress, cancellation, packed
+        )
 
     def save(self, file_path: str):
         """
@@ -162,12 +599,16 @@ class RTStruct:
         """
         # Add .dcm if needed
         file_path = file_path if file_path.endswith(".dcm") else file_path + ".dcm"
+        # Contours of a lazily read RTStruct must be read before its file may be overwritten
+        lazy_rtstruct.load_contour_sequences(self.ds)
 
         try:
             # Using 'with' to handle file opening and closing automatically
-            with open(file_path, "w") as file:
+            with open(file_path, "w") as file, stage("save") as save_stage:
                 print("Writing file to", file_path)
                 self.ds.save_as(file_path)
+                if save_stage.enabled:
+                    save_stage.add(bytes=os.path.getsize(file_path))
         except OSError:
             raise Exception(f"Cannot write to file path '{file_path}'")
 
@@ -175,4 +616,5 @@ class RTStruct:
         """
         Exception class for invalid ROI masks
         """
+
         pass
@@ -1,12 +1,18 @@
-from typing import List
+import os
+from typing import BinaryIO, List, Optional, Set, Union
 from pydicom.dataset import Dataset
 from pydicom.filereader import dcmread
 
 import warnings
 
+from rt_utils.instrumentation import stage
+from rt_utils.parallel import Workers
+from rt_utils.series_cache import SeriesCache
+from rt_utils.series_index import SeriesIndex
 from rt_utils.utils import SOPClassUID
-from . import ds_helper, image_helper
+from . import ds_helper, image_helper, lazy_rtstruct
 from .rtstruct import RTStruct
+from .rtstruct_writer import RTStructWriter
 
 
 class RTStructBuilder:
@@ -15,28 +21,155 @@ class RTStructBuilder:
     """
 
     @staticmethod
-    def create_new(dicom_series_path: str) -> RTStruct:
+    def create_new(
+        dicom_series_path: Union[str, SeriesIndex],
+        defer_pixel_data: bool = False,
+        workers: Workers = None,
+        use_processes: bool = False,
+        cache: Optional[SeriesCache] = None,
+        series_instance_uid: Optional[str] = None,
+    ) -> RTStruct:
         """
-        Method to generate a new rt struct from a DICOM series
+        Method to generate a new rt struct from a DICOM series.
+        See `load_series_data` for the loading options
         """
 
-        series_data = image_helper.load_sorted_image_series(dicom_series_path)
-        ds = ds_helper.create_rtstruct_dataset(series_data)
-        return RTStruct(series_data, ds)
+        with stage("create_new"):
+            series_data = RTStructBuilder.load_series_data(
+                dicom_series_path,
+                series_instance_uid,
+                defer_pixel_data,
+                workers,
+                use_processes,
+                cache,
+            )
+            ds = ds_helper.create_rtstruct_dataset(series_data)
+            return RTStruct(series_data, ds)
 
     @staticmethod
-    def create_from(dicom_series_path: str, rt_struct_path: str, warn_only: bool = False) -> RTStruct:
+    def create_from(
+        dicom_series_path: Union[str, SeriesIndex],
+        rt_struct_path: Union[str, BinaryIO],
+        warn_only: bool = False,
+        defer_pixel_data: bool = False,
+        workers: Workers = None,
+        use_processes: bool = False,
+        cache: Optional[SeriesCache] = None,
+        series_instance_uid: Optional[str] = None,
+        lazy: bool = False,
+    ) -> RTStruct:
         """
-        Method to load an existing rt struct, given related DICOM series and existing rt struct
+        Method to load an existing rt struct, given related DICOM series and existing rt struct.
+        If a SeriesIndex is given without a `series_instance_uid`, the series referenced by the rt struct is used.
+        If `lazy` is True, the contours of each ROI are only parsed from file once the ROI is requested,
+        see `lazy_rtstruct.read_lazy_rtstruct`. `rt_struct_path` must then be a path, and the file must remain
+        available until the RTStruct is saved.
+        See `load_series_data` for the loading options
         """
 
-        series_data = image_helper.load_sorted_image_series(dicom_series_path)
-        ds = dcmread(rt_struct_path)
-        RTStructBuilder.validate_rtstruct(ds)
-        RTStructBuilder.validate_rtstruct_series_references(ds, series_data, warn_only)
+        with stage("create_from"):
+            with stage("read_rtstruct") as read_stage:
+                ds = (
+                    lazy_rtstruct.read_lazy_rtstruct(rt_struct_path)
+                    if lazy
+                    else dcmread(rt_struct_path)
+                )
+                # File-like objects accepted by dcmread have no size on disk to report
+                if read_stage.enabled and isinstance(
+                    rt_struct_path, (str, os.PathLike)
+                ):
+                    read_stage.add(bytes=os.path.getsize(rt_struct_path))
+            RTStructBuilder.validate_rtstruct(ds)
+            if (
+                isinstance(dicom_series_path, SeriesIndex)
+                and series_instance_uid is None
+            ):
+                series_instance_uid = dicom_series_path.get_referenced_series_uid(ds)
 
-        # TODO create new frame of reference? Right now we assume the last frame of reference created is suitable
-        return RTStruct(series_data, ds)
+            series_data = RTStructBuilder.load_series_data(
+                dicom_series_path,
+                series_instance_uid,
+                defer_pixel_data,
+                workers,
+                use_processes,
+                cache,
+            )
+            with stage("validate_references"):
+                RTStructBuilder.validate_rtstruct_series_references(
+                    ds, series_data, warn_only
+                )
+
+            # TODO create new frame of reference? Right now we assume the last frame of reference created is suitable
+            return RTStruct(series_data, ds)
+
+    @staticmethod
+    def create_writer(
+        dicom_series_path: Union[str, SeriesIndex],
+        output: Union[str, BinaryIO],
+        defer_pixel_data: bool = False,
+        workers: Workers = None,
+        use_processes: bool = False,
+        cache: Optional[SeriesCache] = None,
+        series_instance_uid: Optional[str] = None,
+    ) -> RTStructWriter:
+        """
+        Method to generate a new rt struct from a DICOM series that streams the contours of each added ROI
+        to the output path or file-like object, see `RTStructWriter`.
+        See `load_series_data` for the loading options
+        """
+
+        series_data = RTStructBuilder.load_series_data(
+            dicom_series_path,
+            series_instance_uid,
+            defer_pixel_data,
+            workers,
+            use_processes,
+            cache,
+        )
+        return RTStructWriter(series_data, output)
+
+    @staticmethod
+    def load_series_data(
+        dicom_series_path: Union[str, SeriesIndex],
+        series_instance_uid: Optional[str] = None,
+        defer_pixel_data: bool = False,
+        workers: Workers = None,
+        use_processes: bool = False,
+        cache: Optional[SeriesCache] = None,
+    ) -> List[Dataset]:
+        """
+        Method to load the sorted image series an rt struct is built on.
+
+        `dicom_series_path` is either a directory holding a single series or a SeriesIndex of an already scanned
+        directory tree. If `series_instance_uid` is given, only that series is used, scanning the path into a
+        SeriesIndex first if needed.
+        If `defer_pixel_data` is True, only image headers are read and pixel data is loaded on access.
+        The pixel data of a series taken from a given SeriesIndex is always loaded on access.
+        If `workers` is given, files are read by a thread pool (or a process pool if `use_processes` is True).
+        If a `cache` is given, an unchanged series directory is loaded from it instead of parsing its files again.
+        The cache stores whole series directories, so it cannot be combined with a `series_instance_uid`
+        """
+
+        if isinstance(dicom_series_path, SeriesIndex):
+            return dicom_series_path.get_series_data(series_instance_uid)
+
+        if series_instance_uid is not None:
+            if cache is not None:
+                raise ValueError(
+                    "A series cache cannot be used when selecting a series by its SeriesInstanceUID"
+                )
+            series_index = SeriesIndex.from_path(
+                dicom_series_path, workers, use_processes
+            )
+            series_data = series_index.get_series_data(series_instance_uid)
+            # The index only reads headers, so read the pixel data now unless it should be deferred
+            if not defer_pixel_data:
+                image_helper.load_pixel_data(series_data)
+            return series_data
+
+        return image_helper.load_sorted_image_series(
+            dicom_series_path, defer_pixel_data, workers, use_processes, cache
+        )
 
     @staticmethod
     def validate_rtstruct(ds: Dataset):
@@ -53,10 +186,13 @@ class RTStructBuilder:
             raise Exception("Please check that the existing RTStruct is valid")
 
     @staticmethod
-    def validate_rtstruct_series_references(ds: Dataset, series_data: List[Dataset], warn_only: bool = False):
+    def validate_rtstruct_series_references(
+        ds: Dataset, series_data: List[Dataset], warn_only: bool = False
+    ):
         """
         Method to validate RTStruct only references dicom images found within the input series_data
         """
+        series_sop_instance_uids = {series.SOPInstanceUID for series in series_data}
         for refd_frame_of_ref in ds.ReferencedFrameOfReferenceSequence:
             # Study sequence references are optional so return early if it does not exist
             if "RTReferencedStudySequence" not in refd_frame_of_ref:
@@ -66,23 +202,33 @@ class RTStructBuilder:
                 for rt_refd_series in rt_refd_study.RTReferencedSeriesSequence:
                     for contour_image in rt_refd_series.ContourImageSequence:
                         RTStructBuilder.validate_contour_image_in_series_data(
-                            contour_image, series_data, warn_only
+                            contour_image,
+                            series_data,
+                            warn_only,
+                            series_sop_instance_uids,
                         )
 
     @staticmethod
     def validate_contour_image_in_series_data(
-        contour_image: Dataset, series_data: List[Dataset], warning_only: bool = False
+        contour_image: Dataset,
+        series_data: List[Dataset],
+        warning_only: bool = False,
+        series_sop_instance_uids: Optional[Set[str]] = None,
     ):
         """
-        Method to validate that the ReferencedSOPInstanceUID of a given contour image exists within the series data
+        Method to validate that the ReferencedSOPInstanceUID of a given contour image exists within the series data.
+        The set of SOPInstanceUIDs of the series may be passed in when validating many contour images
         """
-        for series in series_data:
-            if contour_image.ReferencedSOPInstanceUID == series.SOPInstanceUID:
-                return
+        if series_sop_instance_uids is None:
+            series_sop_instance_uids = {series.SOPInstanceUID for series in series_data}
+        if contour_image.ReferencedSOPInstanceUID in series_sop_instance_uids:
+            return
 
         # ReferencedSOPInstanceUID is NOT available
-        msg = f"Loaded RTStruct references image(s) that are not contained in input series data. " \
-              f"Problematic image has SOP Instance Id: {contour_image.ReferencedSOPInstanceUID}"
+        msg = (
+            f"Loaded RTStruct references image(s) that are not contained in input series data. "
+            f"Problematic image has SOP Instance Id: {contour_image.ReferencedSOPInstanceUID}"
+        )
         if warning_only:
             warnings.warn(msg)
         else:
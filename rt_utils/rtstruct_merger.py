@@ -1,33 +1,61 @@
+from typing import Optional
 from .rtstruct import RTStruct
 from .rtstruct_builder import RTStructBuilder
 from . import ds_helper, image_helper
+from .parallel import Workers
+from .series_cache import SeriesCache
 
-class RTStructMerger:
 
+class RTStructMerger:
 
     @staticmethod
-    def merge_rtstructs(dicom_series_path: str, rt_struct_path1: str, 
-        rt_struct_path2: str) -> RTStruct:
+    def merge_rtstructs(
+        dicom_series_path: str,
+        rt_struct_path1: str,
+        rt_struct_path2: str,
+        workers: Workers = None,
+        use_processes: bool = False,
+        cache: Optional[SeriesCache] = None,
+    ) -> RTStruct:
         """
-        Method to merge two existing RTStruct files belonging to same series data, returning them as one RTStruct
+        Method to merge two existing RTStruct files belonging to same series data, returning them as one RTStruct.
+        If `workers` is given, the series is read by a thread pool (or a process pool if `use_processes` is True).
+        If a `cache` is given, an unchanged series is loaded from it instead of parsing its files again
         """
 
-        rtstruct1 = RTStructBuilder.create_from(dicom_series_path, rt_struct_path1)
-        rtstruct2 = RTStructBuilder.create_from(dicom_series_path, rt_struct_path2)
-        
-        for roi_contour_seq, struct_set_roi_seq, rt_roi_observation_seq in zip(rtstruct1.ds.ROIContourSequence, rtstruct1.ds.StructureSetROISequence, rtstruct1.ds.RTROIObservationsSequence):
+        rtstruct1 = RTStructBuilder.create_from(
+            dicom_series_path,
+            rt_struct_path1,
+            workers=workers,
+            use_processes=use_processes,
+            cache=cache,
+        )
+        rtstruct2 = RTStructBuilder.create_from(
+            dicom_series_path,
+            rt_struct_path2,
+            workers=workers,
+            use_processes=use_processes,
+            cache=cache,
+        )
+
+        roi_index = rtstruct2.get_roi_index()
+        for roi_contour_seq, struct_set_roi_seq, rt_roi_observation_seq in zip(
+            rtstruct1.ds.ROIContourSequence,
+            rtstruct1.ds.StructureSetROISequence,
+            rtstruct1.ds.RTROIObservationsSequence,
+        ):
             roi_number = len(rtstruct2.ds.StructureSetROISequence) + 1
             roi_contour_seq.ReferencedROINumber = roi_number
             struct_set_roi_seq.ROINumber = roi_number
             rt_roi_observation_seq.ReferencedROINumber = roi_number
 
             # check for ROI name duplication
-            for struct_set_roi_seq2 in rtstruct2.ds.StructureSetROISequence:
-                if struct_set_roi_seq.ROIName == struct_set_roi_seq2.ROIName:
-                    struct_set_roi_seq += "_2"
+            while roi_index.get_roi_number(struct_set_roi_seq.ROIName) is not None:
+                struct_set_roi_seq.ROIName += "_2"
 
-            rtstruct2.ds.ROIContourSequence.append(roi_contour_seq)
-            rtstruct2.ds.StructureSetROISequence.append(struct_set_roi_seq)
-            rtstruct2.ds.RTROIObservationsSequence.append(rt_roi_observation_seq)
+            # Appending through the RTStruct keeps its ROI index current
+            rtstruct2.append_roi_items(
+                struct_set_roi_seq, roi_contour_seq, rt_roi_observation_seq
+            )
 
-        return rtstruct2
\ No newline at end of file
+        return rtstruct2
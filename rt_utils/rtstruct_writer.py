@@ -0,0 +1,131 @@
+import shutil
+import struct
+import tempfile
+from typing import BinaryIO, Union
+
+from pydicom.charset import default_encoding
+from pydicom.dataset import Dataset
+from pydicom.filebase import DicomBytesIO, DicomFileLike
+from pydicom.filewriter import write_dataset, write_file_meta_info
+from pydicom.tag import Tag
+
+from . import ds_helper
+from .rtstruct import RTStruct
+
+"""
+File contains a writer that streams the ROI contours of a new RTStruct to file
+"""
+
+ROI_CONTOUR_SEQUENCE_TAG = Tag("ROIContourSequence")
+ITEM_TAG = 0xE000
+SEQUENCE_DELIMITER_TAG = 0xE0DD
+UNDEFINED_LENGTH = 0xFFFFFFFF
+
+
+class RTStructWriter:
+    """
+    Writes a new RTStruct without keeping the contours of every ROI in memory.
+
+    The header is created by `ds_helper` and kept in memory by a wrapped RTStruct, while the
+    ROIContourSequence item of each added ROI is encoded right away and spooled to a temporary file.
+    The file is assembled on `close`, since the StructureSetROISequence precedes the contours and is
+    only known once all ROIs are added. Peak memory is bounded by the contours of a single ROI.
+    """
+
+    def __init__(self, series_data, output: Union[str, BinaryIO]):
+        self.rtstruct = RTStruct(
+            series_data, ds_helper.create_rtstruct_dataset(series_data)
+        )
+        self.output = output
+        self.roi_contours_file = tempfile.TemporaryFile()
+        self.closed = False
+
+    def __enter__(self) -> "RTStructWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.roi_contours_file.close()
+            self.closed = True
+
+    def set_series_description(self, description: str):
+        self.rtstruct.set_series_description(description)
+
+    def get_roi_names(self):
+        return self.rtstruct.get_roi_names()
+
+    def add_roi(self, mask, *args, **kwargs):
+        """
+        Adds an ROI to the RTStruct and writes its contours to the spool file.
+        Takes the same parameters as `RTStruct.add_roi`
+        """
+        if self.closed:
+            raise Exception("Unable to add an ROI to a closed RTStructWriter")
+
+        self.rtstruct.add_roi(mask, *args, **kwargs)
+        self.write_roi_contour(self.rtstruct.ds.ROIContourSequence.pop())
+
+    def write_roi_contour(self, roi_contour: Dataset):
+        item = DicomBytesIO()
+        item.is_little_endian = True
+        item.is_implicit_VR = True
+        write_dataset(item, roi_contour)
+
+        item_value = item.getvalue()
+        self.roi_contours_file.write(
+            struct.pack("<HHL", 0xFFFE, ITEM_TAG, len(item_value))
+        )
+        self.roi_contours_file.write(item_value)
+
+    def close(self):
+        """
+        Writes the RTStruct to the output path or file-like object and removes the spool file
+        """
+        if self.closed:
+            return
+
+        try:
+            if isinstance(self.output, str):
+                file_path = (
+                    self.output
+                    if self.output.endswith(".dcm")
+                    else self.output + ".dcm"
+                )
+                with open(file_path, "wb") as file:
+                    self.write(file)
+            else:
+                self.write(self.output)
+        finally:
+            self.roi_contours_file.close()
+            self.closed = True
+
+    def write(self, file: BinaryIO):
+        ds = self.rtstruct.ds
+        fp = DicomFileLike(file)
+
+        fp.write(ds.preamble or b"\0" * 128)
+        fp.write(b"DICM")
+        write_file_meta_info(fp, ds.file_meta)
+
+        # Implicit VR little endian, see ds_helper.get_file_meta
+        fp.is_little_endian = True
+        fp.is_implicit_VR = True
+        header_elements = Dataset()
+        trailing_elements = Dataset()
+        for elem in ds:
+            if elem.tag < ROI_CONTOUR_SEQUENCE_TAG:
+                header_elements.add(elem)
+            elif elem.tag > ROI_CONTOUR_SEQUENCE_TAG:
+                trailing_elements.add(elem)
+        character_set = ds.get("SpecificCharacterSet", default_encoding)
+        write_dataset(fp, header_elements)
+
+        fp.write_tag(ROI_CONTOUR_SEQUENCE_TAG)
+        fp.write_UL(UNDEFINED_LENGTH)
+        self.roi_contours_file.seek(0)
+        shutil.copyfileobj(self.roi_contours_file, file)
+        fp.write(struct.pack("<HHL", 0xFFFE, SEQUENCE_DELIMITER_TAG, 0))
+
+        write_dataset(fp, trailing_elements, character_set)
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import List, Optional, Tuple
+
+from pydicom.dataset import Dataset
+
+"""
+File contains a persistent on-disk cache of loaded image series
+"""
+
+CACHE_FORMAT_VERSION = 1
+CACHE_ENTRY_SUFFIX = ".series.pkl"
+
+Fingerprint = List[Tuple[str, int, int]]
+
+
+class SeriesCache:
+    """
+    Stores the sorted image headers of loaded series in `cache_dir` so that reopening an unchanged
+    series does not parse its files again.
+
+    An entry is only used while every file of the series directory still has the same path, size
+    and modification time as when the entry was stored. Pixel data is not stored, it is read from the
+    original files when accessed. Once the entries exceed `max_size_bytes`, the least recently used
+    ones are removed.
+    """
+
+    def __init__(self, cache_dir: str, max_size_bytes: int = 1024**3):
+        if max_size_bytes <= 0:
+            raise ValueError(f"Cache size must be positive, got {max_size_bytes}")
+
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def load(self, dicom_series_path: str) -> Optional[List[Dataset]]:
+        """
+        Returns the cached series of the given path, or None if it is not cached or the files have changed
+        """
+        entry_path = self.get_entry_path(dicom_series_path)
+        try:
+            with open(entry_path, "rb") as file:
+                header = pickle.load(file)
+                if header["version"] != CACHE_FORMAT_VERSION or header[
+                    "fingerprint"
+                ] != get_fingerprint(dicom_series_path):
+                    raise ValueError("Outdated cache entry")
+                series_data = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Stale or unreadable entry, it will be replaced by the next store
+            self.invalidate(dicom_series_path)
+            return None
+
+        # Mark the entry as recently used
+        os.utime(entry_path)
+        return series_data
+
+    def store(
+        self,
+        dicom_series_path: str,
+        series_data: List[Dataset],
+        fingerprint: Optional[Fingerprint] = None,
+    ):
+        """
+        Stores the series loaded from the given path and evicts old entries if the cache is too large.
+        Pass the `fingerprint` taken before the series was read, so that files modified while reading
+        make the entry outdated instead of being stored with the new fingerprint
+        """
+        if fingerprint is None:
+            fingerprint = get_fingerprint(dicom_series_path)
+        header = {
+            "version": CACHE_FORMAT_VERSION,
+            "series_path": os.path.abspath(dicom_series_path),
+            "fingerprint": fingerprint,
+        }
+
+        # Write to a temporary file first so readers never see a partial entry
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.cache_dir)
+        try:
+            with os.fdopen(file_descriptor, "wb") as file:
+                pickle.dump(header, file, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(series_data, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.get_entry_path(dicom_series_path))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        self.evict()
+
+    def invalidate(self, dicom_series_path: str):
+        """
+        Removes the entry of the given path if it exists
+        """
+        try:
+            os.remove(self.get_entry_path(dicom_series_path))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """
+        Removes all entries from the cache
+        """
+        for entry_path in self.get_entry_paths():
+            os.remove(entry_path)
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits within its size limit
+        """
+        entries = []
+        for entry_path in self.get_entry_paths():
+            stat = os.stat(entry_path)
+            entries.append((stat.st_mtime_ns, stat.st_size, entry_path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            os.remove(entry_path)
+            total_size -= size
+
+    def get_entry_path(self, dicom_series_path: str) -> str:
+        key = hashlib.sha256(
+            os.path.realpath(dicom_series_path).encode("utf-8")
+        ).hexdigest()
+        return os.path.join(self.cache_dir, key + CACHE_ENTRY_SUFFIX)
+
+    def get_entry_paths(self) -> List[str]:
+        return [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if name.endswith(CACHE_ENTRY_SUFFIX)
+        ]
+
+
+def get_fingerprint(dicom_series_path: str) -> Fingerprint:
+    """
+    Returns the path, size and modification time of every file within the series directory
+    """
+    fingerprint = []
+    for root, _, files in os.walk(dicom_series_path):
+        for file in files:
+            file_path = os.path.join(root, file)
+            stat = os.stat(file_path)
+            fingerprint.append(
+                (
+                    os.path.relpath(file_path, dicom_series_path),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                )
+            )
+
+    fingerprint.sort()
+    return fingerprint
@@ -0,0 +1,164 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from pydicom import dcmread
+from pydicom.dataset import Dataset
+
+from rt_utils import image_helper
+from rt_utils.parallel import Workers, map_ordered
+
+"""
+File contains an index of the DICOM series found within a directory tree
+"""
+
+
+@dataclass
+class SeriesEntry:
+    """Data class holding the files of one series found by a SeriesIndex."""
+
+    study_instance_uid: str
+    series_instance_uid: str
+    modality: str
+    frame_of_reference_uid: Optional[str] = None
+    file_paths: List[str] = field(default_factory=list)
+    datasets: List[Dataset] = field(default_factory=list)
+
+    @property
+    def is_image_series(self) -> bool:
+        return len(self.datasets) > 0 and all("PixelData" in ds for ds in self.datasets)
+
+
+class SeriesIndex:
+    """
+    Groups the DICOM files of a patient or study directory tree by StudyInstanceUID, SeriesInstanceUID
+    and Modality after scanning the tree once.
+
+    Files are parsed without their pixel data, which is read from disk when accessed.
+    """
+
+    def __init__(self, series: Dict[str, SeriesEntry]):
+        self.series = series
+
+    @staticmethod
+    def from_path(
+        root_path: str, workers: Workers = None, use_processes: bool = False
+    ) -> "SeriesIndex":
+        """
+        Scans every file below `root_path`. Files that are not DICOM or lack a SeriesInstanceUID are skipped.
+        If `workers` is given, files are read in parallel, see `parallel.map_ordered`
+        """
+        file_paths = [
+            os.path.join(root, file)
+            for root, _, files in os.walk(root_path)
+            for file in files
+        ]
+        datasets = map_ordered(read_dcm_header, file_paths, workers, use_processes)
+
+        series = {}
+        for file_path, ds in zip(file_paths, datasets):
+            if ds is None or "SeriesInstanceUID" not in ds:
+                continue
+
+            series_instance_uid = str(ds.SeriesInstanceUID)
+            if series_instance_uid not in series:
+                series[series_instance_uid] = SeriesEntry(
+                    study_instance_uid=str(getattr(ds, "StudyInstanceUID", "")),
+                    series_instance_uid=series_instance_uid,
+                    modality=str(getattr(ds, "Modality", "")),
+                    frame_of_reference_uid=getattr(ds, "FrameOfReferenceUID", None),
+                )
+            series[series_instance_uid].file_paths.append(file_path)
+            series[series_instance_uid].datasets.append(ds)
+
+        return SeriesIndex(series)
+
+    def get_series(self, series_instance_uid: str) -> SeriesEntry:
+        if series_instance_uid not in self.series:
+            raise Exception(
+                f"Series with SeriesInstanceUID '{series_instance_uid}' not found in index"
+            )
+        return self.series[series_instance_uid]
+
+    def get_image_series(self) -> List[SeriesEntry]:
+        return [entry for entry in self.series.values() if entry.is_image_series]
+
+    def get_rtstruct_series(self) -> List[SeriesEntry]:
+        return [entry for entry in self.series.values() if entry.modality == "RTSTRUCT"]
+
+    def get_series_data(
+        self, series_instance_uid: Optional[str] = None
+    ) -> List[Dataset]:
+        """
+        Returns the image datasets of the given series sorted in ascending order.
+        The series UID may be omitted if the index contains a single image series
+        """
+        if series_instance_uid is None:
+            image_series = self.get_image_series()
+            if len(image_series) != 1:
+                raise Exception(
+                    f"Expected a single image series but found {len(image_series)}, "
+                    "please specify the SeriesInstanceUID"
+                )
+            entry = image_series[0]
+        else:
+            entry = self.get_series(series_instance_uid)
+
+        if not entry.is_image_series:
+            raise Exception(
+                f"Series with SeriesInstanceUID '{entry.series_instance_uid}' does not contain DICOM images"
+            )
+
+        series_data = list(entry.datasets)
+        series_data.sort(key=image_helper.get_slice_position, reverse=False)
+        return series_data
+
+    def get_referenced_series_uid(self, rtstruct_ds: Dataset) -> str:
+        """
+        Returns the UID of the image series within the index that the RTStruct references.
+        Falls back to the frame of reference if the RTStruct does not reference a series directly
+        """
+        image_series_uids = {
+            entry.series_instance_uid for entry in self.get_image_series()
+        }
+
+        frame_of_reference_uids = set()
+        for refd_frame_of_ref in getattr(
+            rtstruct_ds, "ReferencedFrameOfReferenceSequence", []
+        ):
+            frame_of_reference_uids.add(
+                getattr(refd_frame_of_ref, "FrameOfReferenceUID", None)
+            )
+            for rt_refd_study in getattr(
+                refd_frame_of_ref, "RTReferencedStudySequence", []
+            ):
+                for rt_refd_series in getattr(
+                    rt_refd_study, "RTReferencedSeriesSequence", []
+                ):
+                    series_instance_uid = str(rt_refd_series.SeriesInstanceUID)
+                    if series_instance_uid in image_series_uids:
+                        return series_instance_uid
+
+        matching_series_uids = [
+            entry.series_instance_uid
+            for entry in self.get_image_series()
+            if entry.frame_of_reference_uid is not None
+            and entry.frame_of_reference_uid in frame_of_reference_uids
+        ]
+        if len(matching_series_uids) == 1:
+            return matching_series_uids[0]
+
+        raise Exception(
+            "Unable to find a single image series referenced by the RTStruct, "
+            f"found {len(matching_series_uids)} candidates"
+        )
+
+
+def read_dcm_header(file_path: str) -> Optional[Dataset]:
+    """
+    Returns the dataset of the DICOM file at the given path with large values deferred, or None if it is not DICOM
+    """
+    try:
+        return dcmread(file_path, defer_size=image_helper.DEFERRED_VALUE_SIZE)
+    except Exception:
+        return None
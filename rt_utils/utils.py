@@ -1,5 +1,6 @@
-from typing import List, Union
+from typing import List, Optional, Tuple, Union
 from random import randrange
+import numpy as np
 from pydicom.uid import PYDICOM_IMPLEMENTATION_UID
 from dataclasses import dataclass
 
@@ -53,12 +54,14 @@ class ROIData:
     approximate_contours: bool = True
     roi_generation_algorithm: Union[str, int] = 0
     contour_mode: str = "voxel_center"
+    simplify_tolerance: Optional[float] = None
 
     def __post_init__(self):
         self.validate_color()
         self.add_default_values()
         self.validate_roi_generation_algoirthm()
         self.validate_contour_mode()
+        self.validate_simplify_tolerance()
 
     def validate_contour_mode(self):
         if self.contour_mode not in CONTOUR_MODES:
@@ -67,6 +70,13 @@ class ROIData:
                 f"Expected one of {CONTOUR_MODES}."
             )
 
+    def validate_simplify_tolerance(self):
+        if self.simplify_tolerance is not None and not self.simplify_tolerance > 0:
+            raise ValueError(
+                f"Invalid simplify tolerance '{self.simplify_tolerance}'. "
+                "Expected a positive distance in mm or None."
+            )
+
     def add_default_values(self):
         if self.color is None:
             self.color = COLOR_PALETTE[(self.number - 1) % len(COLOR_PALETTE)]
@@ -135,3 +145,14 @@ class ROIData:
                     type(self.roi_generation_algorithm)
                 )
             )
+
+
+@dataclass
+class CroppedMask:
+    """Data class holding an ROI mask cropped to the bounding box of its contours."""
+
+    mask: np.ndarray
+    # Index of the first voxel of the cropped mask within the full series mask, in mask axis order
+    offset: Tuple[int, int, int]
+    # Pixel to patient transformation matrix of the cropped mask, see image_helper.get_pixel_to_patient_transformation_matrix
+    affine: np.ndarray
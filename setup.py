@@ -43,4 +43,6 @@ setuptools.setup(
     ],
     python_requires=">=3.8",
     install_requires=required,
+    extras_require={"nifti": ["nibabel"]},
+    entry_points={"console_scripts": ["rt-utils=rt_utils.cli:main"]},
 )
@@ -0,0 +1,121 @@
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pytest
+
+from rt_utils import RTStructBuilder, cli, image_helper
+
+
+def run_test_job(kind: str):
+    if kind == "failed":
+        raise ValueError("Invalid job")
+    if kind == "timeout":
+        time.sleep(30)
+    if kind == "crashed":
+        os._exit(3)
+    if kind == "large":
+        # Larger than the pipe buffer, so the result must be read before the process can exit
+        return [f"/masks/patient/roi_{i}.nii.gz" for i in range(5000)]
+    return [kind]
+
+
+def test_run_jobs_reports_every_outcome():
+    kinds = ["ok", "failed", "timeout", "crashed", "ok"]
+    reported = []
+
+    start = time.monotonic()
+    results = cli.run_jobs(
+        [(kind, (kind,)) for kind in kinds],
+        run_test_job,
+        max_jobs=2,
+        timeout=1,
+        on_result=reported.append,
+    )
+
+    assert time.monotonic() - start < 10
+    assert [result.status for result in results] == kinds
+    assert sorted(result.job for result in reported) == sorted(kinds)
+    assert results[0].outputs == ["ok"]
+    assert results[1].error_type == "ValueError"
+    assert "Invalid job" in results[1].traceback
+    assert "code 3" in results[3].error
+
+
+def test_run_jobs_receives_large_results():
+    results = cli.run_jobs([("large", ("large",))], run_test_job, timeout=10)
+
+    assert results[0].status == "ok"
+    assert len(results[0].outputs) == 5000
+
+
+def test_nifti_arrays_round_trip(new_rtstruct):
+    mask = np.zeros((512, 512, len(new_rtstruct.series_data)), dtype=bool)
+    mask[50:100, 60:80, 0] = True
+
+    nifti_array = cli.mask_to_nifti_array(mask)
+    affine = cli.get_nifti_affine(new_rtstruct.series_data)
+
+    assert np.array_equal(cli.nifti_array_to_mask(nifti_array), mask)
+    # Voxel (x, y) of the NIfTI image is column x and row y of the mask
+    assert nifti_array[70, 50, 0] == 1
+    pixel_to_patient = image_helper.get_pixel_to_patient_transformation_matrix(
+        new_rtstruct.series_data
+    )
+    assert np.allclose(
+        affine @ [70, 50, 0, 1], cli.LPS_TO_RAS @ pixel_to_patient @ [70, 50, 0, 1]
+    )
+
+
+def test_cohort_round_trip(series_path, tmp_path):
+    pytest.importorskip("nibabel")
+    cohort_path = tmp_path / "cohort"
+    for patient in ["first", "second"]:
+        os.makedirs(cohort_path / patient)
+        for file in ["ct_1.dcm", "ct_2.dcm", "rt.dcm"]:
+            shutil.copy(os.path.join(series_path, file), cohort_path / patient / file)
+    os.makedirs(cohort_path / "empty")
+
+    report_path = tmp_path / "report.json"
+    exit_code = cli.main(
+        [
+            "rtstruct-to-nifti",
+            str(cohort_path),
+            str(tmp_path / "masks"),
+            "--jobs",
+            "2",
+            "--report",
+            str(report_path),
+        ]
+    )
+
+    report = json.loads(report_path.read_text())
+    assert exit_code == 1
+    assert report["counts"] == {"failed": 1, "ok": 2}
+    assert [job["job"] for job in report["jobs"]] == ["empty", "first", "second"]
+
+    shutil.rmtree(cohort_path / "empty")
+    exit_code = cli.main(
+        [
+            "nifti-to-rtstruct",
+            str(cohort_path),
+            str(tmp_path / "masks"),
+            str(tmp_path / "rtstructs"),
+        ]
+    )
+
+    assert exit_code == 0
+    rtstruct = RTStructBuilder.create_from(
+        series_path, os.path.join(series_path, "rt.dcm")
+    )
+    converted_rtstruct = RTStructBuilder.create_from(
+        str(cohort_path / "first"),
+        str(tmp_path / "rtstructs" / "first" / "rtstruct.dcm"),
+    )
+    name = rtstruct.get_roi_names()[0]
+    assert np.array_equal(
+        converted_rtstruct.get_roi_mask_by_name(cli.get_safe_file_name(name)),
+        rtstruct.get_roi_mask_by_name(name),
+    )
@@ -1,4 +1,7 @@
+import numpy as np
 import pytest
+from pydicom import dcmread
+
 from rt_utils import ds_helper, image_helper
 
 
@@ -26,3 +29,42 @@ def test_ds_creation_without_patient_age(series_path):
 
     assert ds.PatientAge != original_age
     assert ds.PatientAge == ""
+
+
+def test_encode_ds_values():
+    assert (
+        ds_helper.encode_ds_values(np.array([1.5, -0.0, 100.0, 2.25]))
+        == b"1.5\\0\\100\\2.25"
+    )
+    assert ds_helper.encode_ds_values(np.array([1.0, 2.0])) == b"1\\2 "
+    assert ds_helper.encode_ds_values(np.array([1 / 3])) == b"0.3333333333"
+
+
+def test_encoded_ds_values_fit_value_length():
+    values = np.random.default_rng(0).normal(0, 1e4, 3000)
+    values[0] = -99999.99999999999
+
+    encoded_values = ds_helper.encode_ds_values(values)
+
+    assert len(encoded_values) % 2 == 0
+    decoded_values = encoded_values.decode().strip().split("\\")
+    assert max(len(value) for value in decoded_values) <= ds_helper.DS_MAX_LENGTH
+    assert np.allclose(
+        [float(value) for value in decoded_values], values, atol=1e-7, rtol=0
+    )
+
+
+def test_contour_data_written_as_encoded(new_rtstruct, tmp_path):
+    mask = np.zeros((512, 512, 2), dtype=bool)
+    mask[100:200, 150:300, 0] = True
+    new_rtstruct.add_roi(mask)
+    contour = new_rtstruct.ds.ROIContourSequence[0].ContourSequence[0]
+    encoded_contour_data = contour.get_item("ContourData").value
+
+    file_path = str(tmp_path / "rt.dcm")
+    new_rtstruct.save(file_path)
+
+    with open(file_path, "rb") as file:
+        assert encoded_contour_data in file.read()
+    saved_contour = dcmread(file_path).ROIContourSequence[0].ContourSequence[0]
+    assert saved_contour.ContourData == contour.ContourData
@@ -0,0 +1,155 @@
+import os
+
+import numpy as np
+import pytest
+
+from rt_utils import RTStructBuilder, image_helper
+from tests.test_rtstruct_builder import get_empty_mask
+
+
+def test_contour_data_grouped_by_sop_instance_uid(new_rtstruct):
+    mask = get_empty_mask(new_rtstruct)
+    mask[50:100, 50:100, 0] = True
+    mask[150:200, 150:200, 0] = True
+    mask[60:90, 60:90, 1] = True
+    new_rtstruct.add_roi(mask)
+
+    contour_sequence = new_rtstruct.ds.ROIContourSequence[0].ContourSequence
+    contour_data_by_sop_instance_uid = (
+        image_helper.get_contour_data_by_sop_instance_uid(contour_sequence)
+    )
+
+    for series_slice in new_rtstruct.series_data:
+        assert contour_data_by_sop_instance_uid[series_slice.SOPInstanceUID] == (
+            image_helper.get_slice_contour_data(series_slice, contour_sequence)
+        )
+    assert (
+        len(
+            contour_data_by_sop_instance_uid[new_rtstruct.series_data[0].SOPInstanceUID]
+        )
+        == 2
+    )
+
+
+def test_series_mask_from_existing_rtstruct(series_path):
+    rtstruct = RTStructBuilder.create_from(
+        series_path, os.path.join(series_path, "rt.dcm")
+    )
+    contour_sequence = rtstruct.ds.ROIContourSequence[0].ContourSequence
+
+    mask = image_helper.create_series_mask_from_contour_sequence(
+        rtstruct.series_data, contour_sequence
+    )
+
+    transformation_matrix = image_helper.get_patient_to_pixel_transformation_matrix(
+        rtstruct.series_data
+    )
+    for i, series_slice in enumerate(rtstruct.series_data):
+        slice_contour_data = image_helper.get_slice_contour_data(
+            series_slice, contour_sequence
+        )
+        expected_slice_mask = np.zeros_like(mask[:, :, i])
+        if len(slice_contour_data):
+            expected_slice_mask = image_helper.get_slice_mask_from_slice_contour_data(
+                series_slice, slice_contour_data, transformation_matrix
+            )
+        assert np.array_equal(mask[:, :, i], expected_slice_mask)
+    assert mask.any()
+
+
+def reference_mask_to_edge_polygons(mask: np.ndarray):
+    # Previous point by point tracer, which defines the expected voxel_edge output
+    padded = np.pad(mask.astype(bool), 1)
+    cells = padded[1:-1, 1:-1]
+    neighbours = (
+        padded[:-2, 1:-1],
+        padded[1:-1, 2:],
+        padded[2:, 1:-1],
+        padded[1:-1, :-2],
+    )
+    offsets = (
+        (-0.5, -0.5, 0.5, -0.5),
+        (0.5, -0.5, 0.5, 0.5),
+        (0.5, 0.5, -0.5, 0.5),
+        (-0.5, 0.5, -0.5, -0.5),
+    )
+
+    edges = {}
+    for neighbour, (start_x, start_y, end_x, end_y) in zip(neighbours, offsets):
+        for row, column in zip(*np.nonzero(cells & ~neighbour)):
+            edges.setdefault((column + start_x, row + start_y), []).append(
+                (column + end_x, row + end_y)
+            )
+
+    polygons = []
+    while edges:
+        start = next(iter(edges))
+        current = start
+        points = [start]
+        while True:
+            ends = edges[current]
+            ends.sort(
+                key=lambda end: np.arctan2(end[1] - current[1], end[0] - current[0])
+            )
+            current = ends.pop(0)
+            if not ends:
+                del edges[points[-1]]
+            if current == start:
+                break
+            points.append(current)
+        polygons.append(
+            image_helper.remove_collinear_points(np.asarray(points, dtype=float))
+        )
+    return polygons
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_edge_polygons_match_reference_tracer(seed):
+    rng = np.random.default_rng(seed)
+    masks = [
+        np.eye(3, dtype=bool),
+        np.kron(np.eye(3), np.ones((2, 2))),
+        np.zeros((4, 4)),
+    ]
+    for _ in range(200):
+        shape = rng.integers(1, 16, size=2)
+        masks.append(rng.random(shape) < rng.random())
+
+    for mask in masks:
+        polygons = image_helper.mask_to_edge_polygons(mask)
+        expected_polygons = reference_mask_to_edge_polygons(mask)
+        assert len(polygons) == len(expected_polygons)
+        for polygon, expected_polygon in zip(polygons, expected_polygons):
+            assert np.array_equal(polygon, expected_polygon)
+
+
+def test_pin_hole_mask_removes_holes():
+    mask = np.zeros((120, 100), dtype=bool)
+    mask[10:110, 10:90] = True
+    holes = np.zeros_like(mask)
+    holes[20:100:8, 20:80:8] = True
+    holes[20:100:8, 21:80:8] = True
+    mask &= ~holes
+
+    pin_hole_mask = image_helper.create_pin_hole_mask(mask, approximate_contours=True)
+
+    contours, hierarchy = image_helper.find_mask_contours(pin_hole_mask, True)
+    assert len(contours) == 1
+    assert np.all(hierarchy[:, 3] == -1)
+    # Cuts only remove foreground and keep the holes open
+    assert not np.any(pin_hole_mask & ~mask)
+    assert not np.any(pin_hole_mask & holes)
+    assert np.count_nonzero(mask & ~pin_hole_mask) < 0.3 * np.count_nonzero(mask)
+
+
+def test_pin_hole_cut_matches_line_footprint():
+    mask = np.zeros((12, 12), dtype=bool)
+    mask[2:10, 2:10] = True
+    mask[5:7, 4:7] = False
+
+    pin_hole_mask = image_helper.create_pin_hole_mask(mask, approximate_contours=True)
+
+    expected_mask = mask.copy()
+    expected_mask[2:6, 2:5] = False
+    expected_mask[6, 3] = False
+    assert np.array_equal(pin_hole_mask, expected_mask)
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from rt_utils import RTStructBuilder, instrumentation
+from rt_utils.instrumentation import DISABLED_STAGE, StageReporter
+from tests.test_rtstruct_builder import get_empty_mask
+
+
+def test_stages_are_disabled_without_listeners():
+    assert instrumentation.stage("stage") is DISABLED_STAGE
+
+
+def test_pipeline_stages_are_reported(series_path, tmp_path):
+    reporter = StageReporter()
+    with instrumentation.listening(reporter):
+        rtstruct = RTStructBuilder.create_new(series_path)
+        mask = get_empty_mask(rtstruct)
+        mask[50:100, 50:100, 0] = True
+        mask[60:90, 60:90, 1] = True
+        rtstruct.add_roi(mask, name="test")
+        rtstruct.get_roi_mask_by_name("test")
+        rtstruct.save(str(tmp_path / "rt.dcm"))
+        RTStructBuilder.create_from(series_path, str(tmp_path / "rt.dcm"))
+
+    summary = reporter.summary()
+    assert summary["read_files"]["counts"]["images"] == 2 * len(rtstruct.series_data)
+    assert summary["find_contours"]["calls"] == 2
+    assert summary["get_contours_coords"]["counts"]["contours"] == 2
+    assert summary["create_contour_datasets"]["counts"]["contours"] == 2
+    assert (
+        summary["transform_contours"]["counts"]["points"]
+        == summary["get_contours_coords"]["counts"]["points"]
+    )
+    assert summary["create_mask"]["counts"]["bytes"] == mask.nbytes
+    assert summary["save"]["counts"]["bytes"] == os.path.getsize(tmp_path / "rt.dcm")
+    assert summary["read_rtstruct"]["counts"]["bytes"] == os.path.getsize(
+        tmp_path / "rt.dcm"
+    )
+    assert {
+        "create_new",
+        "create_from",
+        "add_roi",
+        "get_roi_masks",
+        "sort_slices",
+    } <= set(summary)
+    assert "add_roi" in reporter.format()
+
+    # Listeners are removed when leaving the with block
+    assert instrumentation.stage("stage") is DISABLED_STAGE
+
+
+def test_rtstruct_file_objects_are_reported(series_path):
+    reporter = StageReporter()
+    with instrumentation.listening(reporter):
+        with open(os.path.join(series_path, "rt.dcm"), "rb") as file:
+            rtstruct = RTStructBuilder.create_from(series_path, file)
+
+    assert len(rtstruct.get_roi_names()) > 0
+    assert reporter.summary()["read_rtstruct"]["calls"] == 1
+
+
+def test_failed_stages_are_reported():
+    reporter = StageReporter()
+    with instrumentation.listening(reporter):
+        with pytest.raises(ValueError):
+            with instrumentation.stage("failing") as failing_stage:
+                failing_stage.add(items=3)
+                raise ValueError()
+
+    assert reporter.summary()["failing"]["failures"] == 1
+    assert reporter.summary()["failing"]["counts"] == {"items": 3}
@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+import pytest
+from pydicom import dcmread
+from pydicom.uid import ExplicitVRLittleEndian, ImplicitVRLittleEndian
+
+from rt_utils import RTStructBuilder
+from rt_utils.lazy_rtstruct import LazyROIContour, read_lazy_rtstruct
+
+
+def save_as_little_endian(ds, file_path: str, implicit_vr: bool):
+    ds.file_meta.TransferSyntaxUID = (
+        ImplicitVRLittleEndian if implicit_vr else ExplicitVRLittleEndian
+    )
+    try:
+        ds.save_as(file_path, implicit_vr=implicit_vr, little_endian=True)
+    except TypeError:
+        # pydicom 2 takes the encoding from the dataset
+        ds.is_implicit_VR = implicit_vr
+        ds.is_little_endian = True
+        ds.save_as(file_path)
+
+
+def set_undefined_lengths(ds):
+    for elem in ds:
+        if elem.VR == "SQ":
+            elem.is_undefined_length = True
+            for item in elem.value:
+                item.is_undefined_length_sequence_item = True
+                set_undefined_lengths(item)
+
+
+@pytest.fixture(
+    params=["implicit", "explicit", "implicit_undefined", "explicit_undefined"]
+)
+def rt_struct_path(request, series_path, tmp_path) -> str:
+    ds = dcmread(os.path.join(series_path, "rt.dcm"))
+    if request.param.endswith("undefined"):
+        set_undefined_lengths(ds)
+
+    file_path = str(tmp_path / "rt.dcm")
+    save_as_little_endian(
+        ds, file_path, implicit_vr=request.param.startswith("implicit")
+    )
+    return file_path
+
+
+def test_lazy_rtstruct_matches_eager(series_path, rt_struct_path):
+    rtstruct = RTStructBuilder.create_from(series_path, rt_struct_path)
+    lazy_rtstruct = RTStructBuilder.create_from(series_path, rt_struct_path, lazy=True)
+
+    names = lazy_rtstruct.get_roi_names()
+    assert names == rtstruct.get_roi_names()
+    roi_contours = lazy_rtstruct.ds.ROIContourSequence
+    assert all(isinstance(roi_contour, LazyROIContour) for roi_contour in roi_contours)
+    assert not any(roi_contour.contour_sequence_loaded for roi_contour in roi_contours)
+
+    # Only the contours of the requested ROI are parsed
+    assert np.array_equal(
+        lazy_rtstruct.get_roi_mask_by_name(names[0]),
+        rtstruct.get_roi_mask_by_name(names[0]),
+    )
+    assert [roi_contour.contour_sequence_loaded for roi_contour in roi_contours].count(
+        True
+    ) == 1
+
+    for name in names:
+        assert np.array_equal(
+            lazy_rtstruct.get_roi_mask_by_name(name),
+            rtstruct.get_roi_mask_by_name(name),
+        )
+    assert lazy_rtstruct.ds == rtstruct.ds
+
+
+def test_lazy_rtstruct_file_round_trip(series_path, rt_struct_path, tmp_path):
+    expected_ds = dcmread(rt_struct_path)
+    lazy_rtstruct = RTStructBuilder.create_from(series_path, rt_struct_path, lazy=True)
+
+    # Contours are read before the file is overwritten
+    lazy_rtstruct.save(rt_struct_path)
+
+    saved_ds = dcmread(rt_struct_path)
+    assert saved_ds.ROIContourSequence == expected_ds.ROIContourSequence
+    assert saved_ds.RTROIObservationsSequence == expected_ds.RTROIObservationsSequence
+
+
+def test_lazy_rtstruct_from_writer(series_path, tmp_path):
+    mask = np.zeros((512, 512, 2), dtype=bool)
+    mask[100:200, 100:200, 1] = True
+    file_path = str(tmp_path / "streamed.dcm")
+    with RTStructBuilder.create_writer(series_path, file_path) as writer:
+        writer.add_roi(mask, name="first")
+        writer.add_roi(mask, name="second")
+
+    ds = read_lazy_rtstruct(file_path)
+
+    assert len(ds.ROIContourSequence) == 2
+    assert ds == dcmread(file_path)
+
+
+def test_lazy_rtstruct_requires_path(series_path):
+    with open(os.path.join(series_path, "rt.dcm"), "rb") as file:
+        with pytest.raises(ValueError):
+            RTStructBuilder.create_from(series_path, file, lazy=True)
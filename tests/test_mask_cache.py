@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from rt_utils import image_helper
+from rt_utils.mask_cache import MaskCache
+from rt_utils.rtstruct import RTStruct
+from tests.test_rtstruct_builder import get_empty_mask
+
+
+def test_least_recently_used_masks_are_evicted():
+    mask_cache = MaskCache(max_bytes=250)
+    for key in ["first", "second"]:
+        mask_cache.put(key, np.zeros(100, dtype=bool))
+
+    # Using the first mask makes the second one the least recently used
+    assert mask_cache.get("first") is not None
+    mask_cache.put("third", np.zeros(100, dtype=bool))
+
+    assert mask_cache.get("second") is None
+    assert mask_cache.get("first") is not None
+    assert mask_cache.get("third") is not None
+    assert mask_cache.size_bytes == 200
+
+
+def test_masks_larger_than_budget_are_not_cached():
+    mask_cache = MaskCache(max_bytes=50)
+    mask_cache.put("mask", np.zeros(100, dtype=bool))
+
+    assert len(mask_cache) == 0
+    assert mask_cache.size_bytes == 0
+
+
+@pytest.fixture()
+def count_rasterizations(monkeypatch):
+    calls = []
+    create_mask = image_helper.create_series_mask_from_contour_sequence
+
+    def counting_create_mask(*args, **kwargs):
+        calls.append(args)
+        return create_mask(*args, **kwargs)
+
+    monkeypatch.setattr(
+        image_helper, "create_series_mask_from_contour_sequence", counting_create_mask
+    )
+    return calls
+
+
+def test_cached_mask_is_not_rasterized_again(
+    new_rtstruct: RTStruct, count_rasterizations
+):
+    mask = get_empty_mask(new_rtstruct)
+    mask[50:100, 50:100, 0] = True
+    new_rtstruct.add_roi(mask, name="test")
+    new_rtstruct.enable_mask_cache(max_bytes=10 * mask.nbytes)
+
+    first_mask = new_rtstruct.get_roi_mask_by_name("test")
+    first_mask[:] = False  # Callers own the returned mask
+    second_mask = new_rtstruct.get_roi_mask_by_name("test")
+
+    assert len(count_rasterizations) == 1
+    assert np.array_equal(second_mask, mask)
+
+
+def test_mask_cache_invalidated_by_add_roi(
+    new_rtstruct: RTStruct, count_rasterizations
+):
+    mask = get_empty_mask(new_rtstruct)
+    mask[50:100, 50:100, 0] = True
+    new_rtstruct.add_roi(mask, name="test")
+    new_rtstruct.enable_mask_cache(max_bytes=10 * mask.nbytes)
+
+    new_rtstruct.get_roi_mask_by_name("test")
+    new_rtstruct.add_roi(mask, name="other")
+    assert len(new_rtstruct.mask_cache) == 0
+
+    new_rtstruct.get_roi_mask_by_name("test")
+    assert len(count_rasterizations) == 2
+
+
+def test_mask_cache_invalidated_after_direct_edits(new_rtstruct: RTStruct):
+    mask = get_empty_mask(new_rtstruct)
+    mask[50:100, 50:100, 0] = True
+    mask[50:100, 50:100, 1] = True
+    new_rtstruct.add_roi(mask, name="test")
+    new_rtstruct.enable_mask_cache(max_bytes=10 * mask.nbytes)
+    new_rtstruct.get_roi_mask_by_name("test")
+
+    # Shift the x coordinates of a contour in place, which keeps the length of every sequence
+    contour = new_rtstruct.ds.ROIContourSequence[0].ContourSequence[0]
+    contour_data = np.array(contour.ContourData, dtype=float)
+    contour_data[0::3] += 20 * float(new_rtstruct.series_data[0].PixelSpacing[1])
+    contour.ContourData = contour_data.tolist()
+    new_rtstruct.invalidate_mask_cache()
+
+    fresh_mask = image_helper.create_series_mask_from_contour_sequence(
+        new_rtstruct.series_data, new_rtstruct.ds.ROIContourSequence[0].ContourSequence
+    )
+    assert not np.array_equal(fresh_mask, mask)
+    assert np.array_equal(new_rtstruct.get_roi_mask_by_name("test"), fresh_mask)
+
+
+def test_masks_written_into_out_are_not_cached(new_rtstruct: RTStruct, tmp_path):
+    mask = get_empty_mask(new_rtstruct)
+    mask[50:100, 50:100, 0] = True
+    new_rtstruct.add_roi(mask, name="test")
+    new_rtstruct.enable_mask_cache(max_bytes=10 * mask.nbytes)
+    out = image_helper.create_series_mask_memmap(
+        new_rtstruct.series_data, str(tmp_path / "test.mask")
+    )
+
+    assert new_rtstruct.get_roi_mask_by_name("test", out=out) is out
+    assert np.array_equal(out, mask)
+    assert len(new_rtstruct.mask_cache) == 0
+    assert new_rtstruct.mask_cache.size_bytes == 0
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from rt_utils import PackedMask
+from rt_utils.rtstruct import RTStruct
+from tests.test_rtstruct_builder import get_empty_mask
+
+
+def get_random_mask(seed: int, shape=(13, 21, 4)) -> np.ndarray:
+    return np.random.default_rng(seed).random(shape) < 0.4
+
+
+def test_pack_round_trip():
+    mask = get_random_mask(0)
+
+    packed_mask = PackedMask.from_mask(mask)
+
+    assert packed_mask.data.shape == (4, 13, 3)
+    assert np.array_equal(packed_mask.to_mask(), mask)
+    for i in range(mask.shape[2]):
+        assert np.array_equal(packed_mask.get_slice(i), mask[:, :, i])
+
+
+def test_packed_set_operations_and_counts():
+    first_mask, second_mask = get_random_mask(1), get_random_mask(2)
+    first_packed, second_packed = PackedMask.from_mask(
+        first_mask
+    ), PackedMask.from_mask(second_mask)
+
+    assert np.array_equal(
+        (first_packed | second_packed).to_mask(), first_mask | second_mask
+    )
+    assert np.array_equal(
+        (first_packed & second_packed).to_mask(), first_mask & second_mask
+    )
+    assert first_packed.count() == np.count_nonzero(first_mask)
+    assert (
+        first_packed.count_slices().tolist()
+        == np.count_nonzero(first_mask, axis=(0, 1)).tolist()
+    )
+
+    with pytest.raises(ValueError):
+        first_packed | PackedMask.empty((13, 20, 4))
+
+
+def test_packed_roi_mask(new_rtstruct: RTStruct):
+    mask = get_empty_mask(new_rtstruct)
+    mask[50:100, 50:100, 0] = True
+    mask[60:150, 40:120, 1] = True
+    new_rtstruct.add_roi(mask, name="unpacked")
+
+    packed_mask = new_rtstruct.get_roi_mask_by_name("unpacked", packed=True)
+
+    assert packed_mask == PackedMask.from_mask(
+        new_rtstruct.get_roi_mask_by_name("unpacked")
+    )
+    assert packed_mask.nbytes * 8 == mask.nbytes
+
+    with pytest.raises(ValueError):
+        new_rtstruct.get_roi_mask_by_name(
+            "unpacked", out=np.zeros_like(mask), packed=True
+        )
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_packed_roi_masks(new_rtstruct: RTStruct, workers):
+    mask = get_empty_mask(new_rtstruct)
+    mask[50:100, 50:100, 0] = True
+    new_rtstruct.add_roi(mask, name="first")
+    mask[60:150, 40:120, 1] = True
+    new_rtstruct.add_roi(mask, name="second")
+    new_rtstruct.enable_mask_cache(max_bytes=10 * mask.nbytes)
+
+    packed_masks = new_rtstruct.get_all_roi_masks(workers=workers, packed=True)
+    masks = new_rtstruct.get_all_roi_masks()
+
+    assert list(packed_masks) == ["first", "second"]
+    for name, packed_mask in packed_masks.items():
+        assert packed_mask == PackedMask.from_mask(masks[name])
+
+    # Cached packed masks are copied, so callers cannot modify the cache
+    packed_masks["first"].data[:] = 0
+    assert new_rtstruct.get_roi_mask_by_name(
+        "first", packed=True
+    ) == PackedMask.from_mask(masks["first"])
+
+    with pytest.raises(ValueError):
+        new_rtstruct.get_all_roi_masks(stack=True, packed=True)
+
+
+def test_add_packed_roi(new_rtstruct: RTStruct):
+    mask = get_empty_mask(new_rtstruct)
+    mask[50:100, 50:100, 0] = True
+    mask[60:150, 40:120, 1] = True
+
+    new_rtstruct.add_roi(mask, name="unpacked")
+    new_rtstruct.add_roi(PackedMask.from_mask(mask), name="packed", color=[255, 0, 0])
+
+    unpacked_roi, packed_roi = new_rtstruct.ds.ROIContourSequence
+    assert [contour.ContourData for contour in packed_roi.ContourSequence] == [
+        contour.ContourData for contour in unpacked_roi.ContourSequence
+    ]
+
+    with pytest.raises(RTStruct.ROIException):
+        new_rtstruct.add_roi(PackedMask.from_mask(mask[:, :, 1:]))
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from rt_utils import CancellationToken, OperationCancelled
+from rt_utils.rtstruct import RTStruct
+from tests.test_rtstruct_builder import get_empty_mask
+
+
+def get_test_mask(rtstruct: RTStruct) -> np.ndarray:
+    mask = get_empty_mask(rtstruct)
+    mask[50:100, 50:100, 0] = True
+    mask[60:150, 40:120, 1] = True
+    return mask
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_add_roi_progress(new_rtstruct: RTStruct, workers):
+    calls = []
+
+    new_rtstruct.add_roi(
+        get_test_mask(new_rtstruct),
+        workers=workers,
+        progress=lambda *args: calls.append(args),
+    )
+
+    slice_count = len(new_rtstruct.series_data)
+    assert calls == [("slices", i + 1, slice_count) for i in range(slice_count)] + [
+        ("rois", 1, 1)
+    ]
+
+
+def test_cancelled_add_roi_leaves_rtstruct_unchanged(new_rtstruct: RTStruct):
+    cancellation = CancellationToken()
+
+    def cancel_after_first_slice(unit, completed, total):
+        cancellation.cancel()
+
+    with pytest.raises(OperationCancelled):
+        new_rtstruct.add_roi(
+            get_test_mask(new_rtstruct),
+            progress=cancel_after_first_slice,
+            cancellation=cancellation,
+        )
+
+    assert len(new_rtstruct.ds.ROIContourSequence) == 0
+    assert len(new_rtstruct.ds.StructureSetROISequence) == 0
+    assert len(new_rtstruct.ds.RTROIObservationsSequence) == 0
+    assert new_rtstruct.get_roi_names() == []
+
+
+def test_cancelled_labelmap_adds_no_rois(new_rtstruct: RTStruct):
+    labelmap = get_test_mask(new_rtstruct).astype(np.uint8)
+    labelmap[60:80, 60:80, 1] = 2
+    cancellation = CancellationToken()
+    cancellation.cancel()
+
+    with pytest.raises(OperationCancelled):
+        new_rtstruct.add_rois_from_labelmap(labelmap, cancellation=cancellation)
+
+    assert new_rtstruct.get_roi_names() == []
+
+
+def test_get_roi_masks_progress_and_cancellation(new_rtstruct: RTStruct):
+    mask = get_test_mask(new_rtstruct)
+    new_rtstruct.add_roi(mask, name="first")
+    new_rtstruct.add_roi(mask, name="second")
+    calls = []
+
+    new_rtstruct.get_all_roi_masks(progress=lambda *args: calls.append(args))
+
+    slice_count = len(new_rtstruct.series_data)
+    slice_calls = [call for call in calls if call[0] == "slices"]
+    assert slice_calls[-1] == ("slices", 2 * slice_count, 2 * slice_count)
+    assert [call for call in calls if call[0] == "rois"] == [
+        ("rois", 1, 2),
+        ("rois", 2, 2),
+    ]
+
+    cancellation = CancellationToken()
+    cancellation.cancel()
+    with pytest.raises(OperationCancelled):
+        new_rtstruct.get_roi_mask_by_name("first", cancellation=cancellation)
+    with pytest.raises(OperationCancelled):
+        new_rtstruct.get_roi_mask_by_name(
+            "first", packed=True, cancellation=cancellation
+        )
@@ -1,13 +1,23 @@
+from concurrent.futures import ThreadPoolExecutor
 from rt_utils.rtstruct import RTStruct
 import pytest
 import os
-from rt_utils import RTStructBuilder
+from rt_utils import RTStructBuilder, RTStructMerger
 from rt_utils.utils import SOPClassUID
-from rt_utils import image_helper
-from pydicom.dataset import validate_file_meta
+from rt_utils import ds_helper, image_helper
+from pydicom.dataelem import RawDataElement
+from pydicom.dataset import Dataset, validate_file_meta
+from pydicom.sequence import Sequence
+from pydicom.tag import Tag
 import numpy as np
 
 
+def is_deferred(ds: Dataset, keyword: str) -> bool:
+    # get_item reads deferred values on pydicom 2, so look at the raw element instead
+    elem = ds._dict.get(Tag(keyword))
+    return isinstance(elem, RawDataElement) and elem.value is None
+
+
 def test_create_from_empty_series_dir():
     empty_dir_path = os.path.join(os.path.dirname(__file__), "empty")
     assert os.path.exists(empty_dir_path)
@@ -21,6 +31,54 @@ def test_only_images_loaded_into_series_data(new_rtstruct: RTStruct):
         assert hasattr(ds, "pixel_array")
 
 
+def test_deferred_pixel_data_loading(series_path):
+    series_data = image_helper.load_sorted_image_series(series_path)
+    deferred_series_data = image_helper.load_sorted_image_series(
+        series_path, defer_pixel_data=True
+    )
+
+    assert [ds.SOPInstanceUID for ds in deferred_series_data] == [
+        ds.SOPInstanceUID for ds in series_data
+    ]
+    for ds, deferred_ds in zip(series_data, deferred_series_data):
+        # Pixel data is only read once it is accessed
+        assert is_deferred(deferred_ds, "PixelData")
+        assert np.array_equal(deferred_ds.pixel_array, ds.pixel_array)
+
+
+def test_create_from_with_deferred_pixel_data(series_path):
+    rtstruct = RTStructBuilder.create_from(
+        series_path, os.path.join(series_path, "rt.dcm"), defer_pixel_data=True
+    )
+
+    mask = get_empty_mask(rtstruct)
+    mask[50:100, 50:100, 0] = 1
+    rtstruct.add_roi(mask, name="test")
+    assert np.array_equal(rtstruct.get_roi_mask_by_name("test"), mask)
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_parallel_series_loading(series_path, use_processes):
+    series_data = image_helper.load_sorted_image_series(series_path)
+    parallel_series_data = image_helper.load_sorted_image_series(
+        series_path, workers=2, use_processes=use_processes
+    )
+
+    assert [ds.SOPInstanceUID for ds in parallel_series_data] == [
+        ds.SOPInstanceUID for ds in series_data
+    ]
+
+
+def test_parallel_series_loading_with_executor(series_path):
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        rtstruct = RTStructBuilder.create_from(
+            series_path, os.path.join(series_path, "rt.dcm"), workers=executor
+        )
+    assert len(rtstruct.series_data) == len(
+        image_helper.load_sorted_image_series(series_path)
+    )
+
+
 def test_valid_filemeta(new_rtstruct: RTStruct):
     try:
         validate_file_meta(new_rtstruct.ds.file_meta)
@@ -39,7 +97,9 @@ def test_add_empty_roi(new_rtstruct: RTStruct):
     mask = get_empty_mask(new_rtstruct)
     new_rtstruct.add_roi(mask)
     assert len(new_rtstruct.ds.ROIContourSequence) == 1
-    assert len(new_rtstruct.ds.ROIContourSequence[0].ContourSequence) == 0  # No slices added
+    assert (
+        len(new_rtstruct.ds.ROIContourSequence[0].ContourSequence) == 0
+    )  # No slices added
     assert len(new_rtstruct.ds.StructureSetROISequence) == 1
     assert len(new_rtstruct.ds.RTROIObservationsSequence) == 1
 
@@ -80,6 +140,190 @@ def test_get_invalid_roi_mask_by_name(new_rtstruct: RTStruct):
         new_rtstruct.get_roi_mask_by_name("FAKE_NAME")
 
 
+@pytest.mark.parametrize("workers", [None, 2])
+def test_get_roi_masks(new_rtstruct: RTStruct, workers):
+    first_mask = get_empty_mask(new_rtstruct)
+    first_mask[50:100, 50:100, 0] = 1
+    second_mask = get_empty_mask(new_rtstruct)
+    second_mask[60:150, 40:120, 1] = 1
+    new_rtstruct.add_roi(first_mask, name="first")
+    new_rtstruct.add_roi(second_mask, name="second")
+
+    masks = new_rtstruct.get_all_roi_masks(workers=workers)
+    assert list(masks) == ["first", "second"]
+    for name, mask in masks.items():
+        assert np.array_equal(mask, new_rtstruct.get_roi_mask_by_name(name))
+
+    stacked_masks = new_rtstruct.get_roi_masks(["second", "first"], stack=True)
+    assert stacked_masks.shape == first_mask.shape + (2,)
+    assert np.array_equal(stacked_masks[..., 0], masks["second"])
+    assert np.array_equal(stacked_masks[..., 1], masks["first"])
+
+
+def test_get_invalid_roi_masks(new_rtstruct: RTStruct):
+    assert new_rtstruct.get_all_roi_masks() == {}
+    assert new_rtstruct.get_all_roi_masks(stack=True).shape[-1] == 0
+    with pytest.raises(RTStruct.ROIException):
+        new_rtstruct.get_roi_masks(["FAKE_NAME"])
+
+
+def test_get_roi_masks_into_memmap(new_rtstruct: RTStruct, tmp_path):
+    first_mask = get_empty_mask(new_rtstruct)
+    first_mask[50:100, 50:100, 0] = 1
+    second_mask = get_empty_mask(new_rtstruct)
+    second_mask[60:150, 40:120, 1] = 1
+    new_rtstruct.add_roi(first_mask, name="first")
+    new_rtstruct.add_roi(second_mask, name="second")
+    expected_masks = new_rtstruct.get_all_roi_masks()
+
+    mask_out = image_helper.create_series_mask_memmap(
+        new_rtstruct.series_data, str(tmp_path / "first.mask")
+    )
+    mask_out[:] = True
+    assert new_rtstruct.get_roi_mask_by_name("first", out=mask_out) is mask_out
+    assert np.array_equal(mask_out, expected_masks["first"])
+
+    stacked_out = image_helper.create_series_mask_memmap(
+        new_rtstruct.series_data, str(tmp_path / "stacked.mask"), roi_count=2
+    )
+    new_rtstruct.get_roi_masks(
+        ["second", "first"], stack=True, out=stacked_out, workers=2
+    )
+    stacked_out.flush()
+    stacked_masks = np.memmap(
+        str(tmp_path / "stacked.mask"), dtype=bool, mode="r", shape=stacked_out.shape
+    )
+    assert np.array_equal(stacked_masks[..., 0], expected_masks["second"])
+    assert np.array_equal(stacked_masks[..., 1], expected_masks["first"])
+
+    with pytest.raises(ValueError):
+        new_rtstruct.get_roi_mask_by_name(
+            "first", out=np.zeros(first_mask.shape, dtype=np.uint8)
+        )
+
+
+def test_roi_index_follows_edits(new_rtstruct: RTStruct):
+    mask = get_empty_mask(new_rtstruct)
+    mask[50:100, 50:100, 0] = 1
+    new_rtstruct.add_roi(mask, name="first")
+    roi_index = new_rtstruct.get_roi_index()
+
+    new_rtstruct.add_roi(mask, name="second")
+    assert new_rtstruct.get_roi_index() is roi_index
+    assert roi_index.get_roi_number("second") == "2"
+    assert new_rtstruct.get_roi_mask_by_name("second").any()
+
+    # Sequences edited directly are picked up by rebuilding the index
+    new_rtstruct.ds.StructureSetROISequence.pop()
+    new_rtstruct.ds.ROIContourSequence.pop()
+    new_rtstruct.ds.RTROIObservationsSequence.pop()
+    with pytest.raises(RTStruct.ROIException):
+        new_rtstruct.get_roi_mask_by_name("second")
+
+    # Renaming an ROI directly requires invalidating the index, which clears the masks cached so far
+    new_rtstruct.enable_mask_cache(max_bytes=10 * mask.nbytes)
+    new_rtstruct.get_roi_mask_by_name("first")
+    new_rtstruct.ds.StructureSetROISequence[0].ROIName = "renamed"
+    new_rtstruct.invalidate_roi_index()
+    assert len(new_rtstruct.mask_cache) == 0
+    assert new_rtstruct.get_roi_mask_by_name("renamed").any()
+    with pytest.raises(RTStruct.ROIException):
+        new_rtstruct.get_roi_mask_by_name("first")
+
+    # Replacing a sequence is picked up as well
+    new_rtstruct.ds.StructureSetROISequence = Sequence()
+    new_rtstruct.ds.ROIContourSequence = Sequence()
+    new_rtstruct.ds.RTROIObservationsSequence = Sequence()
+    assert new_rtstruct.get_roi_names() == []
+    with pytest.raises(RTStruct.ROIException):
+        new_rtstruct.get_roi_mask_by_name("renamed")
+
+
+def test_merge_rtstructs_renames_duplicate_rois(series_path):
+    rt_struct_path = os.path.join(series_path, "rt.dcm")
+    rtstruct = RTStructBuilder.create_from(series_path, rt_struct_path)
+
+    merged_rtstruct = RTStructMerger.merge_rtstructs(
+        series_path, rt_struct_path, rt_struct_path
+    )
+
+    roi_names = rtstruct.get_roi_names()
+    assert merged_rtstruct.get_roi_names() == roi_names + [
+        name + "_2" for name in roi_names
+    ]
+    assert not merged_rtstruct.roi_index.is_stale(merged_rtstruct.ds)
+    assert np.array_equal(
+        merged_rtstruct.get_roi_mask_by_name(roi_names[0] + "_2"),
+        rtstruct.get_roi_mask_by_name(roi_names[0]),
+    )
+
+
+def test_add_roi_simplify_tolerance(new_rtstruct: RTStruct):
+    mask = get_empty_mask(new_rtstruct)
+    y, x = np.ogrid[: mask.shape[0], : mask.shape[1]]
+    mask[:, :, 0] = (y - 256) ** 2 + (x - 256) ** 2 < 100**2
+
+    new_rtstruct.add_roi(mask, name="exact", approximate_contours=False)
+    new_rtstruct.add_roi(
+        mask, name="simplified", approximate_contours=False, simplify_tolerance=1.0
+    )
+
+    exact_contour, simplified_contour = [
+        roi_contour.ContourSequence[0].ContourData
+        for roi_contour in new_rtstruct.ds.ROIContourSequence
+    ]
+    assert len(simplified_contour) < len(exact_contour) / 4
+    exact_mask = new_rtstruct.get_roi_mask_by_name("exact")
+    simplified_mask = new_rtstruct.get_roi_mask_by_name("simplified")
+    assert np.count_nonzero(exact_mask != simplified_mask) < 0.02 * np.count_nonzero(
+        exact_mask
+    )
+
+    with pytest.raises(ValueError):
+        new_rtstruct.add_roi(mask, simplify_tolerance=0)
+
+
+def test_get_roi_mask_crop_by_name(oriented_rtstruct: RTStruct):
+    mask = get_empty_mask(oriented_rtstruct)
+    mask[10:70, 5:15, 1] = 1
+    mask[60:70, 5:40, 2] = 1
+    oriented_rtstruct.add_roi(mask, name="test")
+
+    cropped_mask = oriented_rtstruct.get_roi_mask_crop_by_name("test")
+
+    first_y, first_x, first_slice = cropped_mask.offset
+    assert cropped_mask.offset == (10, 5, 1)
+    assert cropped_mask.mask.shape == (60, 35, 2)
+    full_mask = oriented_rtstruct.get_roi_mask_by_name("test")
+    assert np.array_equal(
+        full_mask[
+            first_y : first_y + cropped_mask.mask.shape[0],
+            first_x : first_x + cropped_mask.mask.shape[1],
+            first_slice : first_slice + cropped_mask.mask.shape[2],
+        ],
+        cropped_mask.mask,
+    )
+    assert full_mask.sum() == cropped_mask.mask.sum()
+
+    # The first voxel of the crop maps to the same patient position as within the full mask
+    pixel_to_patient = image_helper.get_pixel_to_patient_transformation_matrix(
+        oriented_rtstruct.series_data
+    )
+    assert np.allclose(
+        cropped_mask.affine @ [0, 0, 0, 1],
+        pixel_to_patient @ [first_x, first_y, first_slice, 1],
+        atol=1e-3,
+    )
+
+
+def test_get_empty_roi_mask_crop_by_name(new_rtstruct: RTStruct):
+    new_rtstruct.add_roi(get_empty_mask(new_rtstruct), name="empty")
+
+    assert new_rtstruct.get_roi_mask_crop_by_name("empty").mask.size == 0
+    with pytest.raises(RTStruct.ROIException):
+        new_rtstruct.get_roi_mask_crop_by_name("FAKE_NAME")
+
+
 def test_loading_invalid_rt_struct(series_path):
     invalid_rt_struct_path = os.path.join(series_path, "ct_1.dcm")
     assert os.path.exists(invalid_rt_struct_path)
@@ -227,6 +471,80 @@ def test_contour_data_sizes(new_rtstruct: RTStruct):
     )
 
 
+@pytest.mark.parametrize(
+    "contour_options",
+    [{}, {"use_pin_hole": True}, {"contour_mode": "voxel_edge"}],
+)
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_parallel_add_roi_matches_serial(
+    oriented_rtstruct: RTStruct, contour_options, use_processes
+):
+    mask = get_empty_mask(oriented_rtstruct)
+    mask[10:70, 5:15, :] = 1
+    mask[60:70, 5:40, 1:] = 1
+    mask[30:40, 8:12, 2] = 0
+
+    oriented_rtstruct.add_roi(mask, **contour_options)
+    oriented_rtstruct.add_roi(
+        mask, workers=2, use_processes=use_processes, **contour_options
+    )
+
+    serial_contours, parallel_contours = (
+        roi_contour.ContourSequence
+        for roi_contour in oriented_rtstruct.ds.ROIContourSequence
+    )
+    assert len(serial_contours) == len(parallel_contours) > 0
+    for serial_contour, parallel_contour in zip(serial_contours, parallel_contours):
+        assert serial_contour == parallel_contour
+
+
+def test_add_rois_from_labelmap(oriented_rtstruct: RTStruct):
+    labelmap = np.zeros(get_empty_mask(oriented_rtstruct).shape, dtype=np.uint8)
+    labelmap[10:70, 5:15, :2] = 1
+    labelmap[60:70, 5:40, 1] = 3
+    labelmap[20:30, 20:30, 2] = 3
+
+    oriented_rtstruct.add_rois_from_labelmap(
+        labelmap, names={1: "first", 3: "third"}, colors=["#ff0000", None, [0, 0, 255]]
+    )
+
+    assert oriented_rtstruct.get_roi_names() == ["first", "third"]
+    assert oriented_rtstruct.ds.ROIContourSequence[1].ROIDisplayColor == [0, 0, 255]
+    for label, name in [(1, "first"), (3, "third")]:
+        mask = labelmap == label
+        oriented_rtstruct.add_roi(mask, name=f"{name} mask")
+        labelmap_contours, mask_contours = (
+            ds_helper.get_contour_sequence_by_roi_number(
+                oriented_rtstruct.ds, roi_number
+            )
+            for roi_number in [
+                oriented_rtstruct.get_roi_names().index(name) + 1,
+                len(oriented_rtstruct.get_roi_names()),
+            ]
+        )
+        assert [contour.ContourData for contour in labelmap_contours] == [
+            contour.ContourData for contour in mask_contours
+        ]
+        assert np.array_equal(oriented_rtstruct.get_roi_mask_by_name(name), mask)
+
+
+def test_add_invalid_labelmap(new_rtstruct: RTStruct):
+    labelmap = get_empty_mask(new_rtstruct).astype(np.int16)
+    labelmap[50:100, 50:100, 0] = 1
+
+    with pytest.raises(RTStruct.ROIException):
+        new_rtstruct.add_rois_from_labelmap(labelmap.astype(float))
+    with pytest.raises(RTStruct.ROIException):
+        new_rtstruct.add_rois_from_labelmap(labelmap[:, :, 1:])
+    labelmap[0, 0, 0] = -1
+    with pytest.raises(RTStruct.ROIException):
+        new_rtstruct.add_rois_from_labelmap(labelmap)
+    labelmap[0, 0, 0] = 0
+    with pytest.raises(ValueError):
+        new_rtstruct.add_rois_from_labelmap(labelmap, colors=["not-a-color"])
+    assert new_rtstruct.get_roi_names() == []
+
+
 def test_nonstandard_image_orientation(oriented_rtstruct: RTStruct):
     mask = get_empty_mask(oriented_rtstruct)
     mask[10:70, 5:15, 1] = 1
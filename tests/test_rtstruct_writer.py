@@ -0,0 +1,74 @@
+import io
+
+import numpy as np
+import pytest
+from pydicom import dcmread
+
+from rt_utils import RTStructBuilder
+
+
+def get_masks(shape):
+    first_mask = np.zeros(shape, dtype=bool)
+    first_mask[50:100, 50:100, 0] = True
+    first_mask[60:90, 60:90, 0] = False
+    second_mask = np.zeros(shape, dtype=bool)
+    second_mask[200:300, 100:150, 1] = True
+    return first_mask, second_mask
+
+
+def test_writer_matches_saved_rtstruct(series_path, tmp_path):
+    rtstruct = RTStructBuilder.create_new(series_path)
+    mask_shape = (512, 512, len(rtstruct.series_data))
+    first_mask, second_mask = get_masks(mask_shape)
+    rtstruct.add_roi(first_mask, name="first", color=[255, 0, 0])
+    rtstruct.add_roi(second_mask, name="second", contour_mode="voxel_edge")
+
+    writer_path = str(tmp_path / "streamed.dcm")
+    with RTStructBuilder.create_writer(series_path, writer_path) as writer:
+        writer.add_roi(first_mask, name="first", color=[255, 0, 0])
+        writer.add_roi(second_mask, name="second", contour_mode="voxel_edge")
+        assert len(writer.rtstruct.ds.ROIContourSequence) == 0
+
+    ds = dcmread(writer_path)
+    assert [roi.ROIName for roi in ds.StructureSetROISequence] == ["first", "second"]
+    assert ds.ROIContourSequence[0].ROIDisplayColor == [255, 0, 0]
+    for roi_contour, expected_roi_contour in zip(
+        ds.ROIContourSequence, rtstruct.ds.ROIContourSequence
+    ):
+        assert [contour.ContourData for contour in roi_contour.ContourSequence] == [
+            contour.ContourData for contour in expected_roi_contour.ContourSequence
+        ]
+
+    streamed_rtstruct = RTStructBuilder.create_from(series_path, writer_path)
+    assert np.array_equal(streamed_rtstruct.get_roi_mask_by_name("first"), first_mask)
+    assert np.array_equal(
+        streamed_rtstruct.get_roi_mask_by_name("second"),
+        rtstruct.get_roi_mask_by_name("second"),
+    )
+
+
+def test_writer_to_file_like_object(series_path):
+    output = io.BytesIO()
+    writer = RTStructBuilder.create_writer(series_path, output)
+    writer.set_series_description("streamed")
+    writer.add_roi(get_masks((512, 512, 2))[1], name="roi")
+    writer.close()
+
+    ds = dcmread(io.BytesIO(output.getvalue()))
+    assert ds.SeriesDescription == "streamed"
+    assert len(ds.ROIContourSequence[0].ContourSequence) == 1
+    with pytest.raises(Exception):
+        writer.add_roi(get_masks((512, 512, 2))[1])
+
+
+def test_writer_without_rois(series_path, tmp_path):
+    writer_path = str(tmp_path / "empty")
+    with RTStructBuilder.create_writer(series_path, writer_path):
+        pass
+
+    ds = dcmread(writer_path + ".dcm")
+    assert len(ds.ROIContourSequence) == 0
+    assert (
+        RTStructBuilder.create_from(series_path, writer_path + ".dcm").get_roi_names()
+        == []
+    )
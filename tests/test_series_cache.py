@@ -0,0 +1,111 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from rt_utils import RTStructBuilder, SeriesCache, image_helper
+
+
+@pytest.fixture()
+def copied_series_path(series_path, tmp_path) -> str:
+    copied_path = str(tmp_path / "series")
+    shutil.copytree(series_path, copied_path)
+    return copied_path
+
+
+@pytest.fixture()
+def cache(tmp_path) -> SeriesCache:
+    return SeriesCache(str(tmp_path / "cache"))
+
+
+def test_cached_series_is_not_parsed_again(copied_series_path, cache, monkeypatch):
+    series_data = image_helper.load_sorted_image_series(copied_series_path, cache=cache)
+
+    def fail_to_load(*args, **kwargs):
+        raise AssertionError("Series should be loaded from the cache")
+
+    monkeypatch.setattr(image_helper, "load_dcm_images_from_path", fail_to_load)
+    cached_series_data = image_helper.load_sorted_image_series(
+        copied_series_path, cache=cache
+    )
+
+    assert [ds.SOPInstanceUID for ds in cached_series_data] == [
+        ds.SOPInstanceUID for ds in series_data
+    ]
+    # Pixel data is read from the original files on access
+    assert np.array_equal(cached_series_data[0].pixel_array, series_data[0].pixel_array)
+
+
+def test_modified_series_is_reloaded(copied_series_path, cache):
+    image_helper.load_sorted_image_series(copied_series_path, cache=cache)
+    assert cache.load(copied_series_path) is not None
+
+    os.remove(os.path.join(copied_series_path, "ct_2.dcm"))
+
+    assert cache.load(copied_series_path) is None
+    series_data = image_helper.load_sorted_image_series(copied_series_path, cache=cache)
+    assert len(series_data) == 1
+    assert len(cache.load(copied_series_path)) == 1
+
+
+def test_series_modified_while_loading_is_not_served(
+    copied_series_path, cache, monkeypatch
+):
+    load_dcm_images_from_path = image_helper.load_dcm_images_from_path
+
+    def load_and_modify(*args, **kwargs):
+        series_data = load_dcm_images_from_path(*args, **kwargs)
+        # Another process rewrites a file after it was read
+        file_path = os.path.join(copied_series_path, "ct_2.dcm")
+        stat = os.stat(file_path)
+        os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        return series_data
+
+    monkeypatch.setattr(image_helper, "load_dcm_images_from_path", load_and_modify)
+    image_helper.load_sorted_image_series(copied_series_path, cache=cache)
+
+    assert cache.load(copied_series_path) is None
+
+
+def test_invalidate_and_clear(copied_series_path, cache):
+    image_helper.load_sorted_image_series(copied_series_path, cache=cache)
+    cache.invalidate(copied_series_path)
+    assert cache.load(copied_series_path) is None
+
+    image_helper.load_sorted_image_series(copied_series_path, cache=cache)
+    cache.clear()
+    assert cache.get_entry_paths() == []
+
+
+def test_least_recently_used_entry_is_evicted(series_path, tmp_path):
+    series_paths = []
+    for name in ["first", "second"]:
+        path = str(tmp_path / name)
+        shutil.copytree(series_path, path)
+        series_paths.append(path)
+
+    cache = SeriesCache(str(tmp_path / "cache"))
+    image_helper.load_sorted_image_series(series_paths[0], cache=cache)
+    entry_size = os.path.getsize(cache.get_entry_path(series_paths[0]))
+
+    cache.max_size_bytes = int(entry_size * 1.5)
+    image_helper.load_sorted_image_series(series_paths[1], cache=cache)
+
+    assert cache.load(series_paths[0]) is None
+    assert cache.load(series_paths[1]) is not None
+
+
+def test_create_from_with_cache(copied_series_path, cache):
+    rt_struct_path = os.path.join(copied_series_path, "rt.dcm")
+    rtstruct = RTStructBuilder.create_from(
+        copied_series_path, rt_struct_path, cache=cache
+    )
+    cached_rtstruct = RTStructBuilder.create_from(
+        copied_series_path, rt_struct_path, cache=cache
+    )
+
+    name = rtstruct.get_roi_names()[0]
+    assert np.array_equal(
+        cached_rtstruct.get_roi_mask_by_name(name), rtstruct.get_roi_mask_by_name(name)
+    )
@@ -0,0 +1,94 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from rt_utils import RTStructBuilder, SeriesCache, SeriesIndex, image_helper
+from tests.test_rtstruct_builder import is_deferred
+
+MOCK_SERIES_UID = "2.16.840.1.114362.1.11940992.23790159890.563423471.893.88"
+ORIENTED_SERIES_UID = "1.2.826.0.1.3680043.2.1125.20210721.1101329"
+
+
+@pytest.fixture()
+def study_path(series_path, oriented_series_path, tmp_path) -> str:
+    # Patient directory holding two image series and their RTStructs
+    study_path = tmp_path / "patient"
+    shutil.copytree(series_path, str(study_path / "mock"))
+    shutil.copytree(oriented_series_path, str(study_path / "nested" / "oriented"))
+    return str(study_path)
+
+
+def test_index_groups_files_by_series(study_path):
+    series_index = SeriesIndex.from_path(study_path)
+
+    image_series_uids = {
+        entry.series_instance_uid for entry in series_index.get_image_series()
+    }
+    assert image_series_uids == {MOCK_SERIES_UID, ORIENTED_SERIES_UID}
+    assert len(series_index.get_series(MOCK_SERIES_UID).file_paths) == 2
+    assert len(series_index.get_series(ORIENTED_SERIES_UID).file_paths) == 3
+    assert all(
+        entry.modality == "RTSTRUCT" for entry in series_index.get_rtstruct_series()
+    )
+
+
+def test_index_series_data_matches_loaded_series(study_path, series_path):
+    series_index = SeriesIndex.from_path(study_path, workers=2)
+
+    series_data = image_helper.load_sorted_image_series(series_path)
+    assert [
+        ds.SOPInstanceUID for ds in series_index.get_series_data(MOCK_SERIES_UID)
+    ] == [ds.SOPInstanceUID for ds in series_data]
+
+
+def test_series_uid_required_for_multiple_series(study_path):
+    series_index = SeriesIndex.from_path(study_path)
+
+    with pytest.raises(Exception):
+        series_index.get_series_data()
+    with pytest.raises(Exception):
+        series_index.get_series_data("not-a-series")
+
+
+def test_create_new_by_series_uid(study_path, tmp_path):
+    rtstruct = RTStructBuilder.create_new(
+        study_path, series_instance_uid=ORIENTED_SERIES_UID
+    )
+
+    assert len(rtstruct.series_data) == 3
+    assert {ds.SeriesInstanceUID for ds in rtstruct.series_data} == {
+        ORIENTED_SERIES_UID
+    }
+    # Pixel data is read up front unless it is deferred
+    assert not any(is_deferred(ds, "PixelData") for ds in rtstruct.series_data)
+
+    deferred_rtstruct = RTStructBuilder.create_new(
+        study_path, series_instance_uid=ORIENTED_SERIES_UID, defer_pixel_data=True
+    )
+    assert all(is_deferred(ds, "PixelData") for ds in deferred_rtstruct.series_data)
+
+    with pytest.raises(ValueError):
+        RTStructBuilder.create_new(
+            study_path,
+            series_instance_uid=ORIENTED_SERIES_UID,
+            cache=SeriesCache(str(tmp_path)),
+        )
+
+
+def test_create_from_resolves_referenced_series(study_path, series_path):
+    series_index = SeriesIndex.from_path(study_path)
+    rt_struct_path = os.path.join(study_path, "mock", "rt.dcm")
+
+    rtstruct = RTStructBuilder.create_from(series_index, rt_struct_path)
+    expected_rtstruct = RTStructBuilder.create_from(
+        series_path, os.path.join(series_path, "rt.dcm")
+    )
+
+    name = expected_rtstruct.get_roi_names()[0]
+    assert len(rtstruct.series_data) == 2
+    assert np.array_equal(
+        rtstruct.get_roi_mask_by_name(name),
+        expected_rtstruct.get_roi_mask_by_name(name),
+    )
@@ -2,7 +2,11 @@ import numpy as np
 import pytest
 
 from rt_utils import __version__
-from rt_utils.image_helper import mask_to_edge_polygons
+from rt_utils.image_helper import (
+    mask_to_edge_polygons,
+    remove_collinear_points,
+    simplify_polygon,
+)
 from rt_utils.utils import COLOR_PALETTE
 from tests.test_rtstruct_builder import get_empty_mask
 
@@ -54,6 +58,42 @@ def test_edge_polygons_handle_diagonally_touching_voxels():
     assert sum(len(polygon) for polygon in polygons) >= 6
 
 
+def test_remove_collinear_points():
+    polygon = np.array([[0, 0], [1, 0], [2, 0], [2, 1], [2, 2], [1, 2], [0, 2], [0, 1]])
+
+    assert remove_collinear_points(polygon).tolist() == [[0, 0], [2, 0], [2, 2], [0, 2]]
+
+
+def test_simplify_polygon_within_tolerance():
+    angles = np.linspace(0, 2 * np.pi, 200, endpoint=False)
+    polygon = np.stack(
+        [50 * np.cos(angles), 50 * np.sin(angles), np.full(200, 10.0)], axis=1
+    )
+
+    simplified_polygon = simplify_polygon(polygon, 0.5)
+
+    assert 4 <= len(simplified_polygon) < len(polygon)
+    assert np.all(simplified_polygon[:, 2] == 10)
+    # Every removed vertex lies within the tolerance of the simplified outline
+    closed_polygon = np.concatenate([simplified_polygon, simplified_polygon[:1]])
+    distances = np.full(len(polygon), np.inf)
+    for start, end in zip(closed_polygon[:-1], closed_polygon[1:]):
+        t = np.clip(
+            (polygon - start) @ (end - start) / np.sum((end - start) ** 2), 0, 1
+        )
+        segment_distances = np.linalg.norm(
+            polygon - (start + t[:, np.newaxis] * (end - start)), axis=1
+        )
+        distances = np.minimum(distances, segment_distances)
+    assert distances.max() <= 0.5 + 1e-9
+
+
+def test_simplify_polygon_keeps_small_polygons():
+    polygon = np.array([[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0]])
+
+    assert np.array_equal(simplify_polygon(polygon, 10), polygon)
+
+
 VALID_COLORS = [
     ("fff", [255, 255, 255]),
     ("#fff", [255, 255, 255]),